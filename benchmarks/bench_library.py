@@ -0,0 +1,194 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+from src.catalog_io import book_from_dict, book_to_dict
+from src.library_classes import Book, Library
+from src.simulation import AUTHORS, GENRES, TITLES
+
+
+OPERATIONS = ('add', 'remove', 'update', 'find_by_isbn', 'find_by_author', 'find_by_year', 'find_by_genre',
+              'search_text')
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# полная шкала 10^3..10^7 (--full): каталог из 10^7 книг строится минуты и занимает больше 15 ГБ памяти
+# (около 1,5 КБ индексов на книгу), поэтому по умолчанию замеры останавливаются на 10^5
+FULL_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _zipf_pool(base: list, size: int) -> tuple: # пул значений с перекосом: первые значения встречаются чаще
+    values = list(base) + [f"{base[i % len(base)]} {i}" for i in range(len(base), size)]
+    weights = [1 / (rank + 1) for rank in range(len(values))]
+    return values, weights
+
+
+def gen_catalog(size: int, seed: int = 0) -> list: # синтетический каталог с перекосом по авторам и жанрам
+    rng = random.Random(seed)
+    authors, author_weights = _zipf_pool(AUTHORS, max(len(AUTHORS), int(size ** 0.5)))
+    genres, genre_weights = _zipf_pool(GENRES, max(len(GENRES), 20))
+    author_column = rng.choices(authors, author_weights, k=size)
+    genre_column = rng.choices(genres, genre_weights, k=size)
+    return [Book(f"{rng.choice(TITLES)} {i}", author_column[i], rng.randint(1800, 2025),
+                 genre_column[i], f"978-{i:09d}") for i in range(size)]
+
+
+def _text_query(book: Book, rng: random.Random) -> str: # запрос для search_text: слово, префикс или опечатка
+    word = max(book.author.split(), key=len)
+    kind = rng.randrange(3)
+    if kind == 1:
+        return word[:max(3, len(word) // 2)]
+    if kind == 2 and len(word) > 3:
+        i = rng.randrange(1, len(word) - 1)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def _percentiles(samples: list) -> dict: # перцентили задержек в секундах
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    total = sum(ordered)
+    return {'p50': pick(50), 'p90': pick(90), 'p99': pick(99), 'max': ordered[-1],
+            'mean': total / len(ordered), 'ops_per_sec': len(ordered) / total if total else 0.0}
+
+
+def _measure(calls: list) -> dict: # задержка каждого вызова из списка (функция, аргументы)
+    samples = []
+    for function, args in calls:
+        started = perf_counter()
+        function(*args)
+        samples.append(perf_counter() - started)
+    return _percentiles(samples)
+
+
+def book_memory(catalog: list) -> float: # байт на книгу, прочитанную из файла (без индексов библиотеки)
+    # книги создаются из JSON, как при загрузке каталога: у каждой строки файла свои копии значений
+    lines = [json.dumps(book_to_dict(book), ensure_ascii=False) for book in catalog]
+    tracemalloc.start()
+    books = [book_from_dict(json.loads(line)) for line in lines]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used / len(books) if books else 0.0
+
+
+def bench_size(size: int, ops: int = 1000, seed: int = 0, memory: bool = True) -> dict: # замеры на каталоге одного размера
+    catalog = gen_catalog(size, seed)
+    rng = random.Random(seed + 1)
+
+    if memory:
+        tracemalloc.start()
+    started = perf_counter()
+    library = Library()
+    library.bulk_load(catalog)
+    build_time = perf_counter() - started
+    peak_memory = bytes_per_book = None
+    if memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        bytes_per_book = book_memory(catalog)
+
+    ops = min(ops, size)
+    existing = rng.sample(catalog, ops)
+    fresh = gen_catalog(ops, seed + 2)
+    for i, book in enumerate(fresh): # новые книги с ISBN, которых нет в каталоге
+        book.isbn = f"979-{i:09d}"
+    authors = [book.author for book in rng.sample(catalog, ops)]
+    genres = [book.genre for book in rng.sample(catalog, ops)]
+    queries = [_text_query(book, rng) for book in rng.sample(catalog, ops)]
+
+    results = {
+        'find_by_isbn': _measure([(library.find_by_isbn, (book.isbn,)) for book in existing]),
+        'find_by_author': _measure([(library.find_by_author, (author,)) for author in authors]),
+        'find_by_year': _measure([(library.find_by_year, (rng.randint(1800, 2025),)) for _ in range(ops)]),
+        'find_by_genre': _measure([(library.find_by_genre, (genre,)) for genre in genres]),
+        'search_text': _measure([(library.search_text, (query,)) for query in queries]),
+        'update': _measure([(lambda isbn, year: library.update_book_info(isbn, year=year),
+                             (book.isbn, rng.randint(1800, 2025))) for book in existing]),
+        'add': _measure([(library.add_book_to_lib, (book,)) for book in fresh]),
+        'remove': _measure([(library.remove_book_from_lib, (book.isbn,)) for book in existing]),
+    }
+    return {'size': size, 'ops': ops, 'build_time': build_time,
+            'build_books_per_sec': size / build_time if build_time else 0.0,
+            'peak_memory': peak_memory, 'bytes_per_book': bytes_per_book, 'operations': results}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, ops: int = 1000, seed: int = 0, memory: bool = True) -> dict: # полный прогон
+    return {'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                     'timestamp': datetime.now(timezone.utc).isoformat(), 'ops': ops, 'seed': seed},
+            'results': {str(size): bench_size(size, ops, seed, memory) for size in sizes}}
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2, metric: str = 'p50',
+            thresholds: dict | None = None) -> list: # регрессии относительно базового прогона
+    # регрессия - метрика операции выросла больше чем в (1 + порог) раз;
+    # thresholds позволяет задать свой порог для отдельных операций
+    regressions = []
+    thresholds = thresholds or {}
+    for size, data in current['results'].items():
+        base = baseline.get('results', {}).get(size)
+        if base is None:
+            continue
+        for op, stats in data['operations'].items():
+            old = base['operations'].get(op, {}).get(metric)
+            new = stats.get(metric)
+            if not old or new is None:
+                continue
+            limit = thresholds.get(op, threshold)
+            ratio = new / old
+            if ratio > 1 + limit:
+                regressions.append({'size': int(size), 'op': op, 'metric': metric,
+                                    'baseline': old, 'current': new, 'ratio': ratio, 'threshold': limit})
+    return regressions
+
+
+def _print_report(report: dict) -> None: # таблица результатов
+    print(f"{'книг':>10} {'операция':<16}{'p50, мкс':>11}{'p99, мкс':>11}{'оп/с':>12}")
+    for size, data in report['results'].items():
+        memory = (f", память {data['peak_memory'] / 2 ** 20:.1f} МиБ, книга {data['bytes_per_book']:.0f} байт"
+                  if data['peak_memory'] is not None else "")
+        print(f"{size:>10} загрузка {data['build_time']:.3f} с{memory}")
+        for op in OPERATIONS:
+            stats = data['operations'][op]
+            print(f"{size:>10} {op:<16}{stats['p50'] * 1e6:>11.1f}{stats['p99'] * 1e6:>11.1f}{stats['ops_per_sec']:>12.0f}")
+
+
+def main(argv=None) -> int: # python -m benchmarks.bench_library
+    parser = argparse.ArgumentParser(description="Замеры скорости операций библиотеки")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="размеры каталогов")
+    parser.add_argument('--full', action='store_true', help="все размеры от 10^3 до 10^7 (нужно больше 15 ГБ памяти)")
+    parser.add_argument('--ops', type=int, default=1000, help="замеров на каждую операцию")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="не замерять память (загрузка быстрее)")
+    parser.add_argument('--output', help="куда записать результаты в JSON")
+    parser.add_argument('--baseline', help="JSON с базовыми результатами для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимый рост метрики (0.2 = +20%%)")
+    parser.add_argument('--op-threshold', action='append', default=[], metavar='OP=VALUE',
+                        help="свой порог для операции, например remove=0.5")
+    parser.add_argument('--metric', default='p50', choices=('p50', 'p90', 'p99', 'mean', 'max'))
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(FULL_SIZES if args.full else args.sizes, args.ops, args.seed, not args.no_memory)
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)
+    thresholds = {op: float(value) for op, value in (item.split('=', 1) for item in args.op_threshold)}
+    regressions = compare(report, baseline, args.threshold, args.metric, thresholds)
+    for item in regressions:
+        print(f"РЕГРЕССИЯ: {item['op']} на {item['size']} книг - {item['metric']} "
+              f"{item['baseline'] * 1e6:.1f} -> {item['current'] * 1e6:.1f} мкс (x{item['ratio']:.2f})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
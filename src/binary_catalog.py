@@ -0,0 +1,257 @@
+import json
+import mmap
+import struct
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from src.library_classes import Book, Magazine, TrainigMaterial
+
+
+# формат файла каталога (все числа little-endian):
+#   заголовок | таблица строк | массив записей | индекс ISBN | индексы автора, года и жанра
+# таблица строк - смещения (u64, строк + 1) и склеенные строки в utf-8;
+# запись - вид книги, номера строк для полей и год; индекс - каталог ключей
+# (ключ, начало, количество) и общий массив номеров записей, отсортированный по ключу
+MAGIC = b'LIBCAT01'
+HEADER = struct.Struct('<8sIIQQQQQQQ') # сигнатура, число записей, число строк и смещения разделов
+RECORD = struct.Struct('<B3xIIiIIII') # вид, название, автор, год, жанр, isbn, доп. поле 1, доп. поле 2
+DIRECTORY_ENTRY = struct.Struct('<qII') # ключ (номер строки или год), начало и количество в массиве
+NO_STRING = 0xFFFFFFFF # отсутствующее дополнительное поле
+
+KIND_BOOK, KIND_MAGAZINE, KIND_TRAINING = 0, 1, 2
+
+
+class _StringTable: # таблица уникальных строк при записи каталога
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+
+    def add(self, value: str) -> int: # номер строки в таблице (одинаковые строки хранятся один раз)
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+
+def _extras(book: Book, strings: _StringTable) -> Tuple[int, int, int]: # вид книги и её доп. поля
+    if isinstance(book, Magazine):
+        return (KIND_MAGAZINE, strings.add(json.dumps(book.number, ensure_ascii=False)),
+                strings.add(json.dumps(book.month, ensure_ascii=False)))
+    if isinstance(book, TrainigMaterial):
+        return (KIND_TRAINING, strings.add(json.dumps(book.edu_institution, ensure_ascii=False)),
+                strings.add(json.dumps(book.readers, ensure_ascii=False)))
+    return KIND_BOOK, NO_STRING, NO_STRING
+
+
+def write_catalog(books: Iterable[Book], path: str) -> int: # запись книг в бинарный файл каталога
+    strings = _StringTable()
+    records = []
+    for book in books:
+        kind, extra_1, extra_2 = _extras(book, strings)
+        records.append((kind, strings.add(book.title), strings.add(book.author), book.year,
+                        strings.add(book.genre), strings.add(book.isbn), extra_1, extra_2))
+
+    def build_index(key_of: Callable, sort_key: Callable) -> Tuple[bytes, bytes]: # каталог ключей и массив записей
+        order = sorted(range(len(records)), key=lambda i: (sort_key(key_of(records[i])), i))
+        directory = bytearray()
+        start = 0
+        while start < len(order):
+            key = key_of(records[order[start]])
+            end = start
+            while end < len(order) and key_of(records[order[end]]) == key:
+                end += 1
+            directory += DIRECTORY_ENTRY.pack(key, start, end - start)
+            start = end
+        return bytes(directory), struct.pack(f'<{len(order)}I', *order)
+
+    def by_string(string_id: int) -> str: # индексы по строковым полям сортируются по самим строкам
+        return strings.strings[string_id]
+
+    isbn_order = sorted(range(len(records)), key=lambda i: strings.strings[records[i][5]])
+    indexes = [build_index(lambda record: record[2], by_string), # автор
+               build_index(lambda record: record[3], lambda year: year), # год
+               build_index(lambda record: record[4], by_string)] # жанр
+
+    encoded = [value.encode('utf-8') for value in strings.strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    with open(path, 'wb') as file:
+        file.write(b'\0' * HEADER.size)
+        strings_offset = file.tell()
+        file.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        file.write(b''.join(encoded))
+        records_offset = file.tell()
+        for record in records:
+            file.write(RECORD.pack(*record))
+        isbn_offset = file.tell()
+        file.write(struct.pack(f'<{len(isbn_order)}I', *isbn_order))
+        index_offsets = []
+        for directory, postings in indexes:
+            index_offsets.append(file.tell())
+            file.write(struct.pack('<I', len(directory) // DIRECTORY_ENTRY.size))
+            file.write(directory)
+            file.write(postings)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(records), len(strings.strings), strings_offset,
+                               records_offset, isbn_offset, *index_offsets, 0))
+    return len(records)
+
+
+class _MappedIndex: # вторичный индекс в файле каталога: каталог ключей и номера записей
+    def __init__(self, buffer: memoryview, offset: int, record_count: int) -> None:
+        self._buffer = buffer
+        self._size = struct.unpack_from('<I', buffer, offset)[0]
+        self._directory = offset + 4
+        postings = self._directory + self._size * DIRECTORY_ENTRY.size
+        self._postings = buffer[postings:postings + 4 * record_count].cast('I')
+
+
+    def __len__(self) -> int: # количество различных ключей
+        return self._size
+
+
+    def entry(self, position: int) -> Tuple[int, int, int]: # (ключ, начало, количество)
+        return DIRECTORY_ENTRY.unpack_from(self._buffer, self._directory + position * DIRECTORY_ENTRY.size)
+
+
+    def search(self, target, key_of: Callable) -> int: # позиция первого ключа не меньше target
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_of(self.entry(mid)[0]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+    def records(self, start: int, count: int) -> memoryview: # номера записей без копирования
+        return self._postings[start:start + count]
+
+
+class MappedCatalog: # каталог, открытый через mmap: книги создаются только при выдаче результата
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        (magic, self._count, string_count, strings_offset, self._records_offset,
+         isbn_offset, author_offset, year_offset, genre_offset, _) = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Error: файл '{path}' не является каталогом библиотеки")
+
+        self._string_offsets = self._buffer[strings_offset:strings_offset + 8 * (string_count + 1)].cast('Q')
+        self._strings_data = strings_offset + 8 * (string_count + 1)
+        self._isbn_order = self._buffer[isbn_offset:isbn_offset + 4 * self._count].cast('I')
+        self._by_author = _MappedIndex(self._buffer, author_offset, self._count)
+        self._by_year = _MappedIndex(self._buffer, year_offset, self._count)
+        self._by_genre = _MappedIndex(self._buffer, genre_offset, self._count)
+
+
+    def close(self) -> None: # закрытие файла (созданные книги остаются рабочими)
+        for view in ('_string_offsets', '_isbn_order'):
+            if hasattr(self, view):
+                getattr(self, view).release()
+        for index in ('_by_author', '_by_year', '_by_genre'):
+            if hasattr(self, index):
+                getattr(self, index)._postings.release()
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+
+
+    def __enter__(self) -> 'MappedCatalog':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def __len__(self) -> int: # количество книг в каталоге
+        return self._count
+
+
+    def _string(self, string_id: int) -> str: # строка из таблицы строк по номеру
+        start = self._strings_data + self._string_offsets[string_id]
+        end = self._strings_data + self._string_offsets[string_id + 1]
+        return str(self._buffer[start:end], 'utf-8')
+
+
+    def _field(self, record_id: int, position: int): # одно поле записи без создания книги
+        return RECORD.unpack_from(self._buffer, self._records_offset + record_id * RECORD.size)[position]
+
+
+    def _book(self, record_id: int) -> Book: # создание книги из записи
+        kind, title, author, year, genre, isbn, extra_1, extra_2 = RECORD.unpack_from(
+            self._buffer, self._records_offset + record_id * RECORD.size)
+        title, author, genre, isbn = self._string(title), self._string(author), self._string(genre), self._string(isbn)
+        if kind == KIND_MAGAZINE:
+            return Magazine(title, author, year, json.loads(self._string(extra_1)),
+                            json.loads(self._string(extra_2)), genre, isbn)
+        if kind == KIND_TRAINING:
+            return TrainigMaterial(title, author, year, json.loads(self._string(extra_1)),
+                                   json.loads(self._string(extra_2)), genre, isbn)
+        return Book(title, author, year, genre, isbn)
+
+
+    def __iter__(self) -> Iterator[Book]: # перебор книг в порядке записи
+        for record_id in range(self._count):
+            yield self._book(record_id)
+
+
+    def _find_isbn(self, isbn: str) -> int: # номер записи по isbn или -1
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(self._field(self._isbn_order[mid], 5)) < isbn:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._string(self._field(self._isbn_order[lo], 5)) == isbn:
+            return self._isbn_order[lo]
+        return -1
+
+
+    def __contains__(self, book: Book) -> bool: # проверка наличия книги в каталоге
+        return isinstance(book, Book) and self._find_isbn(book.isbn) >= 0
+
+
+    def find_by_isbn(self, isbn: str) -> Book | None: # поиск по isbn
+        record_id = self._find_isbn(isbn)
+        return self._book(record_id) if record_id >= 0 else None
+
+
+    def _lookup(self, index: _MappedIndex, target, key_of: Callable) -> list: # книги по точному ключу
+        position = index.search(target, key_of)
+        if position < len(index):
+            key, start, count = index.entry(position)
+            if key_of(key) == target:
+                return [self._book(record_id) for record_id in index.records(start, count)]
+        return []
+
+
+    def find_by_author(self, author: str) -> list: # поиск по автору
+        return self._lookup(self._by_author, author, self._string)
+
+
+    def find_by_year(self, year: int) -> list: # поиск по году
+        return self._lookup(self._by_year, year, int)
+
+
+    def find_by_genre(self, genre: str) -> list: # поиск по жанру
+        return self._lookup(self._by_genre, genre, self._string)
+
+
+    def find_by_year_range(self, lo: int, hi: int) -> list: # поиск по диапазону лет (включительно)
+        books: List[Book] = []
+        position = self._by_year.search(lo, int)
+        while position < len(self._by_year):
+            year, start, count = self._by_year.entry(position)
+            if year > hi:
+                break
+            books.extend(self._book(record_id) for record_id in self._by_year.records(start, count))
+            position += 1
+        return books
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+MISS = object() # признак отсутствия результата в кэше (пустой список - тоже результат)
+
+
+class QueryCache: # ограниченный LRU-кэш результатов поиска с проверкой поколений ключей
+    # каждый результат хранится вместе с поколениями ключей индекса, от которых он зависит;
+    # запись в индекс увеличивает поколение только затронутых ключей, поэтому
+    # устаревшими становятся только результаты, которые действительно могли измениться.
+    # Поколение ведётся только для ключей, от которых зависит хотя бы один сохранённый результат:
+    # когда последний такой результат уходит из кэша, ключ забывается
+    def __init__(self, maxsize: int = 1024) -> None:
+        if maxsize <= 0:
+            raise ValueError("Error: размер кэша должен быть положительным")
+        self._maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict() # ключ запроса -> (поколения зависимостей, результат)
+        self._generations: Dict[Tuple, List[int]] = {} # ключ индекса -> [поколение, число результатов с ним]
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0 # результатов, отброшенных из-за изменения данных
+        self.evictions = 0 # результатов, вытесненных по размеру
+        self._lock = threading.Lock() # кэш может читаться из нескольких потоков одновременно
+
+
+    def __len__(self) -> int: # количество сохранённых результатов
+        return len(self._entries)
+
+
+    def generation(self, dependency: Tuple) -> int: # текущее поколение ключа (0 - ключ не отслеживается)
+        entry = self._generations.get(dependency)
+        return entry[0] if entry is not None else 0
+
+
+    def bump(self, dependencies: Iterable[Tuple]) -> None: # запись затронула ключи - зависимые результаты устарели
+        if not self._generations:
+            return
+        with self._lock:
+            for dependency in dependencies:
+                try:
+                    entry = self._generations.get(dependency)
+                except TypeError: # нехэшируемое значение в кэш не попадает
+                    continue
+                if entry is not None:
+                    entry[0] += 1
+
+
+    def _release(self, dependencies: Iterable[Tuple[Tuple, int]]) -> None: # результат ушёл из кэша
+        for dependency, _ in dependencies:
+            entry = self._generations[dependency]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._generations[dependency]
+
+
+    def get(self, key: Hashable): # результат или MISS
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            dependencies, result = entry
+            for dependency, seen in dependencies:
+                if self._generations[dependency][0] != seen: # данные изменились после сохранения результата
+                    del self._entries[key]
+                    self._release(dependencies)
+                    self.invalidations += 1
+                    self.misses += 1
+                    return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+
+    def put(self, key: Hashable, dependencies: Iterable[Tuple[Tuple, int]], result) -> None: # сохранение результата
+        # поколения dependencies берутся через generation() до вычисления результата
+        dependencies = tuple(dependencies)
+        with self._lock:
+            for dependency, seen in dependencies:
+                self._generations.setdefault(dependency, [seen, 0])[1] += 1
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._release(previous[0])
+            self._entries[key] = (dependencies, result)
+            if len(self._entries) > self._maxsize:
+                self._release(self._entries.popitem(last=False)[1][0])
+                self.evictions += 1
+
+
+    def clear(self) -> None: # очистка кэша (статистика сохраняется)
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+    def stats(self) -> Dict: # статистика попаданий
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'maxsize': self._maxsize, 'hits': self.hits,
+                    'misses': self.misses, 'hit_ratio': self.hits / lookups if lookups else None,
+                    'invalidations': self.invalidations, 'evictions': self.evictions,
+                    'tracked_keys': len(self._generations)}
@@ -0,0 +1,76 @@
+import csv
+import json
+from typing import Dict, Iterable, Iterator, TextIO
+from src.library_classes import Book, Magazine, TrainigMaterial
+
+
+# поля, общие для всех книг, и дополнительные поля наследников
+BOOK_FIELDS = ('title', 'author', 'year', 'genre', 'isbn')
+CSV_FIELDS = BOOK_FIELDS + ('type', 'number', 'month', 'edu_institution', 'readers')
+
+
+def book_to_dict(book: Book) -> Dict: # словарь с данными книги для записи в файл
+    data = {field: getattr(book, field) for field in BOOK_FIELDS}
+    if isinstance(book, Magazine):
+        data.update(type='magazine', number=book.number, month=book.month)
+    elif isinstance(book, TrainigMaterial):
+        data.update(type='training_material', edu_institution=book.edu_institution, readers=book.readers)
+    return data
+
+
+def book_from_dict(data: Dict) -> Book: # создание книги (или наследника) из словаря
+    kind = data.get('type') or 'book'
+    try:
+        title, author, year = data['title'], data['author'], int(data['year'])
+        if kind == 'magazine':
+            return Magazine(title, author, year, int(data['number']), data['month'],
+                            data.get('genre') or "Журнал", data['isbn'])
+        if kind == 'training_material':
+            return TrainigMaterial(title, author, year, data['edu_institution'], data['readers'],
+                                   data.get('genre') or "Методическое пособие", data['isbn'])
+        if kind == 'book':
+            return Book(title, author, year, data['genre'], data['isbn'])
+    except KeyError as e:
+        raise ValueError(f"Error: отсутствует поле {e}") from None
+    raise ValueError(f"Error: неизвестный тип записи '{kind}'")
+
+
+def _open_lines(source: str | TextIO) -> Iterator[TextIO]: # открытие файла или использование готового потока
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', newline='') as file:
+            yield file
+    else:
+        yield source
+
+
+def read_csv(source: str | TextIO) -> Iterator[Book]: # потоковое чтение книг из CSV с заголовком
+    for file in _open_lines(source):
+        for line_no, row in enumerate(csv.DictReader(file), 2):
+            try:
+                yield book_from_dict(row)
+            except ValueError as e:
+                raise ValueError(f"Error: строка {line_no}: {e}") from None
+
+
+def read_jsonl(source: str | TextIO) -> Iterator[Book]: # потоковое чтение книг из JSONL (объект на строку)
+    for file in _open_lines(source):
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield book_from_dict(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Error: строка {line_no}: {e}") from None
+
+
+def write_csv(books: Iterable[Book], file: TextIO) -> None: # запись книг в CSV
+    writer = csv.DictWriter(file, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for book in books:
+        writer.writerow(book_to_dict(book))
+
+
+def write_jsonl(books: Iterable[Book], file: TextIO) -> None: # запись книг в JSONL
+    for book in books:
+        file.write(json.dumps(book_to_dict(book), ensure_ascii=False))
+        file.write('\n')
@@ -0,0 +1,181 @@
+from typing import Dict, Iterable, List
+from src.library_classes import Book, Library
+from src.metrics import instrumented
+
+try:
+    import numpy as np
+except ImportError: # numpy нужен только колоночному движку, остальная библиотека работает без него
+    np = None # type: ignore[assignment]
+
+
+class _Dictionary: # словарное кодирование значений столбца: значение -> номер
+    def __init__(self) -> None:
+        self.codes: Dict = {}
+        self.values: list = []
+
+
+    def encode(self, value) -> int: # номер значения (новое значение получает следующий номер)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+    def lookup(self, value) -> int: # номер значения или -1, если его нет в столбце
+        return self.codes.get(value, -1)
+
+
+class ColumnarLibrary(Library): # библиотека с колоночной копией каталога для аналитических запросов
+    # поиск по ISBN и остальные методы Library работают как обычно; кроме того, автор, жанр
+    # и название хранятся номерами словарей, а год - массивом int32, поэтому фильтры, подсчёты
+    # и группировки по всему каталогу выполняются векторными операциями NumPy без цикла по книгам
+    ENCODED_FIELDS = ('title', 'author', 'genre') # столбцы со словарным кодированием
+    NUMERIC_FIELDS = ('year',)
+    OPERATORS = ('eq', 'ne', 'in', 'not_in', 'between', 'lt', 'lte', 'gt', 'gte')
+
+
+    def __init__(self, *args, **kwargs) -> None:
+        if np is None:
+            raise ImportError("Error: для ColumnarLibrary нужен numpy (pip install numpy)")
+        super().__init__(*args, **kwargs)
+        self._dictionaries = {field: _Dictionary() for field in self.ENCODED_FIELDS}
+        self._columns = {field: np.zeros(0, dtype=np.int32) for field in self.ENCODED_FIELDS + self.NUMERIC_FIELDS}
+        self._alive = np.zeros(0, dtype=bool) # False - строка удалённой книги
+        self._rows: List[Book | None] = [] # строка -> книга
+        self._row_of: Dict[str, int] = {} # ISBN -> строка
+        self._dead = 0 # удалённых строк (они убираются при сжатии)
+
+
+    def _reserve(self, size: int) -> None: # ёмкость столбцов не меньше size строк (с запасом)
+        capacity = len(self._alive)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for field, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self._columns[field] = grown
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+
+    def _write_row(self, row: int, book: Book) -> None: # значения полей книги в строку столбцов
+        for field, dictionary in self._dictionaries.items():
+            self._columns[field][row] = dictionary.encode(getattr(book, field))
+        self._columns['year'][row] = book.year
+
+
+    def _append_rows(self, books: list) -> None: # новые строки в конец столбцов
+        start, end = len(self._rows), len(self._rows) + len(books)
+        self._reserve(end)
+        for field, dictionary in self._dictionaries.items(): # столбец заполняется целиком, а не по ячейке
+            encode = dictionary.encode
+            self._columns[field][start:end] = [encode(getattr(book, field)) for book in books]
+        self._columns['year'][start:end] = [book.year for book in books]
+        self._row_of.update((book.isbn, row) for row, book in enumerate(books, start))
+        self._rows.extend(books)
+        self._alive[start:end] = True
+
+
+    def _compact(self) -> None: # удаление строк удалённых книг из столбцов
+        keep = np.flatnonzero(self._alive[:len(self._rows)])
+        for field, column in self._columns.items():
+            self._columns[field] = column[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._rows = [self._rows[row] for row in keep]
+        self._row_of = {book.isbn: row for row, book in enumerate(self._rows) if book is not None}
+        self._dead = 0
+
+
+    def add_book_to_lib(self, book: Book) -> None:
+        super().add_book_to_lib(book)
+        self._append_rows([book])
+
+
+    def bulk_load(self, books: Iterable[Book]) -> int:
+        books = list(books)
+        count = super().bulk_load(books)
+        self._append_rows(books)
+        return count
+
+
+    def remove_book_from_lib(self, isbn: str) -> None:
+        super().remove_book_from_lib(isbn)
+        row = self._row_of.pop(isbn)
+        self._alive[row] = False
+        self._rows[row] = None
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 2 > len(self._rows):
+            self._compact()
+
+
+    def update_book_info(self, isbn: str, /, **kwargs) -> None:
+        super().update_book_info(isbn, **kwargs)
+        row = self._row_of.pop(isbn)
+        book = self._index.get_by_isbn(kwargs.get('isbn', isbn)) # после fork() - копия книги
+        if book is None: # обновление прошло - книга с новым ISBN есть в индексе
+            raise KeyError(f"Error: книга с ISBN '{kwargs.get('isbn', isbn)}' не найдена")
+        self._rows[row] = book
+        self._row_of[book.isbn] = row
+        self._write_row(row, book)
+
+
+    def _column_mask(self, field: str, op: str, value): # маска строк, удовлетворяющих одному условию
+        column = self._columns[field][:len(self._rows)]
+        dictionary = self._dictionaries.get(field)
+        if op in ('in', 'not_in'):
+            values = list(value)
+            if dictionary is not None:
+                values = [code for code in map(dictionary.lookup, values) if code >= 0]
+            mask = np.isin(column, np.asarray(values, dtype=column.dtype))
+            return ~mask if op == 'not_in' else mask
+        if dictionary is not None:
+            if op not in ('eq', 'ne'):
+                raise ValueError(f"Error: условие '{op}' нельзя применить к полю '{field}'")
+            code = dictionary.lookup(value)
+            return column == code if op == 'eq' else column != code
+        if op == 'between':
+            lo, hi = value
+            return (column >= lo) & (column <= hi)
+        return {'eq': column.__eq__, 'ne': column.__ne__, 'lt': column.__lt__,
+                'lte': column.__le__, 'gt': column.__gt__, 'gte': column.__ge__}[op](value)
+
+
+    def _mask(self, conditions: Dict): # маска живых строк, удовлетворяющих всем условиям
+        # условие: поле=значение или поле__оператор=значение, например year__between=(1900, 1950),
+        # genre__in={'Роман', 'Поэзия'}, author__not_in={...}
+        mask = self._alive[:len(self._rows)].copy()
+        for condition, value in conditions.items():
+            field, _, op = condition.partition('__')
+            op = op or 'eq'
+            if field not in self._columns:
+                raise KeyError(f"Error: нет столбца '{field}', доступны: {', '.join(self._columns)}")
+            if op not in self.OPERATORS:
+                raise ValueError(f"Error: неизвестное условие '{op}', доступны: {', '.join(self.OPERATORS)}")
+            mask &= self._column_mask(field, op, value)
+        return mask
+
+
+    @instrumented('select', lookup=True)
+    def select(self, **conditions) -> list: # книги, удовлетворяющие всем условиям, в порядке добавления
+        rows = self._rows
+        return [rows[row] for row in np.flatnonzero(self._mask(conditions)).tolist()]
+
+
+    def count(self, **conditions) -> int: # количество книг, удовлетворяющих всем условиям
+        return int(np.count_nonzero(self._mask(conditions)))
+
+
+    def group_count(self, field: str, **conditions) -> Dict: # количество книг по значениям поля среди подходящих
+        mask = self._mask(conditions)
+        if field not in self._columns:
+            raise KeyError(f"Error: нет столбца '{field}', доступны: {', '.join(self._columns)}")
+        column = self._columns[field][:len(self._rows)][mask]
+        dictionary = self._dictionaries.get(field)
+        if dictionary is not None:
+            counts = np.bincount(column, minlength=len(dictionary.values))
+            return {dictionary.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+        values, counts = np.unique(column, return_counts=True)
+        return {int(value): int(amount) for value, amount in zip(values, counts)}
@@ -0,0 +1,88 @@
+from typing import Callable, Dict
+from src.catalog_io import book_from_dict, book_to_dict
+from src.library_classes import Library
+
+
+# команды в виде словарей {"op": ..., аргументы}; общие для сервера и пакетного режима CLI
+
+
+def _books(books) -> list: # книги результата в виде словарей
+    return [book_to_dict(book) for book in books]
+
+
+def _find_by_isbn(library: Library, command: Dict):
+    book = library.find_by_isbn(command['isbn'])
+    return book_to_dict(book) if book is not None else None
+
+
+def _add(library: Library, command: Dict): # книга в поле "book" или поля книги прямо в команде
+    library.add_book_to_lib(book_from_dict(command.get('book', command)))
+
+
+def _bulk_load(library: Library, command: Dict):
+    return library.bulk_load(book_from_dict(data) for data in command['books'])
+
+
+def _remove(library: Library, command: Dict):
+    library.remove_book_from_lib(command['isbn'])
+
+
+INT_FIELDS = ('year', 'number') # числовые поля: в JSON могут прийти строкой, как и в book_from_dict
+
+
+def _update(library: Library, command: Dict):
+    changes = dict(command['changes'])
+    for field in INT_FIELDS:
+        if field in changes:
+            changes[field] = int(changes[field])
+    library.update_book_info(command['isbn'], **changes)
+
+
+def _list(library: Library, command: Dict): # страница книг: order_by, descending, offset, limit
+    limit = command.get('limit')
+    return _books(library.list(command.get('order_by'), bool(command.get('descending', False)),
+                               int(command.get('offset', 0)), None if limit is None else int(limit)))
+
+
+READ_COMMANDS: Dict[str, Callable] = { # команды, не изменяющие библиотеку
+    'find_by_isbn': _find_by_isbn,
+    'find_by_author': lambda library, command: _books(library.find_by_author(command['author'])),
+    'find_by_year': lambda library, command: _books(library.find_by_year(int(command['year']))),
+    'find_by_genre': lambda library, command: _books(library.find_by_genre(command['genre'])),
+    'find_by_year_range': lambda library, command: _books(
+        library.find_by_year_range(int(command['lo']), int(command['hi']))),
+    'find_by': lambda library, command: _books(library.find_by(command['field'], command['value'])),
+    'find_in_range': lambda library, command: _books(
+        library.find_in_range(command['field'], command['lo'], command['hi'])),
+    'find': lambda library, command: _books(library.find(**command.get('criteria', {}))),
+    'search_text': lambda library, command: _books(
+        library.search_text(command['query'], int(command.get('limit', 10)))),
+    'list': _list,
+    'count': lambda library, command: len(library),
+    'stats': lambda library, command: library.stats().summary(int(command.get('k', 10))),
+}
+
+WRITE_COMMANDS: Dict[str, Callable] = { # команды, изменяющие библиотеку
+    'add': _add,
+    'bulk_load': _bulk_load,
+    'remove': _remove,
+    'update': _update,
+}
+
+
+def is_write(command: Dict) -> bool: # изменяет ли команда библиотеку
+    return command.get('op') in WRITE_COMMANDS
+
+
+def execute(library: Library, command: Dict) -> Dict: # выполнение команды; ошибки возвращаются в ответе
+    op = command.get('op') if isinstance(command, dict) else None
+    handler = (READ_COMMANDS.get(op) or WRITE_COMMANDS.get(op)) if isinstance(op, str) else None
+    if handler is None:
+        return {'ok': False, 'error': f"Неизвестная команда: '{op}'", 'type': 'UnknownCommand'}
+    try:
+        return {'ok': True, 'result': handler(library, command)}
+    except KeyError as e:
+        message = e.args[0] if e.args and str(e.args[0]).startswith('Error') else f"Error: отсутствует аргумент {e}"
+        return {'ok': False, 'error': message, 'type': 'KeyError'}
+    except Exception as e:
+        return {'ok': False, 'error': str(e), 'type': type(e).__name__}
@@ -0,0 +1,220 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List
+from src.library_classes import Book, BookCollection, BookCollectionView, Library, LibrarySnapshot, ResultCursor
+from src.stats import CatalogStats
+
+
+class RWLock: # блокировка "много читателей или один писатель" с приоритетом писателя
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0 # активных читателей
+        self._writer = False # занята ли блокировка писателем
+        self._waiting_writers = 0 # писателей в очереди: новые читатели их пропускают
+        self._local = threading.local() # глубина чтения в текущем потоке (повторный вход)
+
+
+    @contextmanager
+    def read(self) -> Iterator[None]: # общий доступ на чтение (можно входить повторно в том же потоке)
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            with self._cond:
+                while self._writer or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+
+    @contextmanager
+    def write(self) -> Iterator[None]: # монопольный доступ на запись
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError("Error: нельзя начать запись, удерживая блокировку чтения")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ThreadSafeLibrary(Library): # библиотека для многопоточного доступа
+    # поиски выполняются параллельно под блокировкой чтения, изменения - по одному
+    # под блокировкой записи, поэтому каждое изменение индексов (в том числе перенос
+    # книги между корзинами в update_book_info) читатели видят только целиком.
+    # Представления, курсоры, перебор и статистика строятся по копиям, снятым под
+    # блокировкой: читать их можно без блокировки, пока другие потоки меняют библиотеку
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._lock = RWLock()
+
+
+    def read_locked(self): # блокировка чтения для нескольких согласованных поисков подряд
+        return self._lock.read()
+
+
+    def add_book_to_lib(self, book: Book) -> None:
+        with self._lock.write():
+            super().add_book_to_lib(book)
+
+
+    def bulk_load(self, books: Iterable[Book]) -> int:
+        books = list(books) # чтение источника - вне блокировки
+        with self._lock.write():
+            return super().bulk_load(books)
+
+
+    def remove_book_from_lib(self, isbn: str) -> None:
+        with self._lock.write():
+            super().remove_book_from_lib(isbn)
+
+
+    def update_book_info(self, isbn: str, /, **kwargs) -> None:
+        with self._lock.write():
+            super().update_book_info(isbn, **kwargs)
+
+
+    def fork(self) -> Library: # ветвление меняет служебные данные оригинала - под блокировкой записи
+        with self._lock.write():
+            return super().fork()
+
+
+    def snapshot(self) -> LibrarySnapshot:
+        with self._lock.write():
+            return super().snapshot()
+
+
+    def register_index(self, field: str, kind: str = 'hash') -> None: # построение индекса - под блокировкой записи
+        with self._lock.write():
+            super().register_index(field, kind)
+
+
+    def drop_index(self, field: str) -> None:
+        with self._lock.write():
+            super().drop_index(field)
+
+
+    def list(self, order_by: str | None = None, descending: bool = False, offset: int = 0,
+             limit: int | None = None) -> List[Book]: # первый список по полю строит индекс - под блокировкой записи
+        with self._lock.read():
+            if order_by is None or self._index.is_ordered(order_by):
+                return super().list(order_by, descending, offset, limit)
+        with self._lock.write():
+            return super().list(order_by, descending, offset, limit)
+
+
+    def find_by(self, field: str, value) -> List[Book]:
+        with self._lock.read():
+            return super().find_by(field, value)
+
+
+    def find_in_range(self, field: str, lo, hi) -> List[Book]:
+        with self._lock.read():
+            return super().find_in_range(field, lo, hi)
+
+
+    def find_by_author(self, author: str) -> List[Book]:
+        with self._lock.read():
+            return super().find_by_author(author)
+
+
+    def find_by_year(self, year: int) -> List[Book]:
+        with self._lock.read():
+            return super().find_by_year(year)
+
+
+    def find_by_genre(self, genre: str) -> List[Book]:
+        with self._lock.read():
+            return super().find_by_genre(genre)
+
+
+    def find_by_isbn(self, isbn: str) -> Book | None:
+        with self._lock.read():
+            return super().find_by_isbn(isbn)
+
+
+    def find_by_year_range(self, lo: int, hi: int) -> List[Book]:
+        with self._lock.read():
+            return super().find_by_year_range(lo, hi)
+
+
+    def count_in_range(self, lo: int, hi: int) -> int:
+        with self._lock.read():
+            return super().count_in_range(lo, hi)
+
+
+    def oldest(self, n: int) -> List[Book]:
+        with self._lock.read():
+            return super().oldest(n)
+
+
+    def newest(self, n: int) -> List[Book]:
+        with self._lock.read():
+            return super().newest(n)
+
+
+    def search_text(self, query: str, limit: int = 10) -> List[Book]:
+        with self._lock.read():
+            return super().search_text(query, limit)
+
+
+    def find(self, **criteria) -> List[Book]:
+        with self._lock.read():
+            return super().find(**criteria)
+
+
+    def explain(self, **criteria) -> List[Dict]:
+        with self._lock.read():
+            return super().explain(**criteria)
+
+
+    def stats(self) -> CatalogStats: # копия статистики: живой объект меняется писателями
+        with self._lock.read():
+            return super().stats().detached()
+
+
+    def cache_stats(self) -> Dict | None:
+        with self._lock.read():
+            return super().cache_stats()
+
+
+    def view(self, field: str, key) -> BookCollectionView: # представление над копией корзины, снятой под блокировкой
+        with self._lock.read():
+            return BookCollection(super().view(field, key).to_list())[:]
+
+
+    def cursor(self, field: str, key, offset: int = 0, limit: int = 50) -> ResultCursor:
+        return ResultCursor(self.view(field, key), offset, limit)
+
+
+    def iter_books(self) -> Iterator[Book]: # перебор копии списка книг, снятой под блокировкой
+        return iter(self)
+
+
+    def __len__(self) -> int:
+        with self._lock.read():
+            return super().__len__()
+
+
+    def __contains__(self, book: Book) -> bool:
+        with self._lock.read():
+            return super().__contains__(book)
+
+
+    def __iter__(self) -> Iterator[Book]: # перебор копии списка книг, снятой под блокировкой
+        with self._lock.read():
+            return iter(list(super().__iter__()))
@@ -0,0 +1,47 @@
+from copy import copy as shallow_copy
+
+
+class CopyOnWrite: # объект, вложенные контейнеры которого могут быть общими с другими ветками библиотеки
+    # пока библиотеку не ветвили (_owner is None), всё меняется на месте; после fork() у каждой
+    # ветки свой набор id контейнеров, которые она создала или уже скопировала, - только их можно
+    # менять на месте, а общий контейнер сначала копируется (неглубоко: вложенные остаются общими)
+    _owner: set | None = None
+
+
+    def copy(self): # неглубокая копия: всё вложенное общее с оригиналом и копируется при первой записи
+        clone = shallow_copy(self)
+        clone._owner = set()
+        return clone
+
+
+    def _share(self) -> None: # всё вложенное теперь может быть общим: запись начнёт копировать
+        self._owner = set()
+
+
+    def _owns(self, value) -> bool: # можно ли менять value на месте
+        return self._owner is None or id(value) in self._owner
+
+
+    def _adopt(self, value): # value создан этим объектом - его можно менять на месте
+        if self._owner is not None:
+            self._owner.add(id(value))
+        return value
+
+
+    def _writable(self, name: str): # атрибут name, который можно менять (общий сначала копируется)
+        value = getattr(self, name)
+        if self._owner is None or id(value) in self._owner:
+            return value
+        value = value.copy()
+        setattr(self, name, value)
+        self._owner.add(id(value))
+        return value
+
+
+    def _writable_item(self, container, key): # элемент container[key], который можно менять
+        value = container[key]
+        if self._owner is None or id(value) in self._owner:
+            return value
+        value = container[key] = value.copy()
+        self._owner.add(id(value))
+        return value
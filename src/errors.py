@@ -1,2 +1,14 @@
 class ExistError(Exception):
     pass
+
+
+class BulkLoadError(ExistError): # ошибка пакетной загрузки со всеми повторяющимися ISBN сразу
+    def __init__(self, duplicates: list) -> None:
+        self.duplicates = duplicates # ISBN, которые уже есть в библиотеке или повторяются в пакете
+        shown = ', '.join(duplicates[:10])
+        more = f" и ещё {len(duplicates) - 10}" if len(duplicates) > 10 else ""
+        super().__init__(f"Error: найдено {len(duplicates)} повторяющихся ISBN: {shown}{more}")
+
+
+    def __reduce__(self): # передача между процессами (шардами) с исходным списком ISBN
+        return type(self), (self.duplicates,)
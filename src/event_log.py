@@ -0,0 +1,235 @@
+import argparse
+import json
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from src.library_classes import Book, Library
+
+
+# формат журнала событий (все числа - varint: по 7 бит в байте, старший бит - «дальше есть ещё байт»):
+#   сигнатура | события
+# событие - код операции (1 байт) и её аргументы. Строка записывается номером в таблице строк журнала,
+# а при первом появлении - длиной и байтами utf-8 (номер она получает по порядку появления), поэтому
+# повторяющиеся авторы, жанры и названия занимают 1-2 байта. Целые - zigzag varint.
+# Изменение книги - ISBN, количество полей и пары (имя поля, значение с тегом типа)
+MAGIC = b'LIBEVT01'
+OPS = ('add', 'remove', 'update', 'find_by_author', 'find_by_year', 'find_by_genre', 'find_by_isbn')
+CODES = {op: code for code, op in enumerate(OPS)}
+FIND_OPS = OPS[3:]
+VALUE_INT, VALUE_STR = 0, 1 # теги типа значения в изменении книги
+FLUSH_SIZE = 1 << 16 # размер буфера, после которого он пишется в файл
+
+
+class EventLogWriter: # запись событий библиотеки в бинарный журнал
+    def __init__(self, path: str) -> None:
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._buffer = bytearray()
+        self._strings: Dict[str, int] = {} # строка -> номер в таблице строк журнала
+        self.events = 0 # записано событий
+
+
+    def __enter__(self) -> 'EventLogWriter':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def _uint(self, value: int) -> None:
+        buffer = self._buffer
+        while value > 0x7F:
+            buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+
+    def _int(self, value: int) -> None: # zigzag: небольшие отрицательные числа тоже занимают мало байт
+        self._uint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+    def _str(self, value: str) -> None: # номер известной строки (чётный) или длина новой (нечётная) и байты
+        string_id = self._strings.get(value)
+        if string_id is not None:
+            self._uint(string_id << 1)
+            return
+        self._strings[value] = len(self._strings)
+        data = value.encode('utf-8')
+        self._uint(len(data) << 1 | 1)
+        self._buffer += data
+
+
+    def _event(self, op: str) -> None: # начало события
+        if len(self._buffer) >= FLUSH_SIZE:
+            self.flush()
+        self._buffer.append(CODES[op])
+        self.events += 1
+
+
+    def add(self, book: Book) -> None: # добавление книги
+        if type(book) is not Book:
+            raise TypeError("Error: в журнал событий записываются только книги Book")
+        self._event('add')
+        self._str(book.title)
+        self._str(book.author)
+        self._int(book.year)
+        self._str(book.genre)
+        self._str(book.isbn)
+
+
+    def remove(self, isbn: str) -> None: # удаление книги
+        self._event('remove')
+        self._str(isbn)
+
+
+    def update(self, isbn: str, /, **changes) -> None: # изменение полей книги
+        self._event('update')
+        self._str(isbn)
+        self._uint(len(changes))
+        for field, value in changes.items():
+            self._str(field)
+            if isinstance(value, int):
+                self._buffer.append(VALUE_INT)
+                self._int(value)
+            else:
+                self._buffer.append(VALUE_STR)
+                self._str(str(value))
+
+
+    def find(self, op: str, key) -> None: # поиск: find_by_author, find_by_year, find_by_genre или find_by_isbn
+        if op not in FIND_OPS:
+            raise ValueError(f"Error: неизвестный поиск '{op}'")
+        self._event(op)
+        if op == 'find_by_year':
+            self._int(key)
+        else:
+            self._str(key)
+
+
+    def flush(self) -> None: # запись буфера в файл
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def read_events(path: str) -> Iterator[Tuple[str, tuple]]: # события журнала: (операция, аргументы)
+    # аргументы: add - (title, author, year, genre, isbn), update - (isbn, {поле: значение}),
+    # остальные - (ключ,)
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"Error: файл '{path}' не является журналом событий")
+    strings: List[str] = []
+    position, end = len(MAGIC), len(data)
+
+    def uint() -> int:
+        nonlocal position
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def integer() -> int:
+        value = uint()
+        return -(value + 1 >> 1) if value & 1 else value >> 1
+
+    def string() -> str:
+        nonlocal position
+        value = uint()
+        if not value & 1:
+            return strings[value >> 1]
+        size = value >> 1
+        if position + size > end: # срез за концом данных просто короче - обрыв проверяется явно
+            raise ValueError(f"Error: журнал событий '{path}' повреждён (позиция {position})")
+        text = data[position:position + size].decode('utf-8')
+        position += size
+        strings.append(text)
+        return text
+
+    try:
+        while position < end:
+            code = data[position]
+            position += 1
+            op = OPS[code]
+            if op == 'add':
+                yield op, (string(), string(), integer(), string(), string())
+            elif op == 'update':
+                isbn = string()
+                changes = {}
+                for _ in range(uint()):
+                    field = string()
+                    tag = data[position]
+                    position += 1
+                    changes[field] = integer() if tag == VALUE_INT else string()
+                yield op, (isbn, changes)
+            elif op == 'find_by_year':
+                yield op, (integer(),)
+            else:
+                yield op, (string(),)
+    except IndexError: # журнал оборван посреди числа или события либо содержит неизвестный код
+        raise ValueError(f"Error: журнал событий '{path}' повреждён (позиция {position})") from None
+
+
+def _handlers(library) -> Dict[str, Callable]: # операция журнала -> вызов метода библиотеки
+    add, update = library.add_book_to_lib, library.update_book_info
+    return {'add': lambda *fields: add(Book(*fields)), 'remove': library.remove_book_from_lib,
+            'update': lambda isbn, changes: update(isbn, **changes),
+            'find_by_author': library.find_by_author, 'find_by_year': library.find_by_year,
+            'find_by_genre': library.find_by_genre, 'find_by_isbn': library.find_by_isbn}
+
+
+def replay(events: Iterable[Tuple[str, tuple]], library) -> Dict: # применение журнала к любой библиотеке
+    # журнал сначала разбирается целиком, потом события выполняются подряд без случайных чисел и вывода;
+    # книги создаются при выполнении, поэтому один разобранный список можно применять к разным библиотекам
+    handlers = _handlers(library)
+    counts = {op: 0 for op in OPS}
+    calls = []
+    for op, args in events:
+        counts[op] += 1
+        calls.append((handlers[op], args))
+    started = perf_counter()
+    for handler, args in calls:
+        handler(*args)
+    elapsed = perf_counter() - started
+    return {'events': len(calls), 'event_counts': counts, 'elapsed': elapsed,
+            'events_per_second': len(calls) / elapsed if elapsed else 0.0, 'final_size': len(library)}
+
+
+def _backends() -> Dict[str, Callable]: # библиотеки, на которых можно повторить журнал
+    from src.concurrency import ThreadSafeLibrary
+    from src.columnar import ColumnarLibrary
+    from src.sharding import ShardedLibrary
+    return {'library': Library, 'thread_safe': ThreadSafeLibrary, 'columnar': ColumnarLibrary,
+            'sharded': ShardedLibrary}
+
+
+def main(argv=None) -> None: # повтор журнала: python -m src.event_log FILE --backend library columnar
+    backends = _backends()
+    parser = argparse.ArgumentParser(description="Повтор журнала событий симуляции на разных библиотеках")
+    parser.add_argument('path', help="журнал, записанный run_simulation(record=...) или --record")
+    parser.add_argument('--backend', nargs='+', default=['library'], choices=sorted(backends))
+    args = parser.parse_args(argv)
+
+    events = list(read_events(args.path))
+    report = {}
+    for name in args.backend:
+        library = backends[name]()
+        try:
+            report[name] = replay(events, library)
+        finally:
+            if hasattr(library, 'close'):
+                library.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
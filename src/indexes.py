@@ -0,0 +1,307 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, Iterator, List
+from src.cow import CopyOnWrite
+
+
+MISSING = object() # у книги нет такого поля (например, month у обычной книги)
+
+
+class HashIndex(CopyOnWrite): # вторичный индекс: значение поля -> коллекция книг с этим значением
+    kind = 'hash'
+
+
+    def __init__(self, field: str, collection_factory) -> None:
+        self.field = field # индексируемое поле книги
+        self.buckets: Dict = {} # значение -> BookCollection
+        self._new_collection = collection_factory
+
+
+    def __len__(self) -> int: # количество различных значений
+        return len(self.buckets)
+
+
+    def key_of(self, book): # значение поля книги или MISSING
+        return getattr(book, self.field, MISSING)
+
+
+    def get(self, key): # коллекция книг со значением key или None
+        try:
+            return self.buckets.get(key)
+        except TypeError: # нехэшируемое значение не может быть ключом
+            return None
+
+
+    def check(self, key) -> None: # TypeError, если книгу со значением key нельзя положить в индекс
+        try:
+            hash(key)
+        except TypeError:
+            raise TypeError(f"Error: значение поля '{self.field}' нельзя индексировать: {key!r}") from None
+
+
+    def _new_key(self, key) -> None: # появилось новое значение (нужно упорядоченным индексам)
+        pass
+
+
+    def _dropped_key(self, key) -> None: # значение исчезло из индекса
+        pass
+
+
+    def add(self, book, key=MISSING) -> None: # добавление книги (key - значение поля, если уже известно)
+        if key is MISSING:
+            key = self.key_of(book)
+            if key is MISSING: # книги без поля в индекс не попадают
+                return
+        buckets = self.buckets if self._owner is None else self._writable('buckets')
+        try:
+            collection = buckets.get(key)
+        except TypeError:
+            raise TypeError(f"Error: значение поля '{self.field}' нельзя индексировать: {key!r}") from None
+        if collection is None:
+            collection = buckets[key] = self._adopt(self._new_collection())
+            self._new_key(key)
+        elif self._owner is not None: # корзина может быть общей с другой веткой библиотеки
+            collection = self._writable_item(buckets, key)
+        collection.add_to_collection(book)
+
+
+    def add_many(self, books: Iterable) -> None: # добавление многих книг за один проход
+        for book in books:
+            self.add(book)
+
+
+    def remove(self, book, key=MISSING) -> None: # удаление книги, лежащей под значением key
+        if key is MISSING:
+            key = self.key_of(book)
+            if key is MISSING:
+                return
+        if self.get(key) is None:
+            return
+        buckets = self._writable('buckets')
+        collection = self._writable_item(buckets, key)
+        collection.remove_from_collection(book)
+        if collection.is_empty():
+            del buckets[key]
+            self._dropped_key(key)
+
+
+class SortedIndex(HashIndex): # индекс с отсортированным списком значений: диапазоны и упорядоченный перебор
+    kind = 'sorted'
+
+
+    def __init__(self, field: str, collection_factory) -> None:
+        super().__init__(field, collection_factory)
+        self.keys: List = [] # отсортированные значения, для которых есть книги
+        self._batching = False # во время add_many список значений сортируется один раз в конце
+
+
+    def _new_key(self, key) -> None:
+        keys = self._writable('keys')
+        if self._batching:
+            keys.append(key)
+            return
+        try:
+            insort(keys, key)
+        except TypeError:
+            del self.buckets[key]
+            raise TypeError(f"Error: значения поля '{self.field}' нельзя упорядочить: {key!r}") from None
+
+
+    def check(self, key) -> None: # новое значение должно сравниваться с уже известными
+        super().check(key)
+        if not self.keys or key in self.buckets:
+            return
+        try:
+            bisect_left(self.keys, key) # те же сравнения, что при вставке значения
+        except TypeError:
+            raise TypeError(f"Error: значения поля '{self.field}' нельзя упорядочить: {key!r}") from None
+
+
+    def _dropped_key(self, key) -> None:
+        keys = self._writable('keys')
+        del keys[bisect_left(keys, key)]
+
+
+    def add_many(self, books: Iterable) -> None:
+        self._batching = True
+        try:
+            super().add_many(books)
+        finally:
+            self._batching = False
+            self._writable('keys').sort()
+
+
+    def keys_in_range(self, lo, hi) -> List: # значения из [lo, hi], для которых есть книги
+        return self.keys[bisect_left(self.keys, lo):bisect_right(self.keys, hi)]
+
+
+    def range(self, lo, hi) -> list: # книги со значением от lo до hi включительно, по возрастанию
+        books: list = []
+        for key in self.keys_in_range(lo, hi):
+            books.extend(self.buckets[key])
+        return books
+
+
+    def count_range(self, lo, hi) -> int: # количество книг со значением от lo до hi
+        return sum(len(self.buckets[key]) for key in self.keys_in_range(lo, hi))
+
+
+    def iter_ordered(self, descending: bool = False) -> Iterator: # перебор книг по значению поля
+        keys = reversed(self.keys) if descending else iter(self.keys)
+        for key in keys:
+            yield from self.buckets[key]
+
+
+class OrderedIndex(SortedIndex): # упорядоченный индекс с доступом по номеру книги: страницы и первые N
+    # кроме корзин, книги лежат в списке блоков, отсортированном по (значение, isbn): блоки не длиннее
+    # 2 * BLOCK_SIZE записей, последние записи блоков - для бинарного поиска, дерево Фенвика по размерам
+    # блоков - для поиска книги по номеру. Вставка и удаление - O(log n + BLOCK_SIZE),
+    # страница из k книг с любого места - O(log n + k)
+    kind = 'ordered'
+    BLOCK_SIZE = 512
+
+
+    def __init__(self, field: str, collection_factory) -> None:
+        super().__init__(field, collection_factory)
+        self._blocks: List[list] = [] # блоки записей (значение, isbn, книга)
+        self._maxes: List[tuple] = [] # (значение, isbn) последней записи каждого блока
+        self._tree: List[int] = [0] # дерево Фенвика по размерам блоков (с единицы)
+        self.size = 0 # книг в индексе
+        self._pending: list = [] # записи пакета add_many (сортируются вместе)
+
+
+    def _rebuild_tree(self) -> None: # дерево заново - после того как блоков стало больше или меньше
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = self._adopt(tree)
+
+
+    def _resize_block(self, i: int, delta: int) -> None: # размер блока i изменился на delta
+        tree = self._writable('_tree')
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+
+    def _locate(self, position: int) -> tuple: # (блок, место в блоке) книги с номером position
+        tree = self._tree
+        block = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            nxt = block + step
+            if nxt < len(tree) and tree[nxt] <= position:
+                block = nxt
+                position -= tree[nxt]
+            step >>= 1
+        return block, position
+
+
+    def _insert(self, entry: tuple) -> None: # запись (значение, isbn, книга) на своё место
+        blocks, maxes = self._writable('_blocks'), self._writable('_maxes')
+        if not blocks:
+            blocks.append(self._adopt([entry]))
+            maxes.append(entry[:2])
+            self.size += 1
+            self._rebuild_tree()
+            return
+        i = min(bisect_left(maxes, entry[:2]), len(blocks) - 1)
+        block = self._writable_item(blocks, i)
+        j = bisect_left(block, entry[:2])
+        if j < len(block) and block[j][:2] == entry[:2]: # та же книга (её копия после fork) - замена записи
+            block[j] = entry
+            return
+        block.insert(j, entry) # isbn у книг разные, поэтому сами книги не сравниваются
+        self.size += 1
+        maxes[i] = block[-1][:2]
+        if len(block) <= 2 * self.BLOCK_SIZE:
+            self._resize_block(i, 1)
+            return
+        half = self._adopt(block[self.BLOCK_SIZE:]) # переполненный блок делится пополам
+        del block[self.BLOCK_SIZE:]
+        blocks.insert(i + 1, half)
+        maxes[i] = block[-1][:2]
+        maxes.insert(i + 1, half[-1][:2])
+        self._rebuild_tree()
+
+
+    def _delete(self, key, isbn: str) -> None: # удаление записи книги
+        probe = (key, isbn)
+        i = bisect_left(self._maxes, probe)
+        if i == len(self._blocks):
+            return
+        j = bisect_left(self._blocks[i], probe)
+        if j == len(self._blocks[i]) or self._blocks[i][j][:2] != probe:
+            return
+        blocks, maxes = self._writable('_blocks'), self._writable('_maxes')
+        block = self._writable_item(blocks, i)
+        del block[j]
+        self.size -= 1
+        if block:
+            maxes[i] = block[-1][:2]
+            self._resize_block(i, -1)
+        else:
+            del blocks[i], maxes[i]
+            self._rebuild_tree()
+
+
+    def add(self, book, key=MISSING) -> None:
+        if key is MISSING:
+            key = self.key_of(book)
+            if key is MISSING:
+                return
+        super().add(book, key)
+        if self._batching:
+            self._pending.append((key, book.isbn, book))
+        else:
+            self._insert((key, book.isbn, book))
+
+
+    def add_many(self, books: Iterable) -> None: # большой пакет - сортировка всех записей вместо вставок
+        super().add_many(books)
+        pending, self._pending = self._pending, []
+        if len(pending) < self.size // 8 + 1:
+            for entry in pending:
+                self._insert(entry)
+            return
+        entries = sorted([entry for block in self._blocks for entry in block] + pending)
+        self._blocks = self._adopt([self._adopt(entries[i:i + self.BLOCK_SIZE])
+                                    for i in range(0, len(entries), self.BLOCK_SIZE)])
+        self._maxes = self._adopt([block[-1][:2] for block in self._blocks])
+        self.size = len(entries)
+        self._rebuild_tree()
+
+
+    def remove(self, book, key=MISSING) -> None:
+        if key is MISSING:
+            key = self.key_of(book)
+            if key is MISSING:
+                return
+        super().remove(book, key)
+        self._delete(key, book.isbn)
+
+
+    def page(self, offset: int = 0, limit: int | None = None, descending: bool = False) -> list:
+        # книги с номерами offset..offset + limit в порядке (значение, isbn) или обратном
+        start, stop = offset, self.size if limit is None else min(offset + limit, self.size)
+        if descending:
+            start, stop = self.size - stop, self.size - start
+        if start >= stop:
+            return []
+        i, j = self._locate(start)
+        books: list = []
+        need = stop - start
+        while need > 0:
+            block = self._blocks[i]
+            chunk = block[j:j + need]
+            books.extend(entry[2] for entry in chunk)
+            need -= len(chunk)
+            i, j = i + 1, 0
+        if descending:
+            books.reverse()
+        return books
+
+
+INDEX_KINDS = {'hash': HashIndex, 'sorted': SortedIndex, 'ordered': OrderedIndex} # виды индексов для IndexDict.register_index
@@ -1,15 +1,40 @@
-from typing import Iterator
+from copy import copy
+from sys import intern
+from typing import Iterable, Iterator, List, Tuple, Type, TypeVar
 from typing import Dict
-from src.errors import ExistError
+from src.cache import MISS, QueryCache
+from src.cow import CopyOnWrite
+from src.errors import BulkLoadError, ExistError
+from src.indexes import INDEX_KINDS, MISSING, HashIndex, OrderedIndex, SortedIndex
+from src.metrics import Metrics, instrumented
+from src.stats import CatalogStats
+from src.text_index import TextIndex
+
+
+_SHARED_INTS: Dict[int, int] = {} # общие объекты для повторяющихся чисел (годов)
+
+
+def shared(value): # одна копия повторяющегося значения на все книги и ключи индексов
+    if type(value) is str:
+        return intern(value)
+    if type(value) is int: # года вне кэша малых чисел Python иначе создаются заново у каждой книги
+        return _SHARED_INTS.setdefault(value, value)
+    return value
 
 
 class Book:
+    # __slots__ вместо словаря атрибутов у каждой книги; значения полей SHARED_FIELDS
+    # (авторы, жанры, года) повторяются в каталоге - все книги ссылаются на одну копию
+    __slots__ = ('title', 'author', 'year', 'genre', 'isbn')
+    SHARED_FIELDS: Tuple[str, ...] = ('author', 'year', 'genre')
+
+
     # инициализация книги с её данными
     def __init__(self, title: str, author: str, year: int, genre: str, isbn: str) -> None:
         self.title = title # название книги
-        self.author = author # автор книги
-        self.year = year # год издания
-        self.genre = genre # жанр книги
+        self.author = shared(author) # автор книги
+        self.year = shared(year) # год издания
+        self.genre = shared(genre) # жанр книги
         self.isbn = isbn # уникальный идентификатор книги
 
 
@@ -25,13 +50,21 @@ class Book:
         if not isinstance(other, Book):
             return False
         return self.isbn == other.isbn
+
+
+    def __hash__(self) -> int: # хэш согласован с __eq__ - по isbn
+        return hash(self.isbn)
     
 
 class Magazine(Book): # журнал - наследник класса "книга"
+    __slots__ = ('number', 'month')
+    SHARED_FIELDS = Book.SHARED_FIELDS + ('month',)
+
+
     def __init__(self, title: str, author: str, year: int, number: int, month: str, genre: str = "Журнал", isbn: str = ""):
         super().__init__(title, author, year, genre, isbn)
         self.number = number # номер выпуска
-        self.month = month # месяц выпуска
+        self.month = shared(month) # месяц выпуска
     
 
     def __repr__(self):
@@ -43,11 +76,15 @@ class Magazine(Book): # журнал - наследник класса "книг
         
 
 class TrainigMaterial(Book): # методическое пособие - наследник класса "книга"
+    __slots__ = ('edu_institution', 'readers')
+    SHARED_FIELDS = Book.SHARED_FIELDS + ('edu_institution', 'readers')
+
+
     def __init__(self, title: str, author: str, year: int, edu_institution: int,
                    readers: str, genre: str = "Методическое пособие", isbn: str = ""):
         super().__init__(title, author, year, genre, isbn)
-        self.edu_institution = edu_institution # учебное заведение
-        self.readers = readers # читатели
+        self.edu_institution = shared(edu_institution) # учебное заведение
+        self.readers = shared(readers) # читатели
 
 
     def __repr__(self):
@@ -59,11 +96,24 @@ class TrainigMaterial(Book): # методическое пособие - нас
 
 
 class BookCollection: # коллекция книг
+    # книги хранятся в словаре по isbn: словарь сохраняет порядок добавления,
+    # а добавление, удаление и проверка наличия работают за O(1)
     def __init__(self, books: None | list = None) -> None:
-        if books is None:
-            self._books: list = []
-        else:
-            self._books = books
+        self._books: Dict[str, Book] = {}
+        self._order: list | None = [] # кэш порядка книг для доступа по индексу
+        self._version = 0 # номер изменения: представления по нему замечают изменение коллекции
+        if books is not None:
+            for book in books:
+                self.add_to_collection(book)
+
+
+    def _as_list(self) -> list: # список книг в порядке добавления
+        # после удаления не с конца (и замены книги с другим ISBN) список перестраивается при первом
+        # обращении - одна копия ссылок за O(n) на серию изменений; срезы и представления до следующего
+        # такого изменения берут книги из него без копирования
+        if self._order is None:
+            self._order = list(self._books.values())
+        return self._order
 
 
     def __len__(self) -> int: # длина коллекции
@@ -73,59 +123,286 @@ class BookCollection: # коллекция книг
     def __getitem__(self, index: int | slice): # доступ по индексу или срезу
         if isinstance(index, int):
             if 0 <= index < len(self._books):
-                return self._books[index]
+                return self._as_list()[index]
             else:
                 raise IndexError("Error: выход за пределы, индекс превышает длину")
-        elif isinstance(index, slice):
-            return BookCollection(self._books[index])
+        elif isinstance(index, slice): # срез - BookCollectionView без копирования (не BookCollection, см. materialize)
+            return BookCollectionView(self, range(len(self._books))[index])
         else:
             raise TypeError("Error: не совпадение типа объекта для индекса (должно быть целое число или срез)")
     
         
     def __iter__(self) -> Iterator[Book]: # последовательный перебор книг
-        return iter(self._books)
+        return iter(self._books.values())
     
 
     def __repr__(self) -> str:
-        return f"Коллекция книг: {self._books}"
+        return f"Коллекция книг: {list(self._books.values())}"
     
     
     def __str__(self) -> str:
-        return f"Коллекция книг: {self._books}"
+        return f"Коллекция книг: {list(self._books.values())}"
     
     
     def __contains__(self, book: Book) -> bool: # проверка наличия книги в коллекции
-        return book in self._books
+        return isinstance(book, Book) and book.isbn in self._books
     
     
     def __setitem__(self, index: int, book: Book) -> None: # установка книги по индексу
-        self._books[index] = book
+        books = self._as_list()
+        old = books[index]
+        if old.isbn == book.isbn: # тот же ISBN - замена на месте за O(1)
+            self._books[book.isbn] = book
+            books[index] = book
+            self._version += 1
+            return
+        books = list(books) # другой ISBN меняет ключ - коллекция перестраивается
+        books[index] = book
+        self._books = {}
+        self._order = []
+        self._version += 1
+        for item in books:
+            self.add_to_collection(item)
 
         
     def add_to_collection(self, book: Book) -> None: # добавление книги в коллекцию
-        self._books.append(book)
+        self._version += 1
+        if book.isbn in self._books: # книга с таким isbn заменяется на своём месте
+            self._books[book.isbn] = book
+            self._order = None
+            return
+        self._books[book.isbn] = book
+        if self._order is not None:
+            self._order.append(book)
 
 
     def remove_from_collection(self, book: Book) -> None: # удаление книги из коллекции
-        if book not in self._books:
+        if book not in self:
             raise ValueError('Error: попытка удалить несуществующий элемент')
-        self._books.remove(book)
+        self._version += 1
+        del self._books[book.isbn]
+        if self._order is not None and self._order and self._order[-1].isbn == book.isbn:
+            self._order.pop() # удаление последней книги не сбрасывает кэш порядка
+        else:
+            self._order = None
+
+
+    def copy(self) -> 'BookCollection': # независимая коллекция с теми же книгами
+        clone = BookCollection()
+        clone._books = dict(self._books)
+        clone._order = None
+        return clone
 
 
     def clear(self) -> None: # очистка коллекции
-        self._books = []
+        self._books = {}
+        self._order = []
+        self._version += 1
 
 
     def is_empty(self) -> bool: # проверка на пустоту коллекции
         return (len(self._books) == 0)
     
 
-class IndexDict: # словарь с индексами для быстрого поиска книг
+class BookCollectionView: # представление части коллекции без копирования книг
+    # представление ссылается на саму коллекцию: после любого изменения коллекции
+    # (добавления, удаления, замены) обращение к представлению вызывает RuntimeError,
+    # как при изменении словаря во время перебора; to_list() даёт независимую копию
+    def __init__(self, collection: BookCollection, positions: range) -> None:
+        self._collection = collection
+        self._positions = positions # позиции книг в порядке коллекции
+        self._version = collection._version
+
+
+    def _books(self) -> list: # список книг коллекции с проверкой, что она не менялась
+        if self._collection._version != self._version:
+            raise RuntimeError("Error: коллекция изменилась после создания представления")
+        return self._collection._as_list()
+
+
+    def __len__(self) -> int:
+        self._books()
+        return len(self._positions)
+
+
+    def __getitem__(self, index: int | slice): # доступ по индексу или срезу (срез - тоже представление)
+        books = self._books()
+        if isinstance(index, int):
+            try:
+                return books[self._positions[index]]
+            except IndexError:
+                raise IndexError("Error: выход за пределы, индекс превышает длину") from None
+        elif isinstance(index, slice):
+            return BookCollectionView(self._collection, self._positions[index])
+        raise TypeError("Error: не совпадение типа объекта для индекса (должно быть целое число или срез)")
+
+
+    def __iter__(self) -> Iterator[Book]: # ленивый перебор; изменение коллекции прерывает его ошибкой
+        for position in self._positions:
+            yield self._books()[position]
+
+
+    def __contains__(self, book: Book) -> bool:
+        return any(item == book for item in self)
+
+
+    def __repr__(self) -> str:
+        return f"Представление коллекции: {self.to_list()}"
+
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+
+    def to_list(self) -> list: # копия книг представления
+        books = self._books()
+        return [books[position] for position in self._positions]
+
+
+    def materialize(self) -> BookCollection: # независимая коллекция с книгами представления
+        return BookCollection(self.to_list())
+
+
+class ResultCursor: # курсор по результату поиска: страницы по limit книг начиная с offset
+    def __init__(self, view: BookCollectionView, offset: int = 0, limit: int = 50) -> None:
+        if offset < 0 or limit <= 0:
+            raise ValueError("Error: offset не может быть отрицательным, а limit должен быть положительным")
+        self._view = view
+        self.offset = offset # позиция следующей страницы
+        self.limit = limit # размер страницы
+
+
+    def __len__(self) -> int: # всего книг в результате
+        return len(self._view)
+
+
+    @property
+    def has_more(self) -> bool: # остались ли непрочитанные книги
+        return self.offset < len(self._view)
+
+
+    def page(self) -> BookCollectionView: # текущая страница без копирования и без сдвига курсора
+        return self._view[self.offset:self.offset + self.limit]
+
+
+    def next_page(self) -> list: # следующая страница (копия только этих книг) со сдвигом курсора
+        books = self.page().to_list()
+        self.offset += len(books)
+        return books
+
+
+    def __iter__(self) -> Iterator[list]: # перебор оставшихся страниц
+        while self.has_more:
+            yield self.next_page()
+
+
+class IndexDict(CopyOnWrite): # словарь с индексами для быстрого поиска книг
     def __init__(self) -> None:
         self._by_isbn: Dict[str, Book] = {}
-        self._by_author: Dict[str, BookCollection] = {}
-        self._by_year: Dict[int, BookCollection] = {}
-        self._by_genre: Dict[str, BookCollection] = {}
+        # вторичные индексы: поле -> индекс; все виды - наследники HashIndex, диапазоны есть
+        # только у SortedIndex (и OrderedIndex) - такой индекс по полю даёт _sorted_for
+        self._indexes: Dict[str, HashIndex] = {}
+        self._tracked: list = list(self.TRACKED_FIELDS) # поля с поколениями по значениям
+        for field, kind in self.DEFAULT_INDEXES:
+            self.register_index(field, kind)
+        self._text = TextIndex() # инвертированный индекс по словам названия и автора
+        self.stats = CatalogStats() # счётчики по авторам, жанрам, годам и десятилетиям
+        self._cache: QueryCache | None = None # кэш запросов, которому сообщается о затронутых ключах
+
+
+    DEFAULT_INDEXES = (('author', 'hash'), ('year', 'sorted'), ('genre', 'hash')) # индексы, которые есть всегда
+
+    # поля, для которых поколение ведётся по каждому значению (и все поля зарегистрированных индексов);
+    # зависимости от остальных полей и от диапазонов лет проверяются по общим поколениям
+    TRACKED_FIELDS = ('isbn', 'title', 'author', 'year', 'genre')
+    ANY_CHANGE = ('*',) # меняется при любой записи
+    YEAR_SET = ('year', '*') # меняется при любом изменении состава индекса по году
+
+
+    @property
+    def _by_author(self) -> Dict[str, BookCollection]: # автор -> книги
+        return self._indexes['author'].buckets
+
+
+    @property
+    def _by_year(self) -> Dict[int, BookCollection]: # год -> книги
+        return self._indexes['year'].buckets
+
+
+    @property
+    def _by_genre(self) -> Dict[str, BookCollection]: # жанр -> книги
+        return self._indexes['genre'].buckets
+
+
+    @property
+    def _years(self) -> list: # отсортированные года, для которых есть книги (для диапазонов)
+        return self._sorted_for('year').keys
+
+
+    def copy(self) -> 'IndexDict': # копия за O(число индексов): всё вложенное общее до первой записи
+        clone = super().copy()
+        clone._indexes = dict(self._indexes)
+        clone._tracked = list(self._tracked)
+        clone._cache = None # у копии свой кэш запросов (его подключает владелец копии)
+        return clone
+
+
+    def fork(self) -> 'IndexDict': # ветка индексов: и оригинал, и ветка копируют общие части при записи
+        self._share()
+        return self.copy()
+
+
+    def register_index(self, field: str, kind: str = 'hash') -> None: # новый индекс по полю, сразу по всем книгам
+        # field может быть полем только одного из наследников (month у Magazine) - книги без него не индексируются
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Error: неизвестный вид индекса '{kind}', доступны: {', '.join(INDEX_KINDS)}")
+        if field == 'isbn' or field in self._indexes:
+            raise ExistError(f"Error: индекс по полю '{field}' уже существует")
+        index = INDEX_KINDS[kind](field, BookCollection)
+        index.add_many(self._by_isbn.values())
+        self._indexes[field] = self._adopt(index)
+        if field not in self._tracked:
+            self._tracked.append(field)
+
+
+    def drop_index(self, field: str) -> None: # удаление зарегистрированного индекса
+        if field in dict(self.DEFAULT_INDEXES):
+            raise ValueError(f"Error: индекс по полю '{field}' нельзя удалить")
+        if field not in self._indexes:
+            raise KeyError(f"Error: нет индекса по полю '{field}'")
+        del self._indexes[field]
+
+
+    def indexes(self) -> Dict[str, str]: # зарегистрированные индексы: поле -> вид
+        return {field: index.kind for field, index in self._indexes.items()}
+
+
+    def is_tracked(self, field: str) -> bool: # ведутся ли поколения по значениям поля
+        return field in self._tracked
+
+
+    def set_cache(self, cache: QueryCache | None) -> None: # кэш, результаты которого зависят от этих индексов
+        self._cache = cache
+
+
+    def _touch(self, book: Book, fields=None) -> None: # отметка всех ключей книги по полям fields
+        if self._cache is None: # без кэша поколения не нужны
+            return
+        dependencies: list = []
+        for field in self._tracked if fields is None else fields:
+            value = getattr(book, field, MISSING)
+            if value is not MISSING:
+                dependencies.append((field, value))
+        if fields is None or 'year' in fields:
+            dependencies.append(self.YEAR_SET)
+        dependencies.append(self.ANY_CHANGE)
+        self._cache.bump(dependencies)
+
+
+    def _writable_indexes(self) -> list: # вторичные индексы, которые можно менять
+        if self._owner is None: # библиотеку не ветвили - всё своё
+            return list(self._indexes.values())
+        return [self._writable_item(self._indexes, field) for field in list(self._indexes)]
 
 
     def add_book(self, key: str, book: Book) -> None: # добавление книги в индексы
@@ -134,24 +411,35 @@ class IndexDict: # словарь с индексами для быстрого
 
         if key in self._by_isbn:
             raise ExistError("Error: данная книга уже существует. Для обновления информации используйте другую комнаду")
+        for field in CatalogStats.FIELDS:
+            self.stats.check(field, getattr(book, field))
         
-        # добавляем в основной индекс
-        self._by_isbn[key] = book
-        
-        # добавляем в индекс по автору
-        if book.author not in self._by_author:
-            self._by_author[book.author] = BookCollection()
-        self._by_author[book.author].add_to_collection(book)
-        
-        # добавляем в индекс по году
-        if book.year not in self._by_year:
-            self._by_year[book.year] = BookCollection()
-        self._by_year[book.year].add_to_collection(book)
-        
-        # добавляем в индекс по жанру
-        if book.genre not in self._by_genre:
-            self._by_genre[book.genre] = BookCollection()
-        self._by_genre[book.genre].add_to_collection(book)
+        # добавляем во вторичные индексы; при ошибке (нехэшируемое значение поля) откатываем уже сделанное
+        added = []
+        try:
+            for index in self._writable_indexes():
+                index.add(book)
+                added.append(index)
+        except TypeError:
+            for index in added:
+                index.remove(book)
+            raise
+
+        self._writable('_by_isbn')[key] = self._adopt(book) # добавляем в основной индекс
+        self._writable('_text').add(book) # добавляем в текстовый индекс
+        self._writable('stats').add(book)
+        self._touch(book)
+
+
+    def bulk_add(self, books: list) -> None: # добавление проверенного пакета книг за один проход
+        for index in self._writable_indexes(): # упорядоченные индексы сортируют значения один раз на пакет
+            index.add_many(books)
+        by_isbn, text, stats = self._writable('_by_isbn'), self._writable('_text'), self._writable('stats')
+        for book in books:
+            by_isbn[book.isbn] = self._adopt(book)
+            text.add(book)
+            stats.add(book)
+            self._touch(book)
 
 
     def remove_book(self, key: str) -> None: # удаление книги из индексов
@@ -159,162 +447,464 @@ class IndexDict: # словарь с индексами для быстрого
             raise KeyError(f"Error: книга с ISBN '{key}' не найдена")
         
         book = self._by_isbn[key]
-
-        # удаляем из индекса по автору
-        if book.author in self._by_author:
-            self._by_author[book.author].remove_from_collection(book)
-            if not self._by_author[book.author]:
-                del self._by_author[book.author]
-        
-        # удаляем из индекса по году
-        if book.year in self._by_year:
-            self._by_year[book.year].remove_from_collection(book)
-            if not self._by_year[book.year]:
-                del self._by_year[book.year]
-        
-        # удаляем из индекса по жанру
-        if book.genre in self._by_genre:
-            self._by_genre[book.genre].remove_from_collection(book)
-            if not self._by_genre[book.genre]:
-                del self._by_genre[book.genre]
-        
-        del self._by_isbn[key] # удаляем из основного индекса
+        for index in self._writable_indexes():
+            index.remove(book)
+        self._writable('_text').remove(book) # удаляем из текстового индекса
+        self._writable('stats').remove(book)
+        self._touch(book)
+        del self._writable('_by_isbn')[key] # удаляем из основного индекса
 
 
-    def update_book(self, isbn: str, **kwargs) -> None: # обновление информации о книге
+    def update_book(self, isbn: str, /, **kwargs) -> Book: # обновление информации о книге
         # используем kwargs для всех возможных параметров книги,
-        # чтобы не проверять каждый отдельно
+        # чтобы не проверять каждый отдельно; возвращает обновлённую книгу - после fork()
+        # это может быть копия: книга, общая с другой веткой библиотеки, не меняется на месте
 
         if isbn not in self._by_isbn:
             raise KeyError(f"Error: книга с ISBN '{isbn}' не найдена")
         
         book = self._by_isbn[isbn]
-        old_author = book.author
-        old_year = book.year
-        old_genre = book.genre
-        
+        changes = {key: value for key, value in kwargs.items()
+                   if hasattr(book, key) and value != getattr(book, key)}
+        if not changes:
+            return book
+
+        new_isbn = changes.get('isbn', isbn)
+        if new_isbn != isbn and new_isbn in self._by_isbn:
+            raise ExistError(f"Error: книга с ISBN '{new_isbn}' уже существует")
+
+        # новые значения проверяются до любых изменений: книга не должна остаться вне индексов
+        for field, value in changes.items():
+            index = self._indexes.get(field)
+            if index is not None:
+                index.check(value)
+            self.stats.check(field, value)
+
+        # смена ISBN меняет ключ книги во всех коллекциях - переиндексируем её целиком
+        rekey = new_isbn != isbn
+        replace = not self._owns(book) # общая книга заменяется копией во всех коллекциях
+        indexes = self._writable_indexes()
+        affected = indexes if rekey else [index for index in indexes if index.field in changes]
+        # копия заменяет книгу во всех корзинах - устаревают результаты по всем её полям
+        changed = tuple(field for field in self._tracked if rekey or replace or field in changes)
+        recount = rekey or any(field in changes for field in CatalogStats.FIELDS)
+        by_isbn, text, stats = self._writable('_by_isbn'), self._writable('_text'), self._writable('stats')
+
+        # ключи кэша для старых и новых значений изменяемых полей
+        self._touch(book, changed)
+        for index in affected: # убираем книгу из корзин со старыми значениями
+            index.remove(book)
+        if recount:
+            stats.remove(book)
+        if rekey:
+            text.remove(book)
+            del by_isbn[isbn]
+
         # обновляем атрибуты книги
-        for key, value in kwargs.items():
-            if hasattr(book, key):
-                setattr(book, key, value)
-        
-        # если изменился автор, обновляем индекс
-        if 'author' in kwargs and kwargs['author'] != old_author:
-            if old_author in self._by_author:
-                self._by_author[old_author].remove_from_collection(book)
-                if self._by_author[old_author].is_empty():
-                    del self._by_author[old_author]
-            
-            if book.author not in self._by_author:
-                self._by_author[book.author] = BookCollection()
-            self._by_author[book.author].add_to_collection(book)
-        
-        # если изменился год, обновляем индекс
-        if 'year' in kwargs and kwargs['year'] != old_year:
-            if old_year in self._by_year:
-                self._by_year[old_year].remove_from_collection(book)
-                if self._by_year[old_year].is_empty():
-                    del self._by_year[old_year]
-            
-            if book.year not in self._by_year:
-                self._by_year[book.year] = BookCollection()
-            self._by_year[book.year].add_to_collection(book)
-        
-        # если изменился жанр, обновляем индекс
-        if 'genre' in kwargs and kwargs['genre'] != old_genre:
-            if old_genre in self._by_genre:
-                self._by_genre[old_genre].remove_from_collection(book)
-                if self._by_genre[old_genre].is_empty():
-                    del self._by_genre[old_genre]
-            
-            if book.genre not in self._by_genre:
-                self._by_genre[book.genre] = BookCollection()
-            self._by_genre[book.genre].add_to_collection(book)
-
-
-    def get_by_isbn(self, isbn: str): # поиск книги по ISBN
-        try:
-            return self._by_isbn.get(isbn)
-        
-        except KeyError:
-            print(f"Error: неверный isbn - '{isbn}'")
+        target = self._adopt(copy(book)) if replace else book
+        for key, value in changes.items():
+            setattr(target, key, shared(value) if key in target.SHARED_FIELDS else value)
+
+        # кладём в корзины с новыми значениями (копию - и в остальные корзины, на место оригинала)
+        for index in (indexes if replace else affected):
+            index.add(target)
+        if recount:
+            stats.add(target)
+        if rekey or replace:
+            by_isbn[new_isbn] = target
+        if rekey or 'title' in changes or 'author' in changes: # переиндексируем слова книги
+            text.add(target)
+        self._touch(target, changed)
+        return target
+
+
+    def get_by_isbn(self, isbn: str) -> Book | None: # поиск книги по ISBN
+        return self._by_isbn.get(isbn)
     
 
     def get_by_author(self, author: str):  # поиск книг по автору
-        try:
-            book_collection = self._by_author[author]
-            books = list(book_collection)
-            print(f"Поиск по автору '{author}': найдено {len(books)} книг(и)")
-            return books
-        
-        except KeyError:
-            print(f"Автор '{author}' не найден в каталоге")
-            return []
+        return self.get_by('author', author)
 
 
     def get_by_year(self, year: int):  # поиск книг по году
-        try:
-            book_collection = self._by_year[year]
-            books = list(book_collection)
-            print(f"Поиск по году {year}: найдено {len(books)} книг(и)")
-            return books
-        
-        except KeyError:
-            print(f"Книги {year} года не найдены в каталоге")
-            return []
-    
+        return self.get_by('year', year)
     
+
+    def get_by(self, field: str, key) -> list: # поиск книг по любому зарегистрированному индексу
+        book_collection = self._index_for(field).get(key)
+        return list(book_collection) if book_collection is not None else []
+
+
+    def _index_for(self, field: str) -> HashIndex: # индекс по полю
+        index = self._indexes.get(field)
+        if index is None:
+            raise KeyError(f"Error: нет индекса по полю '{field}'")
+        return index
+
+
+    def _sorted_for(self, field: str) -> SortedIndex: # индекс по полю с диапазонами ('sorted' или 'ordered')
+        index = self._indexes.get(field)
+        if not isinstance(index, SortedIndex):
+            raise KeyError(f"Error: нет индекса вида 'sorted' по полю '{field}'")
+        return index
+
+
+    def is_ordered(self, field: str) -> bool: # есть ли по полю индекс с доступом по номеру
+        return isinstance(self._indexes.get(field), OrderedIndex)
+
+
+    def ordered_index(self, field: str) -> OrderedIndex: # индекс 'ordered' по полю (создаётся при первом обращении)
+        # индекс другого вида по этому полю заменяется: у 'ordered' те же корзины и диапазоны
+        index = self._indexes.get(field)
+        if isinstance(index, OrderedIndex):
+            return index
+        if field == 'isbn':
+            raise ValueError("Error: по ISBN нет упорядоченного индекса")
+        ordered = OrderedIndex(field, BookCollection)
+        ordered.add_many(self._by_isbn.values())
+        self._indexes[field] = self._adopt(ordered)
+        if field not in self._tracked:
+            self._tracked.append(field)
+        return ordered
+
+
+    def get_page(self, field: str, offset: int, limit: int | None, descending: bool) -> list: # страница по порядку поля
+        return self.ordered_index(field).page(offset, limit, descending)
+
+
+    def get_by_range(self, field: str, lo, hi) -> list: # книги со значением поля от lo до hi включительно
+        return self._sorted_for(field).range(lo, hi)
+
+
+    def get_by_year_range(self, lo: int, hi: int) -> list: # книги с годом издания от lo до hi включительно
+        return self._sorted_for('year').range(lo, hi)
+
+
+    def count_in_range(self, lo: int, hi: int) -> int: # количество книг с годом от lo до hi
+        return self._sorted_for('year').count_range(lo, hi)
+
+
+    def iter_by_year(self, descending: bool = False) -> Iterator[Book]: # перебор книг по году издания
+        return self._sorted_for('year').iter_ordered(descending)
+
+
+    def get_oldest(self, n: int) -> list: # n самых старых книг
+        return self._take(self.iter_by_year(), n)
+
+
+    def get_newest(self, n: int) -> list: # n самых новых книг
+        return self._take(self.iter_by_year(descending=True), n)
+
+
+    @staticmethod
+    def _take(books: Iterator[Book], n: int) -> list: # первые n книг из итератора
+        result: list = []
+        if n <= 0:
+            return result
+        for book in books:
+            result.append(book)
+            if len(result) == n:
+                break
+        return result
+
+
     def get_by_genre(self, genre: str):  # поиск книг по жанру
-        try:
-            book_collection = self._by_genre[genre]
-            books = list(book_collection)
-            print(f"Поиск по жанру '{genre}': найдено {len(books)} книг(и)")
-            return books
-        
-        except KeyError:
-            print(f"Книги жанра '{genre}' не найдены в каталоге")
-            return []
+        return self.get_by('genre', genre)
+
+
+    def view_by(self, field: str, key) -> BookCollectionView: # книги корзины индекса без копирования
+        collection = self._index_for(field).get(key)
+        if collection is None:
+            collection = BookCollection()
+        return collection[:]
 
 
-class Library: # класс библиотеки
-    def __init__(self):
+    def search_text(self, query: str, limit: int = 10) -> list: # поиск по словам названия и автора
+        return [self._by_isbn[isbn] for isbn in self._text.search(query, limit)]
+
+
+    def _posting_lists(self) -> Dict[str, Dict]: # индексы, пригодные для составных запросов
+        return {field: index.buckets for field, index in self._indexes.items()}
+
+
+    def _run_query(self, criteria: Dict) -> tuple: # выполнение составного запроса с планом
+        indexes = self._posting_lists()
+        indexed = [field for field in criteria if field in indexes]
+        residual = [field for field in criteria if field not in indexes]
+        plan: list = []
+
+        if not indexed: # без индексированных полей остаётся только полный перебор
+            candidates = list(self._by_isbn.values())
+            plan.append({'operation': 'full_scan', 'field': None, 'size': len(candidates),
+                         'candidates': len(candidates)})
+        else:
+            postings = []
+            for field in indexed:
+                posting = indexes[field].get(criteria[field])
+                if posting is None: # пустой список - результат заведомо пуст
+                    plan.append({'operation': 'index_scan', 'field': field, 'size': 0, 'candidates': 0})
+                    return [], plan
+                postings.append((len(posting), field, posting))
+
+            # начинаем с самого короткого списка, остальные только пересекаем
+            postings.sort(key=lambda item: item[0])
+            size, field, posting = postings[0]
+            candidates = list(posting)
+            plan.append({'operation': 'index_scan', 'field': field, 'size': size,
+                         'candidates': len(candidates)})
+            for size, field, posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates = [book for book in candidates if book in posting]
+                plan.append({'operation': 'intersect', 'field': field, 'size': size,
+                             'candidates': len(candidates)})
+
+        # поля без индекса проверяются у оставшихся кандидатов
+        for field in residual:
+            if not candidates:
+                break
+            value = criteria[field]
+            candidates = [book for book in candidates if getattr(book, field, MISSING) == value]
+            plan.append({'operation': 'filter', 'field': field, 'size': None,
+                         'candidates': len(candidates)})
+
+        return candidates, plan
+
+
+    def query(self, **criteria) -> list: # поиск книг по нескольким полям одновременно
+        return self._run_query(criteria)[0]
+
+
+    def explain(self, **criteria) -> list: # план составного запроса с числом кандидатов на каждом шаге
+        return self._run_query(criteria)[1]
+
+
+LibraryT = TypeVar('LibraryT', bound='Library')
+
+
+class Library(CopyOnWrite): # класс библиотеки
+    def __init__(self, metrics: Metrics | None = None, cache_size: int = 0):
         self._books = BookCollection() # коллекция книг в библиотеке
         self._index = IndexDict() # индексы для быстрого поиска книг
+        self.metrics = metrics if metrics is not None else Metrics() # счётчики и задержки операций
+        # кэш результатов поиска (cache_size > 0); результаты хранятся кортежами, каждый вызов получает свой список
+        self._cache = QueryCache(cache_size) if cache_size > 0 else None
+        self._cache_size = cache_size
+        self._index.set_cache(self._cache)
+
 
+    def _cached(self, key: tuple, dependencies: list, compute) -> list: # результат поиска через кэш
+        if self._cache is None:
+            return compute()
+        try:
+            result = self._cache.get(key)
+        except TypeError: # нехэшируемые параметры запроса - без кэша
+            return compute()
+        if result is MISS:
+            seen = [(dependency, self._cache.generation(dependency)) for dependency in dependencies]
+            result = compute()
+            self._cache.put(key, seen, tuple(result))
+            return result
+        return list(result) # изменение полученного списка не затрагивает кэш
+
+
+    def _branch(self, cls: Type[LibraryT]) -> LibraryT: # новая библиотека, общая с этой до первой записи в любую из них
+        branch = cls(cache_size=self._cache_size) # метрики и кэш у ветки свои
+        self._share()
+        branch._share()
+        branch._books = self._books
+        branch._index = self._index.fork()
+        branch._index.set_cache(branch._cache)
+        return branch
+
+
+    def fork(self) -> 'Library': # ветка библиотеки за O(1) для анализа "что если"
+        # ветка и оригинал делят книги, корзины индексов и остальные структуры; запись в любую
+        # из них копирует только затронутые структуры (а изменяемую книгу - заменяет копией),
+        # поэтому другая сторона изменений не видит. Ветка - обычная Library в памяти:
+        # журнал, блокировки и столбцы наследников в неё не переходят
+        return self._branch(Library)
+
+
+    def snapshot(self) -> 'LibrarySnapshot': # неизменяемый снимок текущего состояния за O(1)
+        return self._branch(LibrarySnapshot)
 
+
+    def cache_stats(self) -> Dict | None: # статистика кэша результатов (None, если кэш выключен)
+        return self._cache.stats() if self._cache is not None else None
+
+
+    @instrumented('add')
     def add_book_to_lib(self, book: Book) -> None: # добавить книгу в библиотеку
-        self._books.add_to_collection(book)
-        self._index.add_book(book.isbn, book)
+        self._index.add_book(book.isbn, book) # сначала индексы: они проверяют тип и дубликаты
+        self._writable('_books').add_to_collection(book)
 
     
+    @instrumented('bulk_load')
+    def bulk_load(self, books: Iterable[Book]) -> int: # пакетная загрузка: всё или ничего
+        batch = []
+        seen: set = set()
+        duplicates = []
+        for book in books: # сначала проверяем весь пакет, библиотеку не трогаем
+            if not isinstance(book, Book):
+                raise TypeError("Error: значение не совпадает с нужным типом объекта - Book")
+            if book.isbn in seen or self._index.get_by_isbn(book.isbn) is not None:
+                duplicates.append(book.isbn)
+            seen.add(book.isbn)
+            batch.append(book)
+
+        if duplicates:
+            raise BulkLoadError(duplicates)
+
+        self._index.bulk_add(batch)
+        collection = self._writable('_books')
+        for book in batch:
+            collection.add_to_collection(book)
+        return len(batch)
+
+    
+    @instrumented('remove')
     def remove_book_from_lib(self, isbn: str) -> None: # удалить книгу из библиотеки
         book = self._index.get_by_isbn(isbn)
         if book is None:
             raise KeyError(f"Error: книга с ISBN '{isbn}' не найдена в библиотеке")
-        self._books.remove_from_collection(book)
+        self._writable('_books').remove_from_collection(book)
         self._index.remove_book(isbn)
 
 
-    def update_book_info(self, isbn: str, **kwargs) -> None: # обновить информацию о книге
-        self._index.update_book(isbn, **kwargs)
+    @instrumented('update')
+    def update_book_info(self, isbn: str, /, **kwargs) -> None: # обновить информацию о книге
+        book = self._index.get_by_isbn(isbn)
+        new_isbn = kwargs.get('isbn', isbn)
+        if book is None or new_isbn == isbn:
+            updated = self._index.update_book(isbn, **kwargs)
+            if updated is not book: # книга была общей с другой веткой - на её место встаёт копия
+                self._writable('_books').add_to_collection(updated)
+            return
+        # смена ISBN: коллекция библиотеки тоже хранит книги по ISBN, книга переходит в конец
+        if self._index.get_by_isbn(new_isbn) is not None:
+            raise ExistError(f"Error: книга с ISBN '{new_isbn}' уже существует")
+        collection = self._writable('_books')
+        collection.remove_from_collection(book)
+        try:
+            book = self._index.update_book(isbn, **kwargs)
+        finally:
+            collection.add_to_collection(book)
+
+
+    def register_index(self, field: str, kind: str = 'hash') -> None: # индекс по любому полю: 'hash', 'sorted' или 'ordered'
+        self._index.register_index(field, kind)
+
+
+    def drop_index(self, field: str) -> None: # удалить зарегистрированный индекс
+        self._index.drop_index(field)
+
+
+    def indexes(self) -> Dict[str, str]: # зарегистрированные индексы: поле -> вид
+        return self._index.indexes()
+
+
+    @instrumented('find_by', lookup=True)
+    def find_by(self, field: str, value) -> list: # поиск по любому зарегистрированному индексу
+        return self._cached(('by', field, value), [(field, value)],
+                            lambda: self._index.get_by(field, value))
+
+
+    @instrumented('find_in_range', lookup=True)
+    def find_in_range(self, field: str, lo, hi) -> list: # поиск по упорядоченному индексу (включительно)
+        return self._cached(('range', field, lo, hi), [IndexDict.ANY_CHANGE],
+                            lambda: self._index.get_by_range(field, lo, hi))
 
     
-    def find_by_author(self, author: str) -> BookCollection: # поиск по автору
-        return self._index.get_by_author(author)
+    @instrumented('find_by_author', lookup=True)
+    def find_by_author(self, author: str) -> list: # поиск по автору
+        return self._cached(('author', author), [('author', author)],
+                            lambda: self._index.get_by_author(author))
     
 
-    def find_by_year(self, year: str) -> BookCollection: # поиск по году
-        return self._index.get_by_year(year)
+    @instrumented('find_by_year', lookup=True)
+    def find_by_year(self, year: int) -> list: # поиск по году
+        return self._cached(('year', year), [('year', year)],
+                            lambda: self._index.get_by_year(year))
     
 
-    def find_by_genre(self, genre: str) -> BookCollection: # поиск по жанру
-        return self._index.get_by_genre(genre)
+    @instrumented('find_by_genre', lookup=True)
+    def find_by_genre(self, genre: str) -> list: # поиск по жанру
+        return self._cached(('genre', genre), [('genre', genre)],
+                            lambda: self._index.get_by_genre(genre))
     
 
-    def find_by_isbn(self, isbn: str) -> Book: # поиск по isbn
+    @instrumented('find_by_isbn', lookup=True)
+    def find_by_isbn(self, isbn: str) -> Book | None: # поиск по isbn
         return self._index.get_by_isbn(isbn)
+
+
+    @instrumented('find_by_year_range', lookup=True)
+    def find_by_year_range(self, lo: int, hi: int) -> list: # поиск по диапазону лет (включительно)
+        return self._cached(('year_range', lo, hi), [IndexDict.YEAR_SET],
+                            lambda: self._index.get_by_year_range(lo, hi))
+
+
+    def count_in_range(self, lo: int, hi: int) -> int: # количество книг в диапазоне лет
+        return self._index.count_in_range(lo, hi)
+
+
+    def oldest(self, n: int) -> list: # n самых старых книг
+        return self._index.get_oldest(n)
+
+
+    def newest(self, n: int) -> list: # n самых новых книг
+        return self._index.get_newest(n)
+
+
+    @instrumented('search_text', lookup=True)
+    def search_text(self, query: str, limit: int = 10) -> list: # поиск по началу слов и с опечатками
+        return self._index.search_text(query, limit)
+
+
+    def stats(self) -> CatalogStats: # счётчики каталога: count, counts, top, decades, summary - без перебора книг
+        return self._index.stats
+
+
+    def view(self, field: str, key) -> BookCollectionView: # результат поиска по индексу без копирования
+        return self._index.view_by(field, key)
+
+
+    def cursor(self, field: str, key, offset: int = 0, limit: int = 50) -> ResultCursor: # постраничный результат
+        return ResultCursor(self._index.view_by(field, key), offset, limit)
+
+
+    def iter_books(self) -> Iterator[Book]: # ленивый перебор всех книг; изменение библиотеки прерывает его
+        return iter(self._books[:])
+
+
+    @instrumented('find', lookup=True)
+    def find(self, **criteria) -> list: # составной поиск, например find(author=..., year=..., genre=...)
+        dependencies = [(field, value) if self._index.is_tracked(field) else IndexDict.ANY_CHANGE
+                        for field, value in criteria.items()] or [IndexDict.ANY_CHANGE]
+        return self._cached(('find',) + tuple(sorted(criteria.items())), dependencies,
+                            lambda: self._index.query(**criteria))
+
+
+    def explain(self, **criteria) -> list: # какие индексы использует find и сколько кандидатов на каждом шаге
+        return self._index.explain(**criteria)
     
 
+    @instrumented('list')
+    def list(self, order_by: str | None = None, descending: bool = False, offset: int = 0,
+             limit: int | None = None) -> List[Book]: # страница книг по порядку поля или в порядке добавления
+        # по полю - в порядке значения, при равных значениях - по ISBN; индекс 'ordered' по полю строится
+        # при первом вызове и дальше обновляется вместе с книгами, поэтому страница с любого места
+        # и первые N книг - O(log n + limit). Книги без поля order_by (month у обычной книги) не выводятся
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("Error: offset и limit не могут быть отрицательными")
+        if order_by is not None:
+            return self._index.get_page(order_by, offset, limit, descending)
+        positions = slice(None, None, -1) if descending else slice(None)
+        stop = None if limit is None else offset + limit
+        return list(self._books[positions][offset:stop])
+
+
     def __len__(self) -> int: # количество книг в библиотеке
         return len(self._books)
     
@@ -326,3 +916,11 @@ class Library: # класс библиотеки
     def __iter__(self) -> Iterator[Book]:
         return iter(self._books)
 
+
+class LibrarySnapshot(Library): # снимок библиотеки только для чтения (Library.snapshot)
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Error: снимок библиотеки только для чтения, для изменений используйте fork()")
+
+
+    add_book_to_lib = bulk_load = remove_book_from_lib = update_book_info = _read_only
+    register_index = drop_index = _read_only
@@ -1,8 +1,37 @@
+import argparse
+import json
+import sys
 from sys import stdin
+from time import perf_counter
+from typing import Iterable, TextIO
+from src.commands import execute
 from src.library_classes import Book, Library
+from src.profiling import DEFAULT_PREFIX, PROFILE_ENV, enable as enable_profiling
 from src.simulation import run_simulation
+from src.storage import PersistentLibrary, create_library
 
-library = Library()
+library = create_library()
+
+
+def report_lookup(event: dict) -> None: # сообщения о результатах поиска для пользователя
+    op, key, count = event['op'], event['key'], event['count']
+    if event['error'] or count is None:
+        return
+    if op == 'find_by_author':
+        if count:
+            print(f"Поиск по автору '{key}': найдено {count} книг(и)")
+        else:
+            print(f"Автор '{key}' не найден в каталоге")
+    elif op == 'find_by_year':
+        if count:
+            print(f"Поиск по году {key}: найдено {count} книг(и)")
+        else:
+            print(f"Книги {key} года не найдены в каталоге")
+    elif op == 'find_by_genre':
+        if count:
+            print(f"Поиск по жанру '{key}': найдено {count} книг(и)")
+        else:
+            print(f"Книги жанра '{key}' не найдены в каталоге")
 
 
 def add_book_interactive():
@@ -126,13 +155,60 @@ def update_book_interactive():
         print(f"Ошибка при обновлении книги: {e}")
 
 
-def list_all_books():
+LIST_FIELDS = ('title', 'author', 'year', 'genre') # поля для сортировки в команде list
+
+
+def list_all_books(options: str = ''): # list [by=поле] [desc] [page=N] [size=N]
     if len(library) == 0:
         print("Библиотека пуста")
-    else:
-        print(f"Всего книг: {len(library)}\n")
-        for i, book in enumerate(library, 1):
-            print(f"{i}. {book.title} - {book.author} ({book.year})")
+        return
+    order_by, descending, page, size = None, False, 1, None
+    try:
+        for option in options.split():
+            name, _, value = option.partition('=')
+            if name == 'by':
+                if value not in LIST_FIELDS:
+                    print(f"Сортировать можно по полям: {', '.join(LIST_FIELDS)}")
+                    return
+                order_by = value
+            elif name == 'desc':
+                descending = True
+            elif name == 'page':
+                page = int(value)
+            elif name == 'size':
+                size = int(value)
+            else:
+                print(f"Неизвестный параметр '{option}'. Пример: list by=year desc page=2 size=20")
+                return
+        if page < 1 or (size is not None and size < 1):
+            raise ValueError
+    except ValueError:
+        print("Ошибка: page и size должны быть положительными числами")
+        return
+
+    offset = (page - 1) * size if size is not None else 0
+    try:
+        books = library.list(order_by, descending, offset, size)
+    except Exception as e:
+        print(f"Ошибка при выводе списка: {e}")
+        return
+    print(f"Всего книг: {len(library)}" + (f", страница {page}" if size is not None else "") + "\n")
+    if not books:
+        print("На этой странице книг нет")
+    for i, book in enumerate(books, offset + 1):
+        print(f"{i}. {book.title} - {book.author} ({book.year})")
+
+
+def show_metrics():
+    stats = library.metrics.snapshot()
+    if not stats:
+        print("Операций пока не было")
+        return
+    print(f"{'Операция':<20}{'вызовов':>9}{'ошибок':>8}{'попаданий':>11}{'p50, мкс':>11}{'p99, мкс':>11}")
+    for op, data in sorted(stats.items()):
+        ratio = f"{data['hit_ratio']:.0%}" if data['hit_ratio'] is not None else "-"
+        print(f"{op:<20}{data['count']:>9}{data['errors']:>8}{ratio:>11}"
+              f"{data['p50'] * 1e6:>11.1f}{data['p99'] * 1e6:>11.1f}")
 
 
 def simulation_interactive():
@@ -150,7 +226,70 @@ def simulation_interactive():
         print(f"Ошибка при симуляции: {e}")
 
 
-def main() -> None:
+def run_batch(lines: Iterable[str], target: Library, out: TextIO, quiet: bool = False) -> dict:
+    # каждая строка - полная команда в JSON, например {"op": "add", "book": {...}};
+    # ответы копятся в буфере и выводятся пачками, в конце печатается сводка
+    counts: dict = {}
+    errors: dict = {}
+    times: dict = {}
+    buffer: list = []
+    started = perf_counter()
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            command, response, elapsed = {}, {'ok': False, 'error': f"Error: некорректный JSON - {e}"}, 0.0
+        else:
+            op_started = perf_counter()
+            response = execute(target, command)
+            elapsed = perf_counter() - op_started
+        op = command.get('op', '?') if isinstance(command, dict) else '?'
+        counts[op] = counts.get(op, 0) + 1
+        times[op] = times.get(op, 0.0) + elapsed
+        if not response['ok']:
+            errors[op] = errors.get(op, 0) + 1
+        if not quiet or not response['ok']:
+            buffer.append(json.dumps(dict(response, line=line_no), ensure_ascii=False))
+            if len(buffer) >= 1000:
+                out.write('\n'.join(buffer) + '\n')
+                buffer.clear()
+    if buffer:
+        out.write('\n'.join(buffer) + '\n')
+    total = perf_counter() - started
+
+    out.write(f"Выполнено команд: {sum(counts.values())}, ошибок: {sum(errors.values())}, время: {total:.3f} с\n")
+    for op in sorted(counts):
+        mean = times[op] / counts[op] * 1e6
+        out.write(f"  {op:<20}{counts[op]:>9} шт.{errors.get(op, 0):>7} ош.{times[op]:>10.3f} с{mean:>10.1f} мкс/оп\n")
+    out.flush()
+    return {'counts': counts, 'errors': errors, 'times': times, 'elapsed': total}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Управление библиотекой")
+    parser.add_argument('--batch', nargs='?', const='-', metavar='FILE',
+                        help="пакетный режим: JSON-команда на строку из файла или stdin ('-')")
+    parser.add_argument('--quiet', action='store_true', help="в пакетном режиме выводить только ошибки и сводку")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PREFIX, metavar='PREFIX',
+                        help=f"профилирование: отчёт при выходе, стеки в PREFIX.folded (или {PROFILE_ENV}=PREFIX)")
+    args = parser.parse_args(argv)
+    enable_profiling(args.profile)
+    if args.batch is not None:
+        try:
+            if args.batch == '-':
+                run_batch(stdin, library, sys.stdout, args.quiet)
+            else:
+                with open(args.batch, encoding='utf-8') as file:
+                    run_batch(file, library, sys.stdout, args.quiet)
+        finally:
+            if isinstance(library, PersistentLibrary):
+                library.close()
+        return
+
+    library.metrics.subscribe(report_lookup)
     print('Список команд для использования:\n'
           '1. Добавить книгу (исп.: add)\n'
           '2. Удалить книгу (исп.: remove)\n'
@@ -159,8 +298,9 @@ def main() -> None:
           '5. Поиск по жанру (исп.: genre)\n'
           '6. Поиск по ISBN (исп.: isbn)\n'
           '7. Обновить книгу (исп.: update)\n'
-          '8. Список всех книг (исп.: list)\n'
+          '8. Список книг (исп.: list; сортировка и страницы: list by=year desc page=2 size=20)\n'
           '9. Запустить симуляцию (исп.: simulation)\n'
+          '10. Статистика операций (исп.: metrics)\n'
           'Для выхода напишите: "стоп!"')
 
     for cmd in stdin:
@@ -187,10 +327,12 @@ def main() -> None:
                 search_by_isbn_interactive()
             elif cmd == 'update':
                 update_book_interactive()
-            elif cmd == 'list':
-                list_all_books()
+            elif cmd == 'list' or cmd.startswith('list '):
+                list_all_books(cmd[len('list'):])
             elif cmd == 'simulation':
                 simulation_interactive()
+            elif cmd == 'metrics':
+                show_metrics()
             else:
                 print(f"Неизвестная команда: '{cmd}'. Введите одну из доступных команд.")
         
@@ -199,6 +341,9 @@ def main() -> None:
         except Exception as e:
             print(f"Error: Ошибка при обработке команды: {e}")
 
+    if isinstance(library, PersistentLibrary):
+        library.close()
+
 
 if __name__ == "__main__":
     main()
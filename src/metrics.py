@@ -0,0 +1,140 @@
+import threading
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, List
+
+
+# верхние границы корзин гистограммы задержек, в секундах
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, float('inf'))
+
+
+class OperationStats: # счётчики и гистограмма задержек одной операции
+    def __init__(self) -> None:
+        self.count = 0 # всего вызовов
+        self.errors = 0 # вызовов, завершившихся исключением
+        self.hits = 0 # поисков с непустым результатом
+        self.misses = 0 # поисков с пустым результатом
+        self.total_time = 0.0 # суммарное время, с
+        self.max_time = 0.0 # самый долгий вызов, с
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+
+    def add(self, elapsed: float, hit: bool | None, error: bool) -> None: # учёт одного вызова
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.histogram[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        if error:
+            self.errors += 1
+        elif hit is True:
+            self.hits += 1
+        elif hit is False:
+            self.misses += 1
+
+
+    def percentile(self, q: float) -> float: # оценка перцентиля задержки по гистограмме (верхняя граница корзины)
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, amount in zip(LATENCY_BUCKETS, self.histogram):
+            seen += amount
+            if seen >= rank:
+                return min(bound, self.max_time)
+        return self.max_time
+
+
+    def as_dict(self) -> Dict: # сводка по операции
+        lookups = self.hits + self.misses
+        return {'count': self.count, 'errors': self.errors, 'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'total_time': self.total_time,
+                'mean_time': self.total_time / self.count if self.count else 0.0,
+                'p50': self.percentile(50), 'p99': self.percentile(99), 'max_time': self.max_time,
+                'histogram': {bound: amount for bound, amount in zip(LATENCY_BUCKETS, self.histogram) if amount}}
+
+
+class Metrics: # метрики операций библиотеки и подписчики на события
+    def __init__(self) -> None:
+        self._stats: Dict[str, OperationStats] = {}
+        self._hooks: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock() # счётчики могут обновляться из нескольких потоков
+
+
+    def subscribe(self, hook: Callable[[Dict], None]) -> None: # hook(event) вызывается после каждой операции
+        self._hooks.append(hook)
+
+
+    def unsubscribe(self, hook: Callable[[Dict], None]) -> None: # отписка от событий
+        self._hooks.remove(hook)
+
+
+    def record(self, op: str, elapsed: float, hit: bool | None = None, error: bool = False,
+               key=None, count: int | None = None) -> None: # учёт выполненной операции
+        with self._lock:
+            stats = self._stats.get(op)
+            if stats is None:
+                stats = self._stats[op] = OperationStats()
+            stats.add(elapsed, hit, error)
+        if self._hooks:
+            event = {'op': op, 'elapsed': elapsed, 'hit': hit, 'error': error, 'key': key, 'count': count}
+            for hook in self._hooks:
+                hook(event)
+
+
+    def get(self, op: str) -> OperationStats: # статистика одной операции
+        return self._stats.get(op) or OperationStats()
+
+
+    def snapshot(self) -> Dict[str, Dict]: # сводка по всем операциям
+        with self._lock:
+            return {op: stats.as_dict() for op, stats in self._stats.items()}
+
+
+    def reset(self) -> None: # сброс счётчиков (подписчики сохраняются)
+        with self._lock:
+            self._stats.clear()
+
+
+_profiler = None # включённый Profiler (profiling.py): операции учитываются и в нём
+
+
+def set_profiler(profiler) -> None: # включение (None - выключение) учёта операций в профилировщике
+    global _profiler
+    _profiler = profiler
+
+
+def active_profiler(): # включённый Profiler или None
+    return _profiler
+
+
+def instrumented(op: str, lookup: bool = False) -> Callable: # замер метода библиотеки в self.metrics
+    # для поиска (lookup=True) пустой результат или None считается промахом
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _profiler is not None:
+                with _profiler.operation(op):
+                    return measured(self, *args, **kwargs)
+            return measured(self, *args, **kwargs)
+
+        def measured(self, *args, **kwargs):
+            started = perf_counter()
+            key = args[0] if args else (kwargs or None)
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception:
+                self.metrics.record(op, perf_counter() - started, error=True, key=key)
+                raise
+            elapsed = perf_counter() - started
+            if lookup:
+                count = (0 if result is None else 1) if not isinstance(result, list) else len(result)
+                self.metrics.record(op, elapsed, hit=count > 0, key=key, count=count)
+            else:
+                self.metrics.record(op, elapsed, key=key)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,183 @@
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, TextIO
+from src import metrics
+
+PROFILE_ENV = 'LIBRARY_PROFILE' # переменная окружения: префикс файлов профиля (включает профилирование)
+DEFAULT_PREFIX = 'library-profile'
+
+
+class _OperationProfile: # время и память одной операции за всё профилирование
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_time = 0.0 # суммарное время вместе с вложенными операциями, с
+        self.allocated = 0 # сколько памяти осталось занятой после вызовов (может быть < 0), байт
+        self.peak = 0 # наибольший прирост памяти во время одного вызова, байт
+
+
+class Profiler: # профилирование операций библиотеки: cProfile, tracemalloc и выборка стеков
+    # операции, помеченные instrumented (и шаги симуляции), учитываются отдельно: вызовы, время, память.
+    # Раз в interval секунд процессорного времени (SIGPROF) запоминается стек профилируемого потока - из
+    # этих выборок получается файл для flamegraph (строки «функция;функция;... количество»). Без таймера
+    # (Windows, не главный поток) выборку делает фоновый поток, но он получает GIL в основном тогда, когда
+    # профилируемый поток его отпускает (ввод-вывод), поэтому такие выборки смещены к print и записи
+    def __init__(self, interval: float = 0.001, memory_frames: int = 1) -> None:
+        self.interval = interval # период выборки стеков, с
+        self.memory_frames = memory_frames # глубина стека, которую tracemalloc хранит для выделения
+        self.operations: Dict[str, _OperationProfile] = {}
+        self.stacks: Dict[str, int] = {} # стек -> количество выборок
+        self._profile = cProfile.Profile()
+        self._thread_id: int | None = None # поток, который профилируется (тот, что вызвал start)
+        self._sampler: threading.Thread | None = None # фоновый поток выборки, если нет таймера
+        self._timer = False # выборка по SIGPROF
+        self._stopped = threading.Event()
+        self._peaks: List[int] = [] # пик памяти каждой из вложенных операций, начатых и не законченных
+        self._memory: tracemalloc.Snapshot | None = None # снимок tracemalloc после остановки (профилирование закончено)
+        self.elapsed = 0.0
+
+
+    def start(self) -> 'Profiler':
+        self._thread_id = threading.get_ident()
+        self._started = perf_counter()
+        tracemalloc.start(self.memory_frames)
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGPROF, lambda signum, frame: self._record_stack(frame))
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            self._timer = True
+        else:
+            self._sampler = threading.Thread(target=self._sample, args=(self._thread_id,), name='library-profiler',
+                                             daemon=True)
+            self._sampler.start()
+        metrics.set_profiler(self)
+        self._profile.enable()
+        return self
+
+
+    def stop(self) -> None:
+        if self._thread_id is None or self._memory is not None:
+            return
+        self._profile.disable()
+        metrics.set_profiler(None)
+        if self._timer:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        elif self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+        self._memory = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        self.elapsed = perf_counter() - self._started
+
+
+    def __enter__(self) -> 'Profiler':
+        return self.start()
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+    def _record_stack(self, frame) -> None: # одна выборка: стек от frame до начала потока
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if names:
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+
+    def _sample(self, thread_id: int) -> None: # выборка стеков потока thread_id из фонового потока
+        while not self._stopped.wait(self.interval):
+            self._record_stack(sys._current_frames().get(thread_id))
+
+
+    @contextmanager
+    def operation(self, op: str) -> Iterator[None]: # учёт одного вызова операции
+        if threading.get_ident() != self._thread_id: # операции других потоков (сервер) не учитываются
+            yield
+            return
+        # счётчик пика tracemalloc один на всех: перед сбросом пик внешней операции запоминается,
+        # а после вложенной - учитывается и в ней
+        peaks = self._peaks
+        if peaks:
+            peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        peaks.append(memory_before)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, peaks.pop())
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            stats = self.operations.get(op)
+            if stats is None:
+                stats = self.operations[op] = _OperationProfile()
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.allocated += current - memory_before
+            stats.peak = max(stats.peak, peak - memory_before)
+
+
+    def report(self, out: TextIO, top: int = 15) -> None: # сводка: операции, функции, места выделения памяти
+        out.write(f"Профиль: {self.elapsed:.3f} с, {sum(self.stacks.values())} выборок стека"
+                  f" (раз в {self.interval * 1000:g} мс)\n")
+        out.write(f"  {'операция':<28}{'вызовов':>10}{'время, с':>12}{'мкс/вызов':>12}{'осталось, КБ':>14}{'пик, КБ':>10}\n")
+        for op, stats in sorted(self.operations.items(), key=lambda item: -item[1].total_time):
+            mean = stats.total_time / stats.calls * 1e6 if stats.calls else 0.0
+            out.write(f"  {op:<28}{stats.calls:>10}{stats.total_time:>12.3f}{mean:>12.1f}"
+                      f"{stats.allocated / 1024:>14.1f}{stats.peak / 1024:>10.1f}\n")
+
+        functions = io.StringIO()
+        pstats.Stats(self._profile, stream=functions).sort_stats('cumulative').print_stats(top)
+        out.write("\nФункции (cProfile, по времени вместе с вложенными вызовами):\n")
+        out.write(functions.getvalue().split('\n\n', 1)[-1].strip('\n') + '\n')
+
+        if self._memory is not None:
+            out.write("\nПамять (tracemalloc, занято к концу, по строкам):\n")
+            for stat in self._memory.statistics('lineno')[:top]:
+                frame = stat.traceback[0]
+                out.write(f"  {stat.size / 1024:>10.1f} КБ {stat.count:>9} блоков  {frame.filename}:{frame.lineno}\n")
+        out.flush()
+
+
+    def write_stacks(self, path: str) -> None: # стеки для flamegraph.pl, speedscope и т.п.
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(f"{stack} {count}\n")
+
+
+    def save(self, prefix: str, out: TextIO) -> None: # отчёт в out, файлы PREFIX.folded и PREFIX.pstats
+        self.report(out)
+        self.write_stacks(f"{prefix}.folded")
+        self._profile.dump_stats(f"{prefix}.pstats")
+        out.write(f"Стеки: {prefix}.folded, cProfile: {prefix}.pstats\n")
+
+
+def enable(prefix: str | None = None, out: TextIO | None = None) -> Profiler | None: # профилирование до выхода
+    # prefix не задан - берётся из LIBRARY_PROFILE; если нет и его, профилирование не включается
+    prefix = prefix or os.environ.get(PROFILE_ENV)
+    if not prefix:
+        return None
+    profiler = Profiler().start()
+
+    def finish() -> None:
+        profiler.stop()
+        profiler.save(prefix, out or sys.stderr)
+
+    atexit.register(finish)
+    return profiler
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+from typing import Dict
+from src.commands import execute, is_write
+from src.library_classes import Library
+from src.storage import PersistentLibrary, create_library
+
+
+MAX_LINE = 16 * 2 ** 20 # максимальная длина одной строки запроса (пакет команд может быть большим)
+MAX_PENDING = 1024 # сколько ответов одного соединения может ждать записи
+
+
+class LibraryServer: # сервер библиотеки: JSON-строки через TCP или Unix-сокет
+    # чтения выполняются сразу в цикле событий, а изменения - по очереди одной
+    # задачей-писателем, поэтому любое чтение видит целое состояние библиотеки.
+    # Соединение может присылать запросы, не дожидаясь ответов (конвейер): ответы
+    # приходят в порядке запросов, а чтение после ещё не применённого изменения
+    # того же соединения тоже уходит писателю, чтобы увидеть это изменение
+    def __init__(self, library: Library) -> None:
+        self.library = library
+        self._writes: asyncio.Queue = asyncio.Queue()
+        self._writer_task: asyncio.Task | None = None
+        self._server: asyncio.Server | None = None
+        self.error: BaseException | None = None # ошибка, остановившая писателя (изменения больше не принимаются)
+
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765, unix_path: str | None = None) -> None: # запуск
+        self._writes = asyncio.Queue()
+        self.error = None
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        if unix_path:
+            self._server = await asyncio.start_unix_server(self._handle, path=unix_path, limit=MAX_LINE)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE)
+
+
+    @property
+    def sockets(self) -> list: # открытые сокеты сервера (например, чтобы узнать выбранный порт)
+        return list(self._server.sockets) if self._server is not None else []
+
+
+    async def serve_forever(self) -> None: # работа до отмены или до ошибки писателя
+        if self._server is None or self._writer_task is None:
+            raise RuntimeError("Error: сервер не запущен, сначала вызовите start()")
+        serving = asyncio.ensure_future(self._server.serve_forever())
+        try:
+            await asyncio.wait((serving, self._writer_task), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            serving.cancel()
+        if self.error is not None:
+            raise self.error
+
+
+    async def stop(self) -> None: # остановка приёма соединений и задачи-писателя
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            except Exception: # ошибка писателя уже в self.error и в ответах на изменения
+                pass
+
+
+    def _execute(self, request: Dict) -> Dict: # выполнение запроса или пакета команд
+        if 'batch' not in request:
+            return execute(self.library, request)
+        commands = request['batch']
+        if not isinstance(commands, list):
+            return {'ok': False, 'error': "Error: 'batch' должен быть списком команд", 'type': 'TypeError'}
+        return {'ok': True, 'results': [execute(self.library, command) for command in commands]}
+
+
+    async def _writer_loop(self) -> None: # единственный писатель: применяет изменения по очереди
+        batch: list = []
+        try:
+            while True:
+                batch = [await self._writes.get()]
+                while not self._writes.empty(): # забираем всё, что накопилось, одним проходом
+                    batch.append(self._writes.get_nowait())
+                responses = [self._execute(request) for request, _ in batch]
+                if isinstance(self.library, PersistentLibrary):
+                    self.library.sync() # один fsync на всю пачку; ответы уходят после него
+                for (_, future), response in zip(batch, responses):
+                    if not future.cancelled():
+                        future.set_result(response)
+                batch = []
+        except Exception as e: # например, OSError при fsync: ждущие ответа не должны зависнуть
+            self.error = e
+            failed = _failure(e)
+            while not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(failed)
+            raise
+
+
+    def _submit(self, request: Dict) -> asyncio.Future: # постановка запроса в очередь писателя
+        if self.error is not None: # писатель остановлен - изменение сразу получает его ошибку
+            return _ready(_failure(self.error))
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((request, future))
+        return future
+
+
+    @staticmethod
+    def _has_writes(request: Dict) -> bool: # изменяет ли запрос (или одна из команд пакета) библиотеку
+        if 'batch' in request:
+            return isinstance(request['batch'], list) and any(
+                isinstance(command, dict) and is_write(command) for command in request['batch'])
+        return is_write(request)
+
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None: # одно соединение
+        responses: asyncio.Queue = asyncio.Queue(MAX_PENDING)
+        sender = asyncio.create_task(self._send_responses(responses, writer))
+        last_write: asyncio.Future | None = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    await responses.put((None, _ready({'ok': False, 'error': "Error: слишком длинный запрос",
+                                                       'type': 'ValueError'})))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("запрос должен быть JSON-объектом")
+                except ValueError as e:
+                    await responses.put((None, _ready({'ok': False, 'error': f"Error: некорректный JSON - {e}",
+                                                       'type': 'ValueError'})))
+                    continue
+
+                if self._has_writes(request) or (last_write is not None and not last_write.done()):
+                    last_write = future = self._submit(request)
+                else:
+                    future = _ready(self._execute(request))
+                await responses.put((request.get('id'), future)) # ответы уходят строго в порядке запросов
+        finally:
+            await responses.put(None)
+            await sender
+
+
+    @staticmethod
+    async def _send_responses(responses: asyncio.Queue, writer: asyncio.StreamWriter) -> None: # отправка ответов
+        try:
+            while True:
+                item = await responses.get()
+                if item is None:
+                    break
+                request_id, future = item
+                response = await future
+                if request_id is not None:
+                    response = dict(response, id=request_id)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                if responses.empty(): # буфер сбрасывается, только когда готовых ответов больше нет
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _failure(error: BaseException) -> Dict: # ответ на изменение, которое писатель не смог выполнить
+    return {'ok': False, 'error': f"Error: запись остановлена - {error}", 'type': type(error).__name__}
+
+
+def _ready(response: Dict) -> asyncio.Future: # уже готовый ответ
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(response)
+    return future
+
+
+async def _serve(args) -> None:
+    library = create_library(default_sync_every=0) # fsync делает писатель сервера - один на пачку изменений
+    server = LibraryServer(library)
+    await server.start(args.host, args.port, args.unix)
+    address = args.unix or f"{args.host}:{server.sockets[0].getsockname()[1]}"
+    print(f"Сервер библиотеки запущен: {address}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
+        if isinstance(library, PersistentLibrary):
+            library.close()
+
+
+def main(argv=None) -> None: # python -m src.server
+    parser = argparse.ArgumentParser(description="Сервер библиотеки (JSON-строки)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="путь к Unix-сокету вместо TCP")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+import hashlib
+import heapq
+import multiprocessing
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from itertools import chain, islice, zip_longest
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NoReturn
+from src.concurrency import RWLock
+from src.errors import BulkLoadError, ExistError
+from src.library_classes import Book, Library
+from src.metrics import Metrics, instrumented
+from src.stats import CatalogStats
+
+
+def stable_hash(isbn: str) -> int: # 64-битный хэш ISBN, одинаковый во всех процессах (hash() строк - нет)
+    return int.from_bytes(hashlib.blake2b(str(isbn).encode(), digest_size=8).digest(), 'little')
+
+
+def jump_hash(key: int, buckets: int) -> int: # jump consistent hash: номер корзины от 0 до buckets - 1
+    # при переходе от n к n + 1 корзинам в новую переезжает только 1/(n + 1) ключей, остальные остаются на месте
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(isbn: str, shards: int) -> int: # номер шарда, которому принадлежит книга
+    return jump_hash(stable_hash(isbn), shards)
+
+
+# методы Library, которые можно вызвать в процессе-шарде
+SHARD_METHODS = frozenset({
+    'add_book_to_lib', 'bulk_load', 'remove_book_from_lib', 'update_book_info', 'register_index', 'drop_index',
+    'indexes', 'find_by_isbn', 'find_by_author', 'find_by_year', 'find_by_genre', 'find_by_year_range', 'find_by',
+    'find_in_range', 'find', 'explain', 'search_text', 'count_in_range', 'oldest', 'newest', 'list', 'cache_stats',
+    '__len__', '__contains__',
+})
+
+
+def _extract(library: Library, index: int, shards: int) -> list: # книги, которые при shards шардах живут в других
+    moving = [book for book in library if shard_of(book.isbn, shards) != index]
+    for book in moving:
+        library.remove_book_from_lib(book.isbn)
+    return moving
+
+
+def _existing(library: Library, isbns: list) -> list: # какие из ISBN уже есть в шарде
+    return [isbn for isbn in isbns if library.find_by_isbn(isbn) is not None]
+
+
+def _stats(library: Library) -> CatalogStats: # копия статистики шарда без связей с его веткой
+    return library.stats().detached()
+
+
+SHARD_OPERATIONS: Dict[str, Callable] = {'extract': _extract, 'existing': _existing, 'books': list,
+                                         'stats': _stats} # служебные операции шарда
+
+
+def _serve_shard(conn, cache_size: int) -> None: # цикл процесса-шарда: (операция, args, kwargs) -> (успех, результат)
+    library = Library(cache_size=cache_size)
+    while True:
+        try:
+            op, args, kwargs = conn.recv()
+        except EOFError: # главный процесс закрыл канал
+            break
+        if op == 'close':
+            conn.send((True, None))
+            break
+        try:
+            if op in SHARD_OPERATIONS:
+                result = SHARD_OPERATIONS[op](library, *args, **kwargs)
+            elif op in SHARD_METHODS:
+                result = getattr(library, op)(*args, **kwargs)
+            else:
+                raise ValueError(f"Error: неизвестная операция шарда '{op}'")
+            reply = (True, result)
+        except Exception as e: # ошибка передаётся вызывающему и поднимается у него
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e: # результат или ошибку нельзя передать между процессами
+            conn.send((False, RuntimeError(f"Error: шард не смог передать ответ: {e}")))
+    conn.close()
+
+
+class _Shard: # процесс-шард и канал к нему
+    def __init__(self, index: int, context, cache_size: int) -> None:
+        self.index = index
+        self.lock = threading.Lock() # запрос и ответ - под блокировкой, чтобы ответы потоков не перепутались
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_serve_shard, args=(child, cache_size),
+                                       name=f'library-shard-{index}', daemon=True)
+        self.process.start()
+        child.close()
+
+
+    def send(self, op: str, args: tuple = (), kwargs: Dict | None = None) -> None:
+        self._conn.send((op, args, kwargs or {}))
+
+
+    def receive(self): # ответ шарда; ошибка шарда поднимается здесь
+        ok, result = self._conn.recv()
+        if not ok:
+            raise result
+        return result
+
+
+    def ask(self, op: str, *args, **kwargs): # запрос без блокировки (её держит вызывающий)
+        self.send(op, args, kwargs)
+        return self.receive()
+
+
+    def call(self, op: str, *args, **kwargs): # запрос к шарду из любого потока
+        with self.lock:
+            return self.ask(op, *args, **kwargs)
+
+
+    def close(self) -> None: # остановка процесса
+        with self.lock:
+            try:
+                self.ask('close')
+            except (EOFError, OSError):
+                pass
+            self._conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardedLibrary: # библиотека, разделённая по ISBN между процессами-шардами
+    # книга живёт в шарде shard_of(isbn, число шардов): операции по ISBN идут в один шард, поиски по
+    # автору, году, жанру рассылаются всем шардам сразу и выполняются параллельно, результаты сливаются.
+    # Книги передаются между процессами копиями: изменять книгу можно только через update_book_info.
+    # Интерфейс Library, кроме представлений без копирования (view, cursor) и ветвления (fork, snapshot) -
+    # они возвращают живые объекты одного процесса и здесь поднимают NotImplementedError
+    def __init__(self, shards: int | None = None, cache_size: int = 0, start_method: str | None = None) -> None:
+        self.metrics = Metrics() # метрики операций на стороне главного процесса
+        self._context = multiprocessing.get_context(start_method)
+        self._cache_size = cache_size # размер кэша запросов в каждом шарде
+        self._lock = RWLock() # операции - под блокировкой чтения, изменение числа шардов - под записью
+        self._shards: List[_Shard] = []
+        self._start(shards or os.cpu_count() or 1)
+
+
+    def _start(self, count: int) -> None: # запуск недостающих шардов до count
+        for index in range(len(self._shards), count):
+            self._shards.append(_Shard(index, self._context, self._cache_size))
+
+
+    def _route(self, isbn: str) -> _Shard: # шард, которому принадлежит книга
+        return self._shards[shard_of(isbn, len(self._shards))]
+
+
+    @contextmanager
+    def _locked(self, shards: Iterable[_Shard]) -> Iterator[None]: # блокировки нескольких шардов (по порядку - без взаимоблокировок)
+        with ExitStack() as stack:
+            for shard in sorted(set(shards), key=lambda shard: shard.index):
+                stack.enter_context(shard.lock)
+            yield
+
+
+    @staticmethod
+    def _exchange(requests: Dict[_Shard, tuple]) -> Dict[_Shard, Any]: # запросы {шард: (op, args[, kwargs])} параллельно
+        # сначала запросы уходят всем шардам, потом собираются ответы; ошибка поднимается после всех ответов,
+        # чтобы в каналах не остались непрочитанные ответы
+        for shard, request in requests.items():
+            shard.send(*request)
+        results: Dict[_Shard, Any] = {}
+        error: Exception | None = None
+        for shard in requests:
+            try:
+                results[shard] = shard.receive()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+
+    def _scatter(self, op: str, *args, **kwargs) -> list: # одна операция на всех шардах, результаты по порядку шардов
+        with self._lock.read(), self._locked(self._shards):
+            results = self._exchange({shard: (op, args, kwargs) for shard in self._shards})
+            return [results[shard] for shard in self._shards]
+
+
+    def _merged(self, op: str, *args, **kwargs) -> list: # результаты поиска всех шардов одним списком
+        return list(chain.from_iterable(self._scatter(op, *args, **kwargs)))
+
+
+    def _call(self, isbn: str, op: str, *args, **kwargs): # операция в шарде, которому принадлежит книга
+        with self._lock.read():
+            return self._route(isbn).call(op, *args, **kwargs)
+
+
+    @instrumented('add')
+    def add_book_to_lib(self, book: Book) -> None: # добавить книгу в её шард
+        if not isinstance(book, Book):
+            raise TypeError("Error: значение не совпадает с нужным типом объекта - Book")
+        self._call(book.isbn, 'add_book_to_lib', book)
+
+
+    @instrumented('bulk_load')
+    def bulk_load(self, books: Iterable[Book]) -> int: # пакетная загрузка во все шарды параллельно: всё или ничего
+        batch = list(books)
+        with self._lock.read(), self._locked(self._shards):
+            parts: Dict[_Shard, List[Book]] = {}
+            seen: set = set()
+            duplicates = []
+            for book in batch:
+                if not isinstance(book, Book):
+                    raise TypeError("Error: значение не совпадает с нужным типом объекта - Book")
+                if book.isbn in seen:
+                    duplicates.append(book.isbn)
+                seen.add(book.isbn)
+                parts.setdefault(self._route(book.isbn), []).append(book)
+
+            existing = self._exchange({shard: ('existing', ([book.isbn for book in part],))
+                                       for shard, part in parts.items()})
+            duplicates.extend(chain.from_iterable(existing.values()))
+            if duplicates:
+                raise BulkLoadError(duplicates)
+            self._exchange({shard: ('bulk_load', (part,)) for shard, part in parts.items()})
+        return len(batch)
+
+
+    @instrumented('remove')
+    def remove_book_from_lib(self, isbn: str) -> None: # удалить книгу из её шарда
+        self._call(isbn, 'remove_book_from_lib', isbn)
+
+
+    @instrumented('update')
+    def update_book_info(self, isbn: str, /, **kwargs) -> None: # обновить книгу (смена ISBN может перенести её в другой шард)
+        new_isbn = kwargs.get('isbn', isbn)
+        with self._lock.read():
+            source, target = self._route(isbn), self._route(new_isbn)
+            if source is target:
+                source.call('update_book_info', isbn, **kwargs)
+                return
+            with self._locked((source, target)):
+                if target.ask('existing', [new_isbn]):
+                    raise ExistError(f"Error: книга с ISBN '{new_isbn}' уже существует")
+                # книга удаляется из старого шарда только после того, как новый её принял;
+                # если не принял - изменение в старом шарде откатывается
+                original = source.ask('find_by_isbn', isbn)
+                source.ask('update_book_info', isbn, **kwargs)
+                try:
+                    target.ask('add_book_to_lib', source.ask('find_by_isbn', new_isbn))
+                except Exception:
+                    source.ask('update_book_info', new_isbn,
+                               **{key: getattr(original, key) for key in kwargs if hasattr(original, key)})
+                    raise
+                source.ask('remove_book_from_lib', new_isbn)
+
+
+    def register_index(self, field: str, kind: str = 'hash') -> None: # индекс по полю во всех шардах
+        self._scatter('register_index', field, kind)
+
+
+    def drop_index(self, field: str) -> None:
+        self._scatter('drop_index', field)
+
+
+    def indexes(self) -> Dict[str, str]: # зарегистрированные индексы (одинаковые во всех шардах)
+        return self._scatter('indexes')[0]
+
+
+    @instrumented('find_by_isbn', lookup=True)
+    def find_by_isbn(self, isbn: str) -> Book | None: # копия книги из её шарда
+        return self._call(isbn, 'find_by_isbn', isbn)
+
+
+    @instrumented('find_by_author', lookup=True)
+    def find_by_author(self, author: str) -> list: # книги автора из всех шардов (по шардам, в порядке добавления)
+        return self._merged('find_by_author', author)
+
+
+    @instrumented('find_by_year', lookup=True)
+    def find_by_year(self, year: int) -> list:
+        return self._merged('find_by_year', year)
+
+
+    @instrumented('find_by_genre', lookup=True)
+    def find_by_genre(self, genre: str) -> list:
+        return self._merged('find_by_genre', genre)
+
+
+    @instrumented('find_by', lookup=True)
+    def find_by(self, field: str, value) -> list:
+        return self._merged('find_by', field, value)
+
+
+    @instrumented('find', lookup=True)
+    def find(self, **criteria) -> list:
+        return self._merged('find', **criteria)
+
+
+    @instrumented('find_by_year_range', lookup=True)
+    def find_by_year_range(self, lo: int, hi: int) -> list: # слияние упорядоченных по году результатов шардов
+        return list(heapq.merge(*self._scatter('find_by_year_range', lo, hi), key=lambda book: book.year))
+
+
+    @instrumented('find_in_range', lookup=True)
+    def find_in_range(self, field: str, lo, hi) -> list:
+        return list(heapq.merge(*self._scatter('find_in_range', field, lo, hi),
+                                key=lambda book: getattr(book, field)))
+
+
+    def count_in_range(self, lo: int, hi: int) -> int:
+        return sum(self._scatter('count_in_range', lo, hi))
+
+
+    def oldest(self, n: int) -> list: # n самых старых книг: первые n из слияния n самых старых каждого шарда
+        return list(islice(heapq.merge(*self._scatter('oldest', n), key=lambda book: book.year), max(n, 0)))
+
+
+    def newest(self, n: int) -> list:
+        return list(islice(heapq.merge(*self._scatter('newest', n), key=lambda book: book.year, reverse=True),
+                           max(n, 0)))
+
+
+    @instrumented('search_text', lookup=True)
+    def search_text(self, query: str, limit: int = 10) -> list: # лучшие книги шардов по очереди
+        # оценки совпадений между шардами не сравниваются: берутся первые места всех шардов, затем вторые...
+        ranked = zip_longest(*self._scatter('search_text', query, limit))
+        return [book for book in chain.from_iterable(ranked) if book is not None][:max(limit, 0)]
+
+
+    @instrumented('list')
+    def list(self, order_by: str | None = None, descending: bool = False, offset: int = 0,
+             limit: int | None = None) -> list: # слияние первых offset + limit книг каждого шарда
+        # без order_by порядок добавления между шардами не известен - книги идут шард за шардом
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("Error: offset и limit не могут быть отрицательными")
+        stop = None if limit is None else offset + limit
+        pages = self._scatter('list', order_by, descending, 0, stop)
+        merged: Iterable[Book]
+        if order_by is None:
+            merged = chain.from_iterable(pages)
+        else:
+            merged = heapq.merge(*pages, key=lambda book: (getattr(book, order_by), book.isbn), reverse=descending)
+        return list(islice(merged, offset, stop))
+
+
+    def explain(self, **criteria) -> List[Dict]: # планы find всех шардов; шаг плана помечен номером шарда
+        return [dict(step, shard=index) for index, plan in enumerate(self._scatter('explain', **criteria))
+                for step in plan]
+
+
+    def stats(self) -> CatalogStats: # статистика каталога - сумма статистик шардов (копия)
+        return CatalogStats.merged(self._scatter('stats'))
+
+
+    def cache_stats(self) -> Dict | None: # сумма статистик кэшей шардов (None, если кэш выключен)
+        parts = [part for part in self._scatter('cache_stats') if part is not None]
+        if not parts:
+            return None
+        merged = {key: sum(part[key] for part in parts) for key in parts[0] if key != 'hit_ratio'}
+        lookups = merged['hits'] + merged['misses']
+        merged['hit_ratio'] = merged['hits'] / lookups if lookups else None
+        return merged
+
+
+    def iter_books(self) -> Iterator[Book]: # все книги (копии) шард за шардом
+        return iter(self._merged('books'))
+
+
+    def _unsupported(self, name: str) -> NoReturn:
+        raise NotImplementedError(f"Error: ShardedLibrary не поддерживает {name}: книги шардов живут в других процессах")
+
+
+    def view(self, field: str, key) -> NoReturn:
+        self._unsupported('view')
+
+
+    def cursor(self, field: str, key, offset: int = 0, limit: int = 50) -> NoReturn:
+        self._unsupported('cursor')
+
+
+    def fork(self) -> NoReturn:
+        self._unsupported('fork')
+
+
+    def snapshot(self) -> NoReturn:
+        self._unsupported('snapshot')
+
+
+    def shard_sizes(self) -> List[int]: # количество книг в каждом шарде
+        return self._scatter('__len__')
+
+
+    def resize(self, shards: int) -> int: # новое число шардов; возвращает количество перенесённых книг
+        # с jump consistent hash переезжают только книги, чей шард изменился: при росте с n до m -
+        # примерно (m - n) / m книг, при уменьшении - книги убираемых шардов
+        if shards < 1:
+            raise ValueError("Error: нужен хотя бы один шард")
+        with self._lock.write():
+            old = list(self._shards)
+            self._start(shards)
+            moving = self._exchange({shard: ('extract', (shard.index, shards)) for shard in old})
+            parts: Dict[_Shard, List[Book]] = {}
+            for book in chain.from_iterable(moving.values()):
+                parts.setdefault(self._shards[shard_of(book.isbn, shards)], []).append(book)
+            try:
+                self._exchange({shard: ('bulk_load', (part,)) for shard, part in parts.items()})
+            except Exception: # книги возвращаются в старые шарды, число шардов не меняется
+                self._restore(old, moving)
+                raise
+            for shard in self._shards[shards:]:
+                shard.close()
+            del self._shards[shards:]
+            return sum(len(part) for part in parts.values())
+
+
+    def _restore(self, old: List[_Shard], moving: Dict[_Shard, List[Book]]) -> None: # откат неудачного resize
+        # часть шардов могла принять свои книги - они снова извлекаются по старому числу шардов
+        # (новые шарды отдают всё), и каждый старый шард получает обратно то, что из него извлекли
+        self._exchange({shard: ('extract', (shard.index, len(old))) for shard in self._shards})
+        self._exchange({shard: ('bulk_load', (books,)) for shard, books in moving.items() if books})
+        for shard in self._shards[len(old):]:
+            shard.close()
+        del self._shards[len(old):]
+
+
+    def close(self) -> None: # остановка всех шардов
+        with self._lock.write():
+            for shard in self._shards:
+                shard.close()
+            self._shards = []
+
+
+    def __enter__(self) -> 'ShardedLibrary':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def __len__(self) -> int: # количество книг во всех шардах
+        return sum(self.shard_sizes())
+
+
+    def __contains__(self, book: Book) -> bool:
+        return isinstance(book, Book) and self._call(book.isbn, '__contains__', book)
+
+
+    def __iter__(self) -> Iterator[Book]: # копии книг, шард за шардом
+        for books in self._scatter('books'):
+            yield from books
@@ -1,5 +1,15 @@
+import argparse
+import json
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from time import perf_counter
+from src.event_log import EventLogWriter
 from src.library_classes import Book, Library
+from src.metrics import active_profiler
+from src.profiling import DEFAULT_PREFIX, PROFILE_ENV, enable as enable_profiling
 
 
 # данные для генерации случайных книг
@@ -17,72 +27,296 @@ def gen_isbn() -> str: # генерация уникального ISBN
     return f"978-5-{isbn_counter:05d}"
 
 
-def gen_book() -> Book: # генерация случайной книги
-    return Book(random.choice(TITLES), random.choice(AUTHORS),
-                random.randint(1800, 2025), random.choice(GENRES), gen_isbn())
+class IsbnGenerator: # собственный счётчик ISBN для каждого запуска симуляции
+    def __init__(self, start: int = 1000) -> None:
+        self._counter = start
 
 
-def run_simulation(steps=20, seed: int | None = None) -> None: # основная функция симуляции
+    def __call__(self) -> str: # следующий уникальный ISBN
+        self._counter += 1
+        return f"978-5-{self._counter:05d}"
+
+
+def gen_book(rng=random, next_isbn=gen_isbn) -> Book: # генерация случайной книги
+    return Book(rng.choice(TITLES), rng.choice(AUTHORS),
+                rng.randint(1800, 2025), rng.choice(GENRES), next_isbn())
+
+
+EVENTS = ["add", "remove", "search_author", "search_year", "search_genre", "update", "get_none"]
+SEARCH_EVENTS = ("search_author", "search_year", "search_genre")
+EVENT_BATCH = 4096 # сколько событий выбирается одним вызовом генератора
+
+
+class IsbnPool: # ISBN книг библиотеки для выбора случайной книги за O(1)
+    def __init__(self) -> None:
+        self._isbns: list = []
+        self._positions: dict = {} # isbn -> позиция в списке
+
+
+    def __len__(self) -> int:
+        return len(self._isbns)
+
+
+    def add(self, isbn: str) -> None: # добавление isbn в конец списка
+        self._positions[isbn] = len(self._isbns)
+        self._isbns.append(isbn)
+
+
+    def remove(self, isbn: str) -> None: # удаление: на место isbn ставится последний элемент
+        position = self._positions.pop(isbn)
+        last = self._isbns.pop()
+        if last != isbn:
+            self._isbns[position] = last
+            self._positions[last] = position
+
+
+    def choice(self, rng) -> str: # случайный isbn без копирования списка книг
+        return self._isbns[rng.randrange(len(self._isbns))]
+
+
+class SimulationResult: # итоги симуляции
+    def __init__(self, steps: int, seed: int | None) -> None:
+        self.steps = steps # количество шагов
+        self.seed = seed # seed генератора (None - случайный)
+        self.event_counts = {event: 0 for event in EVENTS} # сколько раз произошло каждое событие
+        self.event_time = {event: 0.0 for event in EVENTS} # суммарное время событий, с
+        self.found = {event: 0 for event in SEARCH_EVENTS} # найдено книг
+        self.hits = {event: 0 for event in SEARCH_EVENTS} # поисков, нашедших хотя бы одну книгу
+        self.size_histogram: dict = {} # размер библиотеки -> сколько шагов он держался
+        self.empty_events = 0 # удалений и обновлений при пустой библиотеке
+        self.final_size = 0 # книг в библиотеке после симуляции
+        self.elapsed = 0.0 # общее время симуляции, с
+
+
+    @property
+    def steps_per_second(self) -> float: # скорость симуляции
+        return self.steps / self.elapsed if self.elapsed else 0.0
+
+
+    def as_dict(self) -> dict: # итоги в виде словаря
+        return {'steps': self.steps, 'seed': self.seed, 'event_counts': dict(self.event_counts),
+                'event_time': dict(self.event_time), 'found': dict(self.found), 'hits': dict(self.hits),
+                'size_histogram': dict(self.size_histogram),
+                'empty_events': self.empty_events, 'final_size': self.final_size,
+                'elapsed': self.elapsed, 'steps_per_second': self.steps_per_second}
+
+
+def run_simulation(steps=20, seed: int | None = None, quiet: bool = False,
+                   record: str | None = None) -> SimulationResult | None: # основная функция симуляции
+    # quiet=True - без вывода на экран: итоги возвращаются в SimulationResult, ошибки не перехватываются;
+    # record - файл, в который записываются события библиотеки (см. event_log.py)
     try:
-        if seed is not None:
-            random.seed(seed)
-        # инициализация библиотеки
-        library = Library()
+        if record is None:
+            return _simulate(steps, seed, quiet, None)
+        with EventLogWriter(record) as log:
+            return _simulate(steps, seed, quiet, log)
+    except Exception as e: # обработка ошибок
+        if quiet:
+            raise
+        print(f"Ошибка в симуляции: {e}")
+        return None
+
+
+def _simulate(steps: int, seed: int | None, quiet: bool, log: EventLogWriter | None) -> SimulationResult:
+    # у каждого запуска свой генератор случайных чисел и свой счётчик ISBN,
+    # поэтому запуски не влияют друг на друга и воспроизводимы по seed
+    rng = random.Random(seed)
+    next_isbn = IsbnGenerator()
+    # инициализация библиотеки
+    library = Library()
+    pool = IsbnPool() # isbn книг библиотеки для случайного выбора
+    result = SimulationResult(steps, seed)
+    counts, times, found, hits = result.event_counts, result.event_time, result.found, result.hits
+    sizes = result.size_histogram
+    profiler = active_profiler() # включено профилирование - шаги учитываются как операции
+    step_names = {event: f"simulation.{event}" for event in EVENTS}
+    no_profile = nullcontext()
+    size, run = 0, 0 # размер библиотеки и сколько шагов подряд он держится (гистограмма - по отрезкам)
+    step = 0
+    started = last = perf_counter()
+
+    # основной цикл симуляции; события выбираются пачками - один вызов генератора на EVENT_BATCH шагов
+    while step < steps:
+        for event in rng.choices(EVENTS, k=min(EVENT_BATCH, steps - step)):
+            step += 1
+            with profiler.operation(step_names[event]) if profiler else no_profile: # шаг - в профиле
+                if not quiet:
+                    print(f"[Шаг {step}] {event}")
+                if event == "add": # добавление книги
+                    book = gen_book(rng, next_isbn)
+                    library.add_book_to_lib(book)
+                    pool.add(book.isbn)
+                    if log:
+                        log.add(book)
+                    if not quiet:
+                        print(f"Добавлена: '{book.title}'")
+        
+                elif event == "remove": # удаление книги
+                    if len(pool) == 0:
+                        result.empty_events += 1
+                        if not quiet:
+                            print("Нет книг")
+                    else:
+                        isbn = pool.choice(rng)
+                        if not quiet:
+                            print(f"Удалена: '{library.find_by_isbn(isbn).title}'")
+                        library.remove_book_from_lib(isbn)
+                        pool.remove(isbn)
+                        if log:
+                            log.remove(isbn)
+        
+                elif event == "search_author": # поиск по автору
+                    author = rng.choice(AUTHORS)
+                    books = library.find_by_author(author)
+                    if log:
+                        log.find('find_by_author', author)
+                    found[event] += len(books)
+                    hits[event] += bool(books)
+                    if not quiet:
+                        print(f"'{author}': {len(books)} книг")
         
-        # основной цикл симуляции
-        for step in range(1, steps + 1):
-            event = random.choice(["add", "remove", "search_author", "search_year", "search_genre", "update", "get_none"])
-            print(f"[Шаг {step}] {event}")
-            
-            if event == "add": # добавление книги
-                book = gen_book()
-                library.add_book_to_lib(book)
-                print(f"Добавлена: '{book.title}'")
-            
-            elif event == "remove": # удаление книги
-                if len(library) == 0:
-                    print("Нет книг")
-                else:
-                    book = random.choice(list(library))
-                    library.remove_book_from_lib(book.isbn)
-                    print(f"Удалена: '{book.title}'")
-            
-            elif event == "search_author": # поиск по автору
-                author = random.choice(AUTHORS)
-                books = library.find_by_author(author)
-                print(f"'{author}': {len(books)} книг")
-            
-            elif event == "search_year": # поиск по году
-                year = random.randint(1800, 2025)
-                books = library.find_by_year(year)
-                print(f"Год {year}: {len(books)} книг")
-            
-            elif event == "search_genre": # поиск по жанру
-                genre = random.choice(GENRES)
-                books = library.find_by_genre(genre)
-                print(f"'{genre}': {len(books)} книг")
-            
-            elif event == "update": # обновление информации о книге
-                if len(library) > 0:
-                    book = random.choice(list(library))
-                    new_year = random.randint(1800, 2025)
-                    library.update_book_info(book.isbn, year=new_year)
-                    print(f"Обновлён год '{book.title}': {new_year}")
-                else:
-                    print("Нет книг")
-            
-            elif event == "get_none": # попытка найти несуществующую книгу
-                book = library.find_by_isbn("978-0-00000")
-                print(f"Книга не найдена: {book is None}")
+                elif event == "search_year": # поиск по году
+                    year = rng.randint(1800, 2025)
+                    books = library.find_by_year(year)
+                    if log:
+                        log.find('find_by_year', year)
+                    found[event] += len(books)
+                    hits[event] += bool(books)
+                    if not quiet:
+                        print(f"Год {year}: {len(books)} книг")
         
-        print(f"Симуляция завершена.")
+                elif event == "search_genre": # поиск по жанру
+                    genre = rng.choice(GENRES)
+                    books = library.find_by_genre(genre)
+                    if log:
+                        log.find('find_by_genre', genre)
+                    found[event] += len(books)
+                    hits[event] += bool(books)
+                    if not quiet:
+                        print(f"'{genre}': {len(books)} книг")
+        
+                elif event == "update": # обновление информации о книге
+                    if len(pool) > 0:
+                        isbn = pool.choice(rng)
+                        new_year = rng.randint(1800, 2025)
+                        library.update_book_info(isbn, year=new_year)
+                        if log:
+                            log.update(isbn, year=new_year)
+                        if not quiet:
+                            print(f"Обновлён год '{library.find_by_isbn(isbn).title}': {new_year}")
+                    else:
+                        result.empty_events += 1
+                        if not quiet:
+                            print("Нет книг")
+        
+                elif event == "get_none": # попытка найти несуществующую книгу
+                    book = library.find_by_isbn("978-0-00000")
+                    if log:
+                        log.find('find_by_isbn', "978-0-00000")
+                    if not quiet:
+                        print(f"Книга не найдена: {book is None}")
+
+            counts[event] += 1
+            now = perf_counter() # время шага - от конца предыдущего шага
+            times[event] += now - last
+            last = now
+            if len(pool) != size: # размер изменился - закрываем отрезок гистограммы
+                if run:
+                    sizes[size] = sizes.get(size, 0) + run
+                size, run = len(pool), 0
+            run += 1
+    if run:
+        sizes[size] = sizes.get(size, 0) + run
+
+    result.elapsed = perf_counter() - started
+    result.final_size = len(library)
+    if not quiet:
+        print("Симуляция завершена.")
         print(f"Книг: {len(library)}")
-        for i, book in enumerate(list(library)[:3], 1): # вывод первых 3 книг
+        for i, book in enumerate(islice(library, 3), 1): # вывод первых 3 книг
             print(f"  {i}. {book.title}")
+    return result
 
-    except Exception as e: # обработка ошибок
-        print(f"Ошибка в симуляции: {e}")
+
+def _run_quiet(args: tuple) -> dict: # запуск одной симуляции в процессе пула
+    steps, seed = args
+    return _simulate(steps, seed, True, None).as_dict()
+
+
+def _percentiles(histogram: dict, quantiles=(50, 90, 99)) -> dict: # перцентили по гистограмме значений
+    total = sum(histogram.values())
+    result = {}
+    if not total:
+        return {f"p{q}": 0 for q in quantiles}
+    ordered = sorted(histogram.items())
+    for q in quantiles:
+        rank = q / 100 * total
+        seen = 0
+        for value, amount in ordered:
+            seen += amount
+            if seen >= rank:
+                result[f"p{q}"] = value
+                break
+    result['max'] = ordered[-1][0]
+    return result
+
+
+def merge_results(runs: list) -> dict: # общий отчёт по нескольким запускам (словари из as_dict)
+    sizes: dict = {}
+    final_sizes: dict = {}
+    run_times: dict = {}
+    counts = {event: 0 for event in EVENTS}
+    hits = {event: 0 for event in SEARCH_EVENTS}
+    for run in runs:
+        for size, amount in run['size_histogram'].items():
+            sizes[int(size)] = sizes.get(int(size), 0) + amount
+        final_sizes[run['final_size']] = final_sizes.get(run['final_size'], 0) + 1
+        run_times[run['elapsed']] = run_times.get(run['elapsed'], 0) + 1
+        for event in EVENTS:
+            counts[event] += run['event_counts'][event]
+        for event in SEARCH_EVENTS:
+            hits[event] += run['hits'][event]
+    return {'runs': len(runs), 'seeds': [run['seed'] for run in runs],
+            'steps': sum(run['steps'] for run in runs),
+            'event_counts': counts,
+            'hit_rate': {event: hits[event] / counts[event] if counts[event] else None for event in SEARCH_EVENTS},
+            'library_size': _percentiles(sizes), 'final_size': _percentiles(final_sizes),
+            'run_time': _percentiles(run_times)}
+
+
+def run_sweep(seeds, steps: int = 10_000, workers: int | None = None) -> dict: # запуски по seed в пуле процессов
+    seeds = list(seeds)
+    started = perf_counter()
+    if workers == 1: # без пула - удобно для отладки
+        runs = [_run_quiet((steps, seed)) for seed in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            runs = list(executor.map(_run_quiet, [(steps, seed) for seed in seeds]))
+    report = merge_results(runs)
+    report['wall_time'] = perf_counter() - started
+    report['cpu_time'] = sum(run['elapsed'] for run in runs) # сумма времени отдельных запусков
+    report['workers'] = workers or os.cpu_count()
+    return report
+
+
+def main(argv=None) -> None: # запуск из командной строки: python -m src.simulation
+    parser = argparse.ArgumentParser(description="Симуляция событий библиотеки")
+    parser.add_argument('--steps', type=int, default=20, help="количество шагов одного запуска")
+    parser.add_argument('--seed', type=int, default=42, help="seed (для серии - первый seed)")
+    parser.add_argument('--sweep', type=int, default=0, help="количество запусков с seed, seed+1, ...")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов (по умолчанию - число ядер)")
+    parser.add_argument('--record', metavar='FILE', help="записать события одного запуска в журнал")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PREFIX, metavar='PREFIX',
+                        help=f"профилирование: отчёт при выходе, стеки в PREFIX.folded (или {PROFILE_ENV}=PREFIX)")
+    args = parser.parse_args(argv)
+    enable_profiling(args.profile)
+
+    if not args.sweep:
+        run_simulation(steps=args.steps, seed=args.seed, record=args.record) # запуск симуляции
+        return
+    report = run_sweep(range(args.seed, args.seed + args.sweep), args.steps, args.workers)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
 
 
 if __name__ == "__main__":
-    run_simulation(steps=20, seed=42) # запуск симуляции
+    main()
@@ -0,0 +1,203 @@
+from typing import Dict, Hashable, Iterable, List, Tuple
+from src.cow import CopyOnWrite
+
+
+class RankedCounter: # счётчик значений, всегда упорядоченных по убыванию количества
+    # значения лежат в списке по убыванию счётчика, значения с одинаковым счётчиком - одним блоком;
+    # для каждого счётчика известны начало и размер блока, поэтому +1/-1 - это обмен с краем
+    # своего блока за O(1), а первые k значений - просто первые k элементов списка
+    def __init__(self) -> None:
+        self._ranked: List = [] # значения по убыванию счётчика
+        self._position: Dict[Hashable, int] = {} # значение -> место в _ranked
+        self._count: Dict[Hashable, int] = {} # значение -> счётчик
+        self._block_start: Dict[int, int] = {} # счётчик -> первое место блока
+        self._block_size: Dict[int, int] = {} # счётчик -> размер блока
+
+
+    def __len__(self) -> int: # количество различных значений
+        return len(self._ranked)
+
+
+    def copy(self) -> 'RankedCounter': # независимая копия
+        clone = RankedCounter()
+        clone._ranked = list(self._ranked)
+        clone._position = dict(self._position)
+        clone._count = dict(self._count)
+        clone._block_start = dict(self._block_start)
+        clone._block_size = dict(self._block_size)
+        return clone
+
+
+    @classmethod
+    def from_counts(cls, counts: Dict) -> 'RankedCounter': # счётчик с готовыми количествами, за O(n log n)
+        counter = cls()
+        for position, (value, count) in enumerate(sorted(counts.items(), key=lambda item: -item[1])):
+            counter._ranked.append(value)
+            counter._position[value] = position
+            counter._count[value] = count
+            counter._join_block(count, position)
+        return counter
+
+
+    def __getitem__(self, value) -> int: # счётчик значения (0, если его нет)
+        return self._count.get(value, 0)
+
+
+    def _swap(self, i: int, j: int) -> None: # обмен местами двух значений списка
+        ranked = self._ranked
+        ranked[i], ranked[j] = ranked[j], ranked[i]
+        self._position[ranked[i]] = i
+        self._position[ranked[j]] = j
+
+
+    def _leave_block(self, count: int, front: bool) -> None: # уменьшение блока с начала или с конца
+        self._block_size[count] -= 1
+        if not self._block_size[count]:
+            del self._block_size[count], self._block_start[count]
+        elif front:
+            self._block_start[count] += 1
+
+
+    def _join_block(self, count: int, position: int) -> None: # значение на месте position входит в блок count
+        if count in self._block_size:
+            self._block_size[count] += 1
+            self._block_start[count] = min(self._block_start[count], position)
+        else:
+            self._block_size[count] = 1
+            self._block_start[count] = position
+
+
+    def increment(self, value) -> None: # +1 к счётчику значения
+        count = self._count.get(value, 0)
+        if not count: # новое значение встаёт в конец списка - в блок со счётчиком 1
+            self._position[value] = len(self._ranked)
+            self._ranked.append(value)
+            self._count[value] = 1
+            self._join_block(1, self._position[value])
+            return
+        first = self._block_start[count]
+        self._swap(self._position[value], first) # значение - в начало своего блока
+        self._leave_block(count, front=True)
+        self._count[value] = count + 1
+        self._join_block(count + 1, first) # и становится последним в блоке count + 1
+
+
+    def decrement(self, value) -> None: # -1 к счётчику значения (на нуле значение удаляется)
+        count = self._count[value]
+        last = self._block_start[count] + self._block_size[count] - 1
+        self._swap(self._position[value], last) # значение - в конец своего блока
+        self._leave_block(count, front=False)
+        if count == 1: # блок со счётчиком 1 - последний, значение в конце списка
+            self._ranked.pop()
+            del self._position[value], self._count[value]
+            return
+        self._count[value] = count - 1
+        self._join_block(count - 1, last) # и становится первым в блоке count - 1
+
+
+    def top(self, k: int) -> List[Tuple]: # k значений с наибольшими счётчиками, за O(k)
+        count = self._count
+        return [(value, count[value]) for value in self._ranked[:max(k, 0)]]
+
+
+    def counts(self) -> Dict: # все счётчики (копия)
+        return dict(self._count)
+
+
+class CatalogStats(CopyOnWrite): # статистика каталога, обновляемая при каждом изменении
+    # чтение не перебирает книги: количество по значению - O(1), первые k - O(k);
+    # результаты - копии, поэтому их можно читать, пока библиотека меняется
+    FIELDS = ('author', 'genre', 'year')
+
+
+    def __init__(self) -> None:
+        self.total = 0 # всего книг
+        self._counters = {field: RankedCounter() for field in self.FIELDS}
+        self._decades: Dict[int, int] = {} # десятилетие (1860, 1870, ...) -> количество книг
+
+
+    def check(self, field: str, value) -> None: # TypeError, если значение поля нельзя учесть в статистике
+        if field not in self._counters:
+            return
+        try:
+            self._decades.get(value // 10 * 10) if field == 'year' else hash(value)
+        except TypeError:
+            raise TypeError(f"Error: значение поля '{field}' нельзя учесть в статистике: {value!r}") from None
+
+
+    def detached(self) -> 'CatalogStats': # независимая копия: дальнейшие изменения каталога её не затрагивают
+        clone = CatalogStats()
+        clone.total = self.total
+        clone._counters = {field: counter.copy() for field, counter in self._counters.items()}
+        clone._decades = dict(self._decades)
+        return clone
+
+
+    @classmethod
+    def merged(cls, parts: Iterable['CatalogStats']) -> 'CatalogStats': # сумма статистик частей каталога (шардов)
+        merged = cls()
+        counts: Dict[str, Dict] = {field: {} for field in cls.FIELDS}
+        for part in parts:
+            merged.total += part.total
+            for field, counter in part._counters.items():
+                field_counts = counts[field]
+                for value, count in counter.counts().items():
+                    field_counts[value] = field_counts.get(value, 0) + count
+            for decade, count in part._decades.items():
+                merged._decades[decade] = merged._decades.get(decade, 0) + count
+        merged._counters = {field: RankedCounter.from_counts(counts[field]) for field in cls.FIELDS}
+        return merged
+
+
+    def _counter(self, field: str) -> RankedCounter:
+        counter = self._counters.get(field)
+        if counter is None:
+            raise KeyError(f"Error: статистика ведётся только по полям {', '.join(self.FIELDS)}")
+        return counter
+
+
+    def add(self, book) -> None: # учёт новой книги
+        self.total += 1
+        counters = self._writable('_counters')
+        for field in self.FIELDS:
+            self._writable_item(counters, field).increment(getattr(book, field))
+        decades = self._writable('_decades')
+        decade = book.year // 10 * 10
+        decades[decade] = decades.get(decade, 0) + 1
+
+
+    def remove(self, book) -> None: # учёт удалённой книги (поля - как при добавлении)
+        self.total -= 1
+        counters = self._writable('_counters')
+        for field in self.FIELDS:
+            self._writable_item(counters, field).decrement(getattr(book, field))
+        decades = self._writable('_decades')
+        decade = book.year // 10 * 10
+        decades[decade] -= 1
+        if not decades[decade]:
+            del decades[decade]
+
+
+    def count(self, field: str, value) -> int: # количество книг с данным значением поля
+        return self._counter(field)[value]
+
+
+    def distinct(self, field: str) -> int: # количество различных значений поля
+        return len(self._counter(field))
+
+
+    def counts(self, field: str) -> Dict: # количество книг по каждому значению поля
+        return self._counter(field).counts()
+
+
+    def top(self, field: str, k: int = 10) -> List[Tuple]: # k самых частых значений: [(значение, количество)]
+        return self._counter(field).top(k)
+
+
+    def decades(self) -> Dict[int, int]: # гистограмма по десятилетиям в порядке возрастания
+        return dict(sorted(self._decades.items()))
+
+
+    def summary(self, k: int = 10) -> Dict: # сводка для панели мониторинга
+        return {'total': self.total, 'distinct': {field: self.distinct(field) for field in self.FIELDS},
+                'top': {field: self.top(field, k) for field in self.FIELDS}, 'decades': self.decades()}
@@ -0,0 +1,181 @@
+import json
+import os
+from functools import partial
+from typing import Callable, Dict
+from src.catalog_io import book_from_dict, book_to_dict
+from src.library_classes import Book, Library
+
+
+LOG_NAME = 'library.log' # журнал изменений после последнего снимка
+SNAPSHOT_NAME = 'library.snapshot' # снимок всего каталога
+
+
+def _sync_directory(path: str) -> None: # fsync папки: переименование файла в ней переживает сбой
+    if os.name == 'nt': # в Windows папку нельзя открыть для fsync
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class PersistentLibrary(Library): # библиотека с журналом изменений и снимками на диске
+    def __init__(self, directory: str, sync_every: int = 1, snapshot_every: int = 100_000) -> None:
+        # sync_every - через сколько записей журнала делать fsync (0 - только при закрытии),
+        # snapshot_every - через сколько записей журнала делать новый снимок (0 - только вручную)
+        super().__init__()
+        self._directory = directory
+        self._sync_every = sync_every
+        self._snapshot_every = snapshot_every
+        self._log_path = os.path.join(directory, LOG_NAME)
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self._seq = 0 # номер последней записи журнала
+        self._unsynced = 0 # записей после последнего fsync
+        self._since_snapshot = 0 # записей после последнего снимка
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self.metrics.reset() # восстановление не учитывается в метриках
+        self._log = open(self._log_path, 'ab')
+        self._log_size = self._log.tell() # длина журнала в байтах: до неё журнал обрезается при откате
+
+
+    def _recover(self) -> None: # загрузка последнего снимка и применение хвоста журнала
+        snapshot_seq = 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding='utf-8') as file:
+                header = json.loads(file.readline())
+                snapshot_seq = header['seq']
+                super().bulk_load(book_from_dict(json.loads(line)) for line in file if line.strip())
+        self._seq = snapshot_seq
+
+        if not os.path.exists(self._log_path):
+            return
+        valid_size = 0
+        with open(self._log_path, 'rb') as file:
+            for raw in file:
+                if not raw.endswith(b'\n'): # недописанная запись в конце журнала после сбоя
+                    break
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                valid_size += len(raw)
+                if record['seq'] <= snapshot_seq: # уже учтено в снимке
+                    continue
+                self._apply(record)
+                self._seq = record['seq']
+                self._since_snapshot += self._entries(record)
+        if valid_size != os.path.getsize(self._log_path):
+            with open(self._log_path, 'r+b') as file:
+                file.truncate(valid_size)
+
+
+    def _apply(self, record: Dict) -> None: # повтор записи журнала без повторной записи в журнал
+        op = record['op']
+        if op == 'add':
+            super().add_book_to_lib(book_from_dict(record['book']))
+        elif op == 'remove':
+            super().remove_book_from_lib(record['isbn'])
+        elif op == 'update':
+            super().update_book_info(record['isbn'], **record['changes'])
+        elif op == 'bulk_load':
+            super().bulk_load(book_from_dict(data) for data in record['books'])
+        else:
+            raise ValueError(f"Error: неизвестная операция в журнале - '{op}'")
+
+
+    @staticmethod
+    def _entries(record: Dict) -> int: # сколько изменений в записи журнала (пакет - по одному на книгу)
+        return len(record['books']) if record['op'] == 'bulk_load' else 1
+
+
+    def _append(self, record: Dict, apply: Callable): # запись операции в журнал, затем - изменение в памяти
+        # запись попадает в журнал раньше, чем меняется память; если изменение не прошло проверки
+        # (повтор ISBN, нет книги, неверное значение), запись убирается из журнала
+        record['seq'] = self._seq + 1
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._log.write(line)
+        try:
+            result = apply()
+        except Exception:
+            self._log.truncate(self._log_size)
+            self._log.seek(self._log_size) # truncate не сдвигает позицию файла
+            raise
+        self._log_size += len(line)
+        self._seq += 1
+        self._unsynced += 1
+        self._since_snapshot += self._entries(record)
+        if self._sync_every and self._unsynced >= self._sync_every:
+            self.sync()
+        if self._snapshot_every and self._since_snapshot >= self._snapshot_every:
+            self.checkpoint()
+        return result
+
+
+    def sync(self) -> None: # сброс журнала на диск
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = 0
+
+
+    def checkpoint(self) -> None: # запись снимка каталога на диск и сжатие журнала
+        tmp_path = self._snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'seq': self._seq}) + '\n')
+            for book in self:
+                file.write(json.dumps(book_to_dict(book), ensure_ascii=False, separators=(',', ':')))
+                file.write('\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self._snapshot_path) # снимок заменяется атомарно
+        _sync_directory(self._directory) # новый снимок на диске раньше, чем журнал обнуляется
+
+        # все записи журнала уже есть в снимке - журнал можно начать заново
+        self._log.close()
+        self._log = open(self._log_path, 'wb')
+        self._log_size = 0
+        self._unsynced = 0
+        self._since_snapshot = 0
+
+
+    def close(self) -> None: # закрытие журнала с сохранением несброшенных записей
+        if not self._log.closed:
+            self.sync()
+            self._log.close()
+
+
+    def add_book_to_lib(self, book: Book) -> None: # добавление с записью в журнал
+        if not isinstance(book, Book):
+            raise TypeError("Error: значение не совпадает с нужным типом объекта - Book")
+        self._append({'op': 'add', 'book': book_to_dict(book)}, partial(super().add_book_to_lib, book))
+
+
+    def bulk_load(self, books) -> int: # пакетная загрузка одной записью журнала
+        # одна строка журнала - пакет восстанавливается целиком или не восстанавливается вовсе,
+        # fsync и снимок делаются один раз после того, как записан весь пакет
+        batch = list(books)
+        if not all(isinstance(book, Book) for book in batch):
+            raise TypeError("Error: значение не совпадает с нужным типом объекта - Book")
+        return self._append({'op': 'bulk_load', 'books': [book_to_dict(book) for book in batch]},
+                            partial(super().bulk_load, batch))
+
+
+    def remove_book_from_lib(self, isbn: str) -> None: # удаление с записью в журнал
+        self._append({'op': 'remove', 'isbn': isbn}, partial(super().remove_book_from_lib, isbn))
+
+
+    def update_book_info(self, isbn: str, /, **kwargs) -> None: # обновление с записью в журнал
+        self._append({'op': 'update', 'isbn': isbn, 'changes': kwargs},
+                     partial(super().update_book_info, isbn, **kwargs))
+
+
+def create_library(default_sync_every: int = 1) -> Library: # библиотека в памяти или на диске, если задан LIBRARY_DATA_DIR
+    # default_sync_every - sync_every, если не задан LIBRARY_SYNC_EVERY (сервер делает fsync сам, по пачкам)
+    data_dir = os.environ.get('LIBRARY_DATA_DIR')
+    if not data_dir:
+        return Library()
+    return PersistentLibrary(data_dir,
+                             sync_every=int(os.environ.get('LIBRARY_SYNC_EVERY', default_sync_every)),
+                             snapshot_every=int(os.environ.get('LIBRARY_SNAPSHOT_EVERY', '100000')))
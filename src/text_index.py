@@ -0,0 +1,181 @@
+import re
+from bisect import bisect_left, insort
+from heapq import nlargest
+from itertools import islice
+from typing import Dict, Iterator, List, Set, Tuple
+from src.cow import CopyOnWrite
+
+
+TOKEN_RE = re.compile(r"\w+") # слово - последовательность букв и цифр
+MAX_PREFIX_EXPANSION = 64 # сколько слов максимум подставляется вместо одного префикса
+MAX_FUZZY_CANDIDATES = 32 # сколько похожих слов максимум учитывается для одного слова запроса
+MIN_SIMILARITY = 0.4 # минимальная похожесть слов по триграммам для нечёткого совпадения
+MAX_RANK_PASSES = 8 # до скольких различных оценок книги ранжируются проходами по оценкам, а не кучей
+
+# веса совпадений: точное слово важнее префикса, префикс важнее опечатки
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.6
+FUZZY_WEIGHT = 0.5
+
+
+def tokenize(text: str) -> List[str]: # разбиение строки на нормализованные слова
+    return TOKEN_RE.findall(str(text).lower().replace('ё', 'е'))
+
+
+def trigrams(token: str) -> Set[str]: # триграммы слова с маркерами начала и конца
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int: # расстояние Левенштейна с ранним выходом
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TextIndex(CopyOnWrite): # инвертированный индекс по словам названия и автора
+    # индекс хранит только ISBN: книги по ним находит владелец индекса (IndexDict), поэтому
+    # замена объекта книги с теми же названием и автором индекс не затрагивает
+    def __init__(self, fields: Tuple[str, ...] = ('title', 'author')) -> None:
+        self._fields = fields # поля книги, слова которых попадают в индекс
+        self._postings: Dict[str, Set[str]] = {} # слово -> isbn книг с ним
+        self._vocabulary: List[str] = [] # отсортированный словарь для поиска по префиксу
+        self._by_trigram: Dict[str, Set[str]] = {} # триграмма -> слова с ней
+        self._book_tokens: Dict[str, Tuple[str, ...]] = {} # isbn -> слова, под которыми лежит книга
+
+
+    def __len__(self) -> int: # количество проиндексированных книг
+        return len(self._book_tokens)
+
+
+    def _tokens_of(self, book) -> Tuple[str, ...]: # уникальные слова индексируемых полей книги
+        tokens: Dict[str, None] = {}
+        for field in self._fields:
+            for token in tokenize(getattr(book, field, '')):
+                tokens[token] = None
+        return tuple(tokens)
+
+
+    def add(self, book) -> None: # добавление книги в индекс
+        if book.isbn in self._book_tokens:
+            self.remove(book)
+        tokens = self._tokens_of(book)
+        self._writable('_book_tokens')[book.isbn] = tokens
+        postings = self._writable('_postings')
+        for token in tokens:
+            posting = postings.get(token)
+            if posting is None: # новое слово - добавляем в словарь и в триграммы
+                posting = postings[token] = self._adopt(set())
+                insort(self._writable('_vocabulary'), token)
+                by_trigram = self._writable('_by_trigram')
+                for gram in trigrams(token):
+                    words = by_trigram.get(gram)
+                    if words is None:
+                        words = by_trigram[gram] = self._adopt(set())
+                    elif not self._owns(words):
+                        words = self._writable_item(by_trigram, gram)
+                    words.add(token)
+            elif not self._owns(posting): # список общий с другой веткой библиотеки
+                posting = self._writable_item(postings, token)
+            posting.add(book.isbn)
+
+
+    def remove(self, book) -> None: # удаление книги из индекса (по словам, под которыми она лежит)
+        if book.isbn not in self._book_tokens:
+            return
+        tokens = self._writable('_book_tokens').pop(book.isbn)
+        postings = self._writable('_postings')
+        for token in tokens:
+            posting = self._writable_item(postings, token)
+            posting.discard(book.isbn)
+            if not posting: # слово больше не встречается - убираем его отовсюду
+                del postings[token]
+                vocabulary = self._writable('_vocabulary')
+                del vocabulary[bisect_left(vocabulary, token)]
+                by_trigram = self._writable('_by_trigram')
+                for gram in trigrams(token):
+                    words = self._writable_item(by_trigram, gram)
+                    words.discard(token)
+                    if not words:
+                        del by_trigram[gram]
+
+
+    def _prefix_matches(self, prefix: str) -> Iterator[str]: # слова словаря, начинающиеся с prefix
+        start = bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+
+    def _fuzzy_matches(self, word: str) -> List[Tuple[str, float]]: # похожие слова с учётом опечаток
+        if len(word) < 3:
+            return []
+        grams = trigrams(word)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for token in self._by_trigram.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+
+        limit = 1 if len(word) <= 5 else 2 # допустимое число опечаток
+        matches = []
+        for token, count in nlargest(MAX_FUZZY_CANDIDATES, shared.items(), key=lambda item: item[1]):
+            similarity = 2 * count / (len(grams) + len(trigrams(token))) # коэффициент Дайса по триграммам
+            if similarity < MIN_SIMILARITY and edit_distance(word, token, limit) > limit:
+                continue
+            matches.append((token, similarity))
+        return matches
+
+
+    def _term_weights(self, word: str) -> Dict[str, float]: # слова индекса, подходящие под слово запроса
+        weights: Dict[str, float] = {}
+        for token, similarity in self._fuzzy_matches(word):
+            weights[token] = FUZZY_WEIGHT * min(max(similarity, MIN_SIMILARITY), 1.0)
+        for token in self._prefix_matches(word):
+            weights[token] = max(weights.get(token, 0.0), PREFIX_WEIGHT + 0.3 * len(word) / len(token))
+        if word in self._postings:
+            weights[word] = EXACT_WEIGHT + 0.3
+        return weights
+
+
+    def search(self, query: str, limit: int = 10) -> List[str]: # ISBN книг, лучше всего подходящих под запрос
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+
+        scores: Dict[str, float] = {}
+        for word in dict.fromkeys(words):
+            # слова индекса от большего веса к меньшему: книга получает вес первого слова, под которым
+            # она лежит, а разность множеств отсекает уже учтённые книги без перебора в Python
+            seen: Set[str] = set()
+            terms = sorted(self._term_weights(word).items(), key=lambda item: -item[1])
+            for i, (token, weight) in enumerate(terms):
+                books = self._postings[token] - seen if seen else self._postings[token]
+                if i + 1 < len(terms):
+                    seen |= books
+                if not scores: # первое слово запроса - словарь строится целиком в C
+                    scores.update(dict.fromkeys(books, weight))
+                    continue
+                for isbn in books:
+                    scores[isbn] = scores.get(isbn, 0.0) + weight
+
+        # обычно различных оценок немного: тогда книги выбираются по оценкам от большей к меньшей (при равной
+        # оценке - в порядке появления, как у сортировки), и перебор останавливается на limit книгах
+        distinct = set(scores.values())
+        if len(distinct) > MAX_RANK_PASSES:
+            return nlargest(limit, scores, key=scores.__getitem__)
+        ranked: List[str] = []
+        for score in sorted(distinct, reverse=True):
+            ranked.extend(islice((isbn for isbn, value in scores.items() if value == score), limit - len(ranked)))
+            if len(ranked) == limit:
+                break
+        return ranked
@@ -1,4 +1,28 @@
-from src.library_classes import Book, BookCollection, IndexDict, Library
+import asyncio
+import io
+import json
+import random
+import threading
+
+import pytest
+
+from benchmarks.bench_library import OPERATIONS, compare, run_benchmarks
+from src.binary_catalog import MappedCatalog, write_catalog
+from src.catalog_io import read_jsonl
+from src.commands import execute
+from src.concurrency import ThreadSafeLibrary
+from src.errors import BulkLoadError, ExistError
+from src.event_log import EventLogWriter, read_events, replay
+from src.indexes import OrderedIndex
+from src.library_classes import Book, BookCollection, BookCollectionView, IndexDict, Library, Magazine, TrainigMaterial
+from src.main import run_batch
+from src.profiling import Profiler
+from src.server import LibraryServer
+from src.simulation import IsbnPool, run_simulation, run_sweep
+from src.sharding import ShardedLibrary, shard_of
+from src import storage
+from src.storage import PersistentLibrary
+from src.text_index import TextIndex
 
 
 def test_empty_coll_init():
@@ -119,3 +143,960 @@ def test_library_remove_and_update():
 
     lib.remove_book_from_lib(book.isbn)
     assert len(lib) == 0
+
+
+def test_collection_order_after_remove():
+    books = [Book(f"Книга {i}", "Автор", 2000 + i, "Жанр", f"978-5-000-0000{i}-0") for i in range(5)]
+    collection = BookCollection(books)
+    collection.remove_from_collection(books[1])
+
+    assert len(collection) == 4
+    assert collection[1] == books[2]
+    assert list(collection[1:3]) == [books[2], books[3]]
+    assert [book.isbn for book in collection] == [books[i].isbn for i in (0, 2, 3, 4)]
+
+
+def test_collection_view_after_removals():
+    books = [Book(f"Книга {i}", "Автор", 2000 + i, "Жанр", f"978-5-000-0000{i}-0") for i in range(6)]
+    collection = BookCollection(books)
+    stale = collection[1:4]
+    collection.remove_from_collection(books[2])
+    collection.remove_from_collection(books[0])
+
+    with pytest.raises(RuntimeError):
+        list(stale)
+    view = collection[1:4]
+    assert isinstance(view, BookCollectionView)
+    assert view.to_list() == [books[3], books[4], books[5]]
+    assert view[::-1][0] == books[5]
+    assert list(view.materialize()) == [books[3], books[4], books[5]]
+
+
+def test_collection_setitem_keeps_order():
+    books = [Book(f"Книга {i}", "Автор", 2000 + i, "Жанр", f"978-5-000-0000{i}-0") for i in range(3)]
+    collection = BookCollection(books)
+    collection[1] = Book("Новая", "Автор", 2010, "Жанр", books[1].isbn)
+    collection[2] = Book("Другая", "Автор", 2011, "Жанр", "978-5-000-00009-0")
+
+    assert [book.title for book in collection] == ["Книга 0", "Новая", "Другая"]
+    assert collection[1].year == 2010
+
+
+def test_book_hash_matches_eq():
+    book_1 = Book("Война и мир", "Лев Толстой", 1869, "Роман", "978-5-123-45678-0")
+    book_2 = Book("Другое название", "Другой автор", 1900, "Повесть", "978-5-123-45678-0")
+    assert book_1 == book_2
+    assert hash(book_1) == hash(book_2)
+    assert len({book_1, book_2}) == 1
+
+
+def test_library_duplicate_not_added():
+    lib = Library()
+    book = Book("Тест", "Автор", 2020, "Жанр", "978-5-000-00000-0")
+    lib.add_book_to_lib(book)
+    with pytest.raises(ExistError):
+        lib.add_book_to_lib(Book("Тест 2", "Автор", 2021, "Жанр", book.isbn))
+    assert len(lib) == 1
+    assert lib.find_by_isbn(book.isbn).title == "Тест"
+
+
+def test_library_find_composite():
+    lib = Library()
+    book_1 = Book("Преступление и наказание", "Фёдор Достоевский", 1866, "Роман", "978-5-234-56789-1")
+    book_2 = Book("Игрок", "Фёдор Достоевский", 1866, "Повесть", "978-5-234-56789-2")
+    book_3 = Book("Братья Карамазовы", "Фёдор Достоевский", 1880, "Роман", "978-5-345-67890-2")
+    book_4 = Book("Война и мир", "Лев Толстой", 1869, "Роман", "978-5-123-45678-0")
+    for book in (book_1, book_2, book_3, book_4):
+        lib.add_book_to_lib(book)
+
+    assert lib.find(author="Фёдор Достоевский", year=1866, genre="Роман") == [book_1]
+    assert lib.find(author="Фёдор Достоевский", title="Игрок") == [book_2]
+    assert lib.find(author="Михаил Булгаков", genre="Роман") == []
+
+    plan = lib.explain(author="Фёдор Достоевский", year=1866, genre="Роман")
+    assert plan[0]['operation'] == 'index_scan'
+    assert plan[0]['field'] == 'year' # самый короткий список - 2 книги
+    assert [step['field'] for step in plan[1:]] == ['author', 'genre']
+    assert plan[-1]['candidates'] == 1
+
+
+def test_library_year_range():
+    lib = Library()
+    books = [Book(f"Книга {year}", "Автор", year, "Жанр", f"978-5-{year}") for year in (1950, 1866, 1901, 1920, 2001)]
+    for book in books:
+        lib.add_book_to_lib(book)
+
+    assert [book.year for book in lib.find_by_year_range(1900, 1950)] == [1901, 1920, 1950]
+    assert lib.count_in_range(1800, 1900) == 1
+    assert [book.year for book in lib.oldest(2)] == [1866, 1901]
+    assert [book.year for book in lib.newest(2)] == [2001, 1950]
+
+    lib.update_book_info("978-5-1866", year=1999)
+    lib.remove_book_from_lib("978-5-1920")
+    assert [book.year for book in lib.find_by_year_range(1900, 2000)] == [1901, 1950, 1999]
+    assert lib._index._years == [1901, 1950, 1999, 2001]
+
+
+def test_library_search_text():
+    lib = Library()
+    book_1 = Book("Преступление и наказание", "Фёдор Достоевский", 1866, "Роман", "978-5-234-56789-1")
+    book_2 = Book("Война и мир", "Лев Толстой", 1869, "Роман", "978-5-123-45678-0")
+    book_3 = Book("Мастер и Маргарита", "Михаил Булгаков", 1967, "Роман", "978-5-345-67890-2")
+    for book in (book_1, book_2, book_3):
+        lib.add_book_to_lib(book)
+
+    assert lib.search_text("достоев")[0] == book_1 # префикс
+    assert lib.search_text("Толстй")[0] == book_2 # опечатка
+    assert lib.search_text("мастер булгаков", limit=1) == [book_3]
+
+    lib.update_book_info(book_2.isbn, title="Анна Каренина")
+    assert book_2 not in lib.search_text("война")
+    assert lib.search_text("каренина") == [book_2]
+
+    lib.remove_book_from_lib(book_3.isbn)
+    assert lib.search_text("булгаков") == []
+
+
+def test_text_index_trigram_similarity():
+    index = TextIndex()
+    index.add(Book("Война и мир", "Лев Толстой", 1869, "Роман", "978-5-123-45678-0"))
+    similarity = dict(index._fuzzy_matches("толстой"))
+    assert similarity["толстой"] == 1.0 # совпадение всех триграмм - полная похожесть
+    assert 0.4 < dict(index._fuzzy_matches("толстый"))["толстой"] < 1.0
+
+
+def test_library_bulk_load_from_jsonl():
+    lines = io.StringIO(
+        '{"title": "Война и мир", "author": "Лев Толстой", "year": 1869, "genre": "Роман", "isbn": "1"}\n'
+        '{"type": "magazine", "title": "Наука", "author": "Редакция", "year": 2020, "number": 3, "month": "май", "isbn": "2"}\n'
+    )
+    lib = Library()
+    assert lib.bulk_load(read_jsonl(lines)) == 2
+    assert len(lib) == 2
+    assert lib.find_by_year_range(1800, 2100)[0].isbn == "1"
+    assert isinstance(lib.find_by_isbn("2"), Magazine)
+    assert lib.search_text("толстой")[0].isbn == "1"
+
+
+def test_library_bulk_load_all_or_nothing():
+    lib = Library()
+    lib.add_book_to_lib(Book("Тест", "Автор", 2020, "Жанр", "1"))
+    batch = [Book(f"Книга {i}", "Автор", 2000, "Жанр", isbn) for i, isbn in enumerate(["2", "1", "3", "2"])]
+    try:
+        lib.bulk_load(batch)
+        assert False, "ожидалась ошибка"
+    except BulkLoadError as e:
+        assert e.duplicates == ["1", "2"]
+    assert len(lib) == 1
+    assert lib.find_by_isbn("2") is None
+    assert len(lib.find_by_author("Автор")) == 1
+
+
+def test_persistent_library_recovery(tmp_path):
+    lib = PersistentLibrary(str(tmp_path), sync_every=2, snapshot_every=0)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    lib.add_book_to_lib(Book("Игрок", "Фёдор Достоевский", 1866, "Повесть", "2"))
+    lib.checkpoint()
+    lib.update_book_info("1", year=1870)
+    lib.remove_book_from_lib("2")
+    lib.add_book_to_lib(Book("1984", "Джордж Оруэлл", 1949, "Фантастика", "3"))
+    lib.close()
+
+    with open(tmp_path / "library.log", "a", encoding="utf-8") as file:
+        file.write('{"op": "add", "bo') # недописанная запись после сбоя
+
+    restored = PersistentLibrary(str(tmp_path))
+    assert len(restored) == 2
+    assert restored.find_by_isbn("1").year == 1870
+    assert restored.find_by_isbn("2") is None
+    assert restored.find_by_author("Джордж Оруэлл")[0].isbn == "3"
+    restored.add_book_to_lib(Book("Игрок", "Фёдор Достоевский", 1866, "Повесть", "2"))
+    restored.close()
+    assert len(PersistentLibrary(str(tmp_path))) == 3
+
+
+def test_persistent_library_bulk_load_crosses_snapshot(tmp_path):
+    books = [Book(f"Книга {i}", "Автор", 2000 + i, "Жанр", str(i)) for i in range(5)]
+    lib = PersistentLibrary(str(tmp_path), snapshot_every=3)
+    assert lib.bulk_load(books) == 5 # пакет больше порога снимка
+    lib.close()
+
+    restored = PersistentLibrary(str(tmp_path), snapshot_every=3)
+    assert len(restored) == 5
+    assert restored.find_by_isbn("4").title == "Книга 4"
+    restored.close()
+
+
+def test_persistent_library_logs_before_applying(tmp_path):
+    lib = PersistentLibrary(str(tmp_path), sync_every=0, snapshot_every=0)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    with pytest.raises(TypeError): # значение нельзя записать в журнал - память не меняется
+        lib.update_book_info("1", title=object())
+    assert lib.find_by_isbn("1").title == "Война и мир"
+    with pytest.raises(ExistError): # изменение не прошло проверки - запись убрана из журнала
+        lib.add_book_to_lib(Book("Игрок", "Фёдор Достоевский", 1866, "Повесть", "1"))
+    with pytest.raises(KeyError):
+        lib.remove_book_from_lib("2")
+    lib.update_book_info("1", year=1870)
+    lib.close()
+
+    with open(tmp_path / "library.log", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert [(record["op"], record["seq"]) for record in records] == [("add", 1), ("update", 2)]
+    restored = PersistentLibrary(str(tmp_path))
+    assert [(book.isbn, book.title, book.year) for book in restored] == [("1", "Война и мир", 1870)]
+
+
+def test_persistent_library_checkpoint_syncs_directory(tmp_path, monkeypatch):
+    synced = []
+
+    def record_sync(path):
+        synced.append((path, (tmp_path / "library.snapshot").exists(), (tmp_path / "library.log").stat().st_size))
+
+    monkeypatch.setattr(storage, "_sync_directory", record_sync)
+    lib = PersistentLibrary(str(tmp_path), snapshot_every=0)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    lib.checkpoint()
+    # папка сбрасывается на диск после замены снимка, но до обнуления журнала
+    assert len(synced) == 1 and synced[0][0] == str(tmp_path) and synced[0][1] and synced[0][2] > 0
+    assert (tmp_path / "library.log").stat().st_size == 0
+    lib.close()
+
+
+def test_mapped_catalog_roundtrip(tmp_path):
+    books = [Book("Война и мир", "Лев Толстой", 1869, "Роман", "978-5-123-45678-0"),
+             Book("Анна Каренина", "Лев Толстой", 1877, "Роман", "978-5-234-56789-1"),
+             Magazine("Наука и жизнь", "Редакция", 1969, 5, "май", isbn="977-0-00000-1"),
+             TrainigMaterial("Алгоритмы", "Иванов И.И.", 2020, "МАИ", "студенты", isbn="979-0-00000-2")]
+    path = str(tmp_path / "catalog.bin")
+    assert write_catalog(books, path) == 4
+
+    with MappedCatalog(path) as catalog:
+        assert len(catalog) == 4
+        assert catalog.find_by_isbn("978-5-234-56789-1").title == "Анна Каренина"
+        assert catalog.find_by_isbn("000") is None
+        assert [book.year for book in catalog.find_by_author("Лев Толстой")] == [1869, 1877]
+        assert catalog.find_by_genre("Журнал")[0].get_info_magazine() == "Выпуск 5 за май 1969"
+        assert isinstance(catalog.find_by_year(2020)[0], TrainigMaterial)
+        assert [book.year for book in catalog.find_by_year_range(1870, 1970)] == [1877, 1969]
+        assert books[0] in catalog
+        assert list(catalog) == books
+
+
+def test_library_metrics_and_hooks(capsys):
+    lib = Library()
+    events = []
+    lib.metrics.subscribe(events.append)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    lib.find_by_author("Лев Толстой")
+    lib.find_by_author("Нет такого")
+    lib.find_by_isbn("1")
+    try:
+        lib.remove_book_from_lib("404")
+    except KeyError:
+        pass
+
+    assert capsys.readouterr().out == "" # поиск больше ничего не печатает
+    stats = lib.metrics.snapshot()
+    assert stats['find_by_author']['hits'] == 1
+    assert stats['find_by_author']['misses'] == 1
+    assert stats['find_by_author']['hit_ratio'] == 0.5
+    assert stats['find_by_isbn']['hits'] == 1
+    assert stats['remove']['errors'] == 1
+    assert sum(stats['add']['histogram'].values()) == 1
+    assert [(event['op'], event['count']) for event in events[1:3]] == [('find_by_author', 1), ('find_by_author', 0)]
+
+
+def test_library_query_cache_invalidation():
+    lib = Library(cache_size=2)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    lib.add_book_to_lib(Book("Игрок", "Фёдор Достоевский", 1866, "Повесть", "2"))
+
+    assert len(lib.find_by_author("Лев Толстой")) == 1
+    assert len(lib.find_by_author("Лев Толстой")) == 1
+    assert len(lib.find(author="Фёдор Достоевский", genre="Повесть")) == 1
+    assert lib.cache_stats()['hits'] == 1
+
+    # книга Достоевского не затрагивает результат по Толстому
+    lib.add_book_to_lib(Book("Бесы", "Фёдор Достоевский", 1872, "Роман", "3"))
+    assert len(lib.find_by_author("Лев Толстой")) == 1
+    assert lib.cache_stats()['hits'] == 2
+
+    lib.update_book_info("2", genre="Роман")
+    assert lib.find(author="Фёдор Достоевский", genre="Повесть") == []
+    assert lib.cache_stats()['invalidations'] == 1
+
+    lib.find_by_genre("Роман")
+    assert lib.cache_stats()['evictions'] == 1
+    assert len(lib.find_by_genre("Роман")) == 3
+
+
+def test_cached_results_are_private_lists():
+    lib = Library(cache_size=4)
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    first = lib.find_by_author("Лев Толстой")
+    first.append(Book("Чужая", "Лев Толстой", 1900, "Роман", "x"))
+    second = lib.find_by_author("Лев Толстой") # из кэша
+    assert lib.cache_stats()['hits'] == 1
+    assert [book.isbn for book in second] == ["1"] and second is not first
+    second.clear()
+    assert [book.isbn for book in lib.find_by_author("Лев Толстой")] == ["1"]
+
+
+def test_query_cache_tracks_only_cached_keys():
+    lib = Library(cache_size=2)
+    for i in range(100): # без сохранённых результатов поколения не ведутся
+        lib.add_book_to_lib(Book("Книга", f"Автор {i}", 1900 + i, "Роман", str(i)))
+        lib.remove_book_from_lib(str(i))
+    assert lib.cache_stats()['tracked_keys'] == 0
+
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    for i in range(50): # вытесненные результаты забирают с собой свои ключи
+        lib.find_by_author(f"Автор {i}")
+    assert lib.cache_stats()['tracked_keys'] == 2
+    lib.update_book_info("1", author="Автор 49")
+    assert len(lib.find_by_author("Автор 49")) == 1
+    lib.find_by_author("Лев Толстой")
+    lib.find_by_year(1869)
+    assert lib.cache_stats()['tracked_keys'] == 2
+
+
+def test_run_simulation_quiet(capsys):
+    result = run_simulation(2000, seed=7, quiet=True)
+    assert capsys.readouterr().out == ""
+    assert sum(result.event_counts.values()) == 2000
+    assert 0 <= result.final_size <= result.event_counts["add"]
+    assert result.as_dict()["steps_per_second"] > 0
+
+
+def test_isbn_pool_random_choice():
+    pool = IsbnPool()
+    for isbn in ("1", "2", "3"):
+        pool.add(isbn)
+    pool.remove("1")
+    assert sorted(pool._isbns) == ["2", "3"]
+    assert pool._positions == {isbn: i for i, isbn in enumerate(pool._isbns)}
+    assert pool.choice(random.Random(0)) in ("2", "3")
+
+
+def test_run_sweep_reproducible():
+    first = run_simulation(1000, seed=3, quiet=True)
+    random.seed(0) # глобальный random не влияет на запуск
+    second = run_simulation(1000, seed=3, quiet=True)
+    assert first.event_counts == second.event_counts
+    assert first.size_histogram == second.size_histogram
+
+    parallel = run_sweep([3, 4], steps=1000, workers=2)
+    serial = run_sweep([3, 4], steps=1000, workers=1)
+    for key in ("event_counts", "hit_rate", "library_size", "final_size"):
+        assert parallel[key] == serial[key]
+    assert parallel["runs"] == 2
+    assert parallel["steps"] == 2000
+
+
+def test_benchmark_compare_detects_regression():
+    report = run_benchmarks(sizes=[200], ops=20, memory=False)
+    assert set(report["results"]["200"]["operations"]) == set(OPERATIONS)
+    assert compare(report, report) == []
+
+    slower = json.loads(json.dumps(report))
+    slower["results"]["200"]["operations"]["remove"]["p50"] *= 2
+    regressions = compare(slower, report, threshold=0.5)
+    assert [(item["op"], item["size"]) for item in regressions] == [("remove", 200)]
+    assert compare(slower, report, threshold=0.5, thresholds={"remove": 1.5}) == []
+
+
+def test_library_server_pipelining_and_batch():
+    async def scenario():
+        server = LibraryServer(Library())
+        await server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        requests = [
+            {"id": 1, "op": "add", "book": {"title": "Война и мир", "author": "Лев Толстой",
+                                            "year": 1869, "genre": "Роман", "isbn": "1"}},
+            {"id": 2, "op": "find_by_author", "author": "Лев Толстой"}, # видит добавление из запроса 1
+            {"id": 3, "batch": [{"op": "update", "isbn": "1", "changes": {"year": 1870}},
+                                {"op": "find_by_year", "year": 1870},
+                                {"op": "remove", "isbn": "404"}]},
+            {"id": 4, "op": "count"},
+            {"id": 5, "op": "unknown"},
+        ]
+        writer.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests) + b"not json\n")
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in range(len(requests) + 1)]
+        writer.close()
+        await server.stop()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert [response.get("id") for response in responses] == [1, 2, 3, 4, 5, None]
+    assert responses[0] == {"id": 1, "ok": True, "result": None}
+    assert responses[1]["result"][0]["isbn"] == "1"
+    batch = responses[2]["results"]
+    assert batch[1]["result"][0]["year"] == 1870
+    assert batch[2]["ok"] is False and batch[2]["type"] == "KeyError"
+    assert responses[3]["result"] == 1
+    assert responses[4]["ok"] is False
+    assert responses[5]["ok"] is False
+
+
+def test_library_server_fails_writes_when_sync_fails(tmp_path):
+    lib = PersistentLibrary(str(tmp_path), sync_every=0)
+
+    def broken_sync():
+        raise OSError("диск недоступен")
+
+    lib.sync = broken_sync
+
+    async def scenario():
+        server = LibraryServer(lib)
+        await server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        requests = [
+            {"id": 1, "op": "add", "book": {"title": "Игрок", "author": "Фёдор Достоевский",
+                                            "year": 1866, "genre": "Повесть", "isbn": "1"}},
+            {"id": 2, "op": "remove", "isbn": "1"},
+        ]
+        writer.write(json.dumps(requests[0]).encode() + b"\n")
+        first = json.loads(await asyncio.wait_for(reader.readline(), 5))
+        writer.write(json.dumps(requests[1]).encode() + b"\n" + json.dumps({"id": 3, "op": "count"}).encode() + b"\n")
+        rest = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(2)]
+        writer.close()
+        await server.stop()
+        return server, [first] + rest
+
+    server, responses = asyncio.run(scenario())
+    assert [response["type"] for response in responses[:2]] == ["OSError", "OSError"]
+    assert responses[2] == {"id": 3, "ok": True, "result": 1} # чтения продолжают работать
+    assert isinstance(server.error, OSError)
+
+
+def check_index_invariants(index):
+    for name, field in (("_by_author", "author"), ("_by_year", "year"), ("_by_genre", "genre")):
+        buckets = getattr(index, name)
+        assert sum(len(bucket) for bucket in buckets.values()) == len(index._by_isbn)
+        for book in index._by_isbn.values():
+            assert book in buckets[getattr(book, field)]
+    assert index._years == sorted(index._by_year)
+
+
+def test_thread_safe_library_stress():
+    lib = ThreadSafeLibrary(cache_size=64)
+    authors, genres = ["А", "Б", "В"], ["Роман", "Повесть"]
+    lib.bulk_load(Book(f"Книга {i}", authors[i % 3], 1900 + i % 10, genres[i % 2], str(i)) for i in range(300))
+    errors = []
+    stop = threading.Event()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for step in range(300):
+            isbn = str(rng.randrange(300))
+            lib.update_book_info(isbn, author=rng.choice(authors), year=1900 + rng.randrange(10),
+                                 genre=rng.choice(genres))
+            new_isbn = f"{seed}-{step}"
+            lib.add_book_to_lib(Book("Новая", rng.choice(authors), 1950, rng.choice(genres), new_isbn))
+            lib.remove_book_from_lib(new_isbn)
+
+    def reader():
+        try:
+            while not stop.is_set():
+                with lib.read_locked():
+                    check_index_invariants(lib._index)
+                    total = sum(len(lib.find_by_author(author)) for author in authors)
+                    assert total == len(lib)
+                lib.find(author=authors[0], genre=genres[0]) # поиски и вне общей блокировки
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(6)]
+    writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(3)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    check_index_invariants(lib._index)
+    assert len(lib) == 300
+
+
+def test_thread_safe_library_views_are_copies():
+    lib = ThreadSafeLibrary()
+    lib.bulk_load(Book(f"Книга {i}", "А", 1900, "Роман", str(i)) for i in range(5))
+    stats, view, books = lib.stats(), lib.view("author", "А"), lib.iter_books()
+    cursor = lib.cursor("author", "А", limit=2)
+    lib.add_book_to_lib(Book("Новая", "А", 1901, "Роман", "new"))
+    lib.remove_book_from_lib("0")
+
+    assert stats.total == 5 and stats.count("author", "А") == 5 # копия не меняется вместе с библиотекой
+    assert lib.stats().total == 5 and lib.stats().count("year", 1901) == 1
+    assert [book.isbn for book in view] == ["0", "1", "2", "3", "4"]
+    assert len(list(books)) == 5
+    assert [len(page) for page in cursor] == [2, 2, 1]
+
+
+def test_run_batch_summary():
+    lines = [
+        '{"op": "add", "title": "Война и мир", "author": "Лев Толстой", "year": 1869, "genre": "Роман", "isbn": "1"}',
+        '{"op": "add", "book": {"title": "Игрок", "author": "Фёдор Достоевский", "year": 1866, "genre": "Повесть", "isbn": "2"}}',
+        '# комментарий',
+        '{"op": "update", "isbn": "1", "changes": {"year": 1870}}',
+        '{"op": "remove", "isbn": "404"}',
+        '{"op": "find_by_year", "year": 1870}',
+    ]
+    lib = Library()
+    out = io.StringIO()
+    summary = run_batch(lines, lib, out, quiet=True)
+
+    assert summary["counts"] == {"add": 2, "update": 1, "remove": 1, "find_by_year": 1}
+    assert summary["errors"] == {"remove": 1}
+    assert len(lib) == 2 and lib.find_by_isbn("1").year == 1870
+    output = out.getvalue().splitlines()
+    assert json.loads(output[0])["line"] == 5 # в тихом режиме выводятся только ошибки
+    assert output[1].startswith("Выполнено команд: 5, ошибок: 1")
+
+
+def test_views_and_cursor():
+    lib = Library()
+    for i in range(10):
+        lib.add_book_to_lib(Book(f"Книга {i}", "Автор", 2000 + i, "Роман", str(i)))
+
+    view = lib.view("genre", "Роман")
+    page = view[2:8][1:3] # срез среза - тоже представление
+    assert isinstance(page, BookCollectionView)
+    assert [book.isbn for book in page] == ["3", "4"]
+    assert lib.view("genre", "Нет").is_empty()
+
+    cursor = lib.cursor("author", "Автор", offset=4, limit=4)
+    assert [book.isbn for book in cursor.next_page()] == ["4", "5", "6", "7"]
+    assert [[book.isbn for book in books] for books in cursor] == [["8", "9"]]
+    assert not cursor.has_more
+
+    snapshot = view.to_list()
+    books = lib.iter_books()
+    next(books)
+    lib.remove_book_from_lib("0")
+    for stale in (lambda: len(view), lambda: next(books)):
+        try:
+            stale()
+            assert False, "ожидалась ошибка"
+        except RuntimeError:
+            pass
+    assert len(snapshot) == 10
+
+
+def test_registered_indexes_on_subclass_fields():
+    lib = Library(cache_size=16)
+    lib.bulk_load([Magazine("Наука", "Редакция", 2020, 5, "Май", isbn="m1"),
+                   Magazine("Наука", "Редакция", 2020, 6, "Июнь", isbn="m2"),
+                   Book("Война и мир", "Лев Толстой", 1869, "Роман", "b1")])
+    lib.register_index("month")
+    lib.register_index("number", "sorted")
+    assert lib.indexes()["number"] == "sorted"
+    assert [book.isbn for book in lib.find_by("month", "Май")] == ["m1"]
+    assert lib.explain(month="Май", year=2020)[0]["operation"] == "index_scan"
+
+    lib.add_book_to_lib(Magazine("Мир", "Редакция", 2021, 7, "Май", isbn="m3"))
+    lib.update_book_info("m2", number=1)
+    assert [book.isbn for book in lib.find_in_range("number", 1, 5)] == ["m2", "m1"]
+    assert [book.isbn for book in lib.find(month="Май")] == ["m1", "m3"]
+    lib.update_book_info("m3", month="Июль")
+    assert [book.isbn for book in lib.find(month="Май")] == ["m1"]
+    lib.remove_book_from_lib("m1")
+    assert lib.find_by("month", "Май") == []
+    try:
+        lib.register_index("month")
+        assert False, "ожидалась ошибка"
+    except ExistError:
+        pass
+
+
+def test_update_with_bad_value_changes_nothing():
+    lib = Library()
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    with pytest.raises(TypeError):
+        lib.update_book_info("1", year="1999")
+    with pytest.raises(TypeError):
+        lib.update_book_info("1", author=["Лев Толстой"])
+    assert lib.find_by_isbn("1").year == 1869
+    assert lib.stats().total == 1 and lib.find_by_year(1869)
+    check_index_invariants(lib._index)
+
+    assert execute(lib, {"op": "update", "isbn": "1", "changes": {"year": "1999"}})["ok"] # строка из JSON - в число
+    assert [book.isbn for book in lib.find_by_year(1999)] == ["1"]
+    lib.remove_book_from_lib("1")
+    assert len(lib) == 0 and lib.stats().total == 0
+
+
+def test_update_book_isbn_rekeys_indexes():
+    lib = Library()
+    lib.add_book_to_lib(Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"))
+    lib.add_book_to_lib(Book("Анна Каренина", "Лев Толстой", 1877, "Роман", "2"))
+    lib.update_book_info("1", isbn="3", year=1870)
+    assert lib.find_by_isbn("1") is None
+    assert lib.find_by_isbn("3").year == 1870
+    assert [book.isbn for book in lib.find_by_author("Лев Толстой")] == ["2", "3"]
+    assert lib.search_text("война")[0].isbn == "3"
+    assert [book.isbn for book in lib] == ["2", "3"]
+    check_index_invariants(lib._index)
+    lib.remove_book_from_lib("3")
+    assert len(lib) == 1
+    try:
+        lib.update_book_info("2", isbn="2")
+        lib.add_book_to_lib(Book("Воскресение", "Лев Толстой", 1899, "Роман", "4"))
+        lib.update_book_info("2", isbn="4")
+        assert False, "ожидалась ошибка"
+    except ExistError:
+        pass
+    assert lib.find_by_isbn("2").title == "Анна Каренина"
+    check_index_invariants(lib._index)
+
+
+def test_books_are_slotted_and_share_values():
+    author = "".join(["Лев ", "Толстой"]) # отдельная копия строки, как при чтении из файла
+    book_1 = Book("Война и мир", "Лев Толстой", 1869, "Роман", "1")
+    book_2 = Book("Анна Каренина", author, int("1869"), "".join(["Ро", "ман"]), "2")
+    assert book_1.author is book_2.author and book_1.genre is book_2.genre and book_1.year is book_2.year
+    magazine = Magazine("Наука", "Редакция", 2020, 5, "".join(["М", "ай"]), isbn="3")
+    assert magazine.get_info_magazine() == "Выпуск 5 за Май 2020"
+    for book in (book_1, magazine, TrainigMaterial("Пособие", "Кафедра", 2020, "МАИ", "студенты", isbn="4")):
+        assert not hasattr(book, "__dict__")
+
+    lib = Library()
+    lib.add_book_to_lib(book_1)
+    lib.update_book_info("1", author="".join(["Фёдор ", "Достоевский"]))
+    assert book_1.author is next(iter(lib._index._by_author))
+
+
+def test_columnar_library_vectorized_queries():
+    pytest.importorskip("numpy")
+    from src.columnar import ColumnarLibrary
+
+    lib = ColumnarLibrary()
+    lib.bulk_load([Book("Война и мир", "Лев Толстой", 1869, "Роман", "1"),
+                   Book("Анна Каренина", "Лев Толстой", 1877, "Роман", "2"),
+                   Book("Идиот", "Фёдор Достоевский", 1869, "Роман", "3"),
+                   Magazine("Наука", "Редакция", 1900, 5, "Май", isbn="4")])
+    lib.add_book_to_lib(Book("Стихи", "Александр Пушкин", 1830, "Поэзия", "5"))
+    selected = lib.select(year__between=(1850, 1900), genre__in={"Роман", "Журнал"},
+                          author__not_in={"Фёдор Достоевский"})
+    assert [book.isbn for book in selected] == ["1", "2", "4"]
+    assert lib.count(genre="Роман", year__lt=1870) == 2
+    assert lib.group_count("author", genre="Роман") == {"Лев Толстой": 2, "Фёдор Достоевский": 1}
+    assert lib.group_count("year", author="Лев Толстой") == {1869: 1, 1877: 1}
+
+    lib.remove_book_from_lib("1")
+    lib.update_book_info("3", isbn="6", year=1870)
+    assert lib.find_by_isbn("6").title == "Идиот"
+    assert [book.isbn for book in lib.select(year__gte=1869, genre="Роман")] == ["2", "6"]
+    assert lib.count(title="Война и мир") == 0
+    for condition in ({"genre__lt": "Роман"}, {"year__like": 1}):
+        with pytest.raises(ValueError):
+            lib.count(**condition)
+
+
+def test_catalog_stats_incremental():
+    rng = random.Random(3)
+    lib = Library()
+    authors, genres = ["А", "Б", "В", "Г"], ["Роман", "Повесть", "Поэзия"]
+    lib.bulk_load(Book(f"Книга {i}", rng.choice(authors), rng.randint(1850, 1950), rng.choice(genres), str(i))
+                  for i in range(200))
+    for step in range(600):
+        isbn = str(rng.randrange(300))
+        if lib.find_by_isbn(isbn) is None:
+            lib.add_book_to_lib(Book("Новая", rng.choice(authors), rng.randint(1850, 1950), rng.choice(genres), isbn))
+        elif step % 3:
+            lib.update_book_info(isbn, author=rng.choice(authors), year=rng.randint(1850, 1950))
+        else:
+            lib.remove_book_from_lib(isbn)
+
+    stats = lib.stats()
+    books = list(lib)
+    assert stats.total == len(books)
+    for field in ("author", "genre", "year"):
+        expected = {}
+        for book in books:
+            expected[getattr(book, field)] = expected.get(getattr(book, field), 0) + 1
+        assert stats.counts(field) == expected
+        top = stats.top(field, 3)
+        assert [count for _, count in top] == sorted(expected.values(), reverse=True)[:3]
+        assert all(expected[value] == count for value, count in top)
+    decades = {}
+    for book in books:
+        decades[book.year // 10 * 10] = decades.get(book.year // 10 * 10, 0) + 1
+    assert stats.decades() == dict(sorted(decades.items()))
+    assert stats.summary(2)["top"]["genre"] == stats.top("genre", 2)
+
+
+def _library_state(lib):
+    return {"books": [(book.isbn, book.title, book.author, book.year, book.genre) for book in lib],
+            "authors": {author: sorted(book.isbn for book in lib.find_by_author(author)) for author in "АБВ"},
+            "years": sorted(book.isbn for book in lib.find_by_year_range(1900, 1905)),
+            "text": sorted(book.isbn for book in lib.search_text("новая", 1000)),
+            "stats": lib.stats().summary(3)}
+
+
+def test_fork_is_isolated_copy_on_write():
+    rng = random.Random(5)
+    def books():
+        return [Book(f"Книга {i}", "АБВ"[i % 3], 1900 + i % 10, "Роман", str(i)) for i in range(60)]
+
+    lib = Library(cache_size=32)
+    lib.bulk_load(books())
+    lib.find_by_author("А") # результат в кэше оригинала
+    branches = [lib, lib.fork()]
+    references = [Library(), Library()]
+    for reference in references:
+        reference.bulk_load(books())
+    frozen = lib.snapshot()
+    frozen_state = _library_state(frozen)
+
+    for step in range(400):
+        if step == 200: # ветка от ветки
+            branches.append(branches[1].fork())
+            references.append(Library())
+            references[2].bulk_load(Book(title, author, year, genre, isbn)
+                                    for isbn, title, author, year, genre in _library_state(branches[1])["books"])
+        which = rng.randrange(len(branches))
+        isbn, author = str(rng.randrange(80)), rng.choice("АБВ")
+        for target in (branches[which], references[which]):
+            if target.find_by_isbn(isbn) is None:
+                target.add_book_to_lib(Book(f"Новая {isbn}", author, 1900 + step % 10, "Роман", isbn))
+            elif step % 5 == 0:
+                target.remove_book_from_lib(isbn)
+            else:
+                target.update_book_info(isbn, author=author, year=1900 + step % 7, title=f"Новая {step}")
+
+    for branch, reference in zip(branches, references):
+        assert _library_state(branch) == _library_state(reference)
+        check_index_invariants(branch._index)
+    assert _library_state(frozen) == frozen_state
+    with pytest.raises(RuntimeError):
+        frozen.add_book_to_lib(Book("Книга", "А", 1900, "Роман", "x"))
+    frozen.fork().add_book_to_lib(Book("Книга", "А", 1900, "Роман", "x"))
+    assert frozen.find_by_isbn("x") is None
+
+
+def test_fork_update_invalidates_cached_results():
+    lib = Library(cache_size=8)
+    lib.add_book_to_lib(Book("Старая", "А", 1900, "Роман", "1"))
+    branch = lib.fork()
+    assert [book.title for book in branch.find_by_author("А")] == ["Старая"]
+    assert [book.title for book in branch.find_by_year(1900)] == ["Старая"]
+    branch.update_book_info("1", title="Новая") # общая книга заменяется копией
+    assert [book.title for book in branch.find_by_author("А")] == ["Новая"]
+    assert [book.title for book in branch.find_by_year(1900)] == ["Новая"]
+    assert branch.find_by_author("А")[0] is branch.find_by_isbn("1")
+    assert [book.title for book in lib.find_by_author("А")] == ["Старая"]
+
+
+def test_sharded_library_routing_and_resize():
+    books = [Book(f"Книга {i}", "АБВГ"[i % 4], 1900 + i % 30, "Роман", str(i)) for i in range(300)]
+    reference = Library()
+    reference.bulk_load(books)
+
+    def isbns(found):
+        return sorted(book.isbn for book in found)
+
+    with ShardedLibrary(shards=3) as lib:
+        assert lib.bulk_load(books) == 300
+        assert sum(lib.shard_sizes()) == len(lib) == 300
+        assert isbns(lib.find_by_author("Б")) == isbns(reference.find_by_author("Б"))
+        assert isbns(lib.find(author="В", year=1902)) == isbns(reference.find(author="В", year=1902))
+        found = lib.find_by_year_range(1905, 1910)
+        assert [book.year for book in found] == sorted(book.year for book in found)
+        assert isbns(found) == isbns(reference.find_by_year_range(1905, 1910))
+        assert lib.count_in_range(1900, 1903) == reference.count_in_range(1900, 1903)
+        assert [book.year for book in lib.oldest(5)] == [book.year for book in reference.oldest(5)]
+
+        with pytest.raises(BulkLoadError) as error: # пакет с повтором не загружается ни в один шард
+            lib.bulk_load([Book("Книга", "А", 1900, "Роман", "new"), Book("Книга", "А", 1900, "Роман", "7")])
+        assert error.value.duplicates == ["7"]
+        assert lib.find_by_isbn("new") is None
+        with pytest.raises(KeyError):
+            lib.remove_book_from_lib("missing")
+
+        moved = next(str(i) for i in range(1000, 2000) if shard_of(str(i), 3) != shard_of("1", 3))
+        lib.update_book_info("1", isbn=moved, title="Перенесённая") # книга переезжает в другой шард
+        assert lib.find_by_isbn("1") is None and lib.find_by_isbn(moved).title == "Перенесённая"
+        with pytest.raises(ExistError):
+            lib.update_book_info("2", isbn="3")
+
+        for shards in (5, 2):
+            lib.resize(shards)
+            assert len(lib.shard_sizes()) == shards and len(lib) == 300
+            assert all(shard_of(book.isbn, shards) == shard.index
+                       for shard in lib._shards for book in shard.call("books"))
+        assert isbns(lib.find_by_author("Г")) == isbns(reference.find_by_author("Г"))
+
+
+def test_sharded_library_keeps_books_when_move_fails(monkeypatch):
+    books = [Book(f"Книга {i}", "АБВ"[i % 3], 1900 + i, "Роман", str(i)) for i in range(30)]
+    with ShardedLibrary(shards=3) as lib:
+        lib.bulk_load(books)
+        moved = next(str(i) for i in range(1000, 2000) if shard_of(str(i), 3) != shard_of("1", 3))
+        target = lib._shards[shard_of(moved, 3)]
+        ask = target.ask
+
+        def failing_ask(op, *args, **kwargs):
+            if op == "add_book_to_lib":
+                raise RuntimeError("шард недоступен")
+            return ask(op, *args, **kwargs)
+
+        monkeypatch.setattr(target, "ask", failing_ask)
+        with pytest.raises(RuntimeError):
+            lib.update_book_info("1", isbn=moved, title="Перенесённая")
+        assert lib.find_by_isbn("1").title == "Книга 1" and lib.find_by_isbn(moved) is None
+        assert len(lib) == 30 and [book.isbn for book in lib.find_by_author("Б")].count("1") == 1
+
+        exchange = lib._exchange
+        failures = []
+
+        def failing_exchange(requests): # первая загрузка при resize проходит, но сообщает об ошибке
+            results = exchange(requests)
+            if not failures and any(request[0] == "bulk_load" for request in requests.values()):
+                failures.append(requests)
+                raise RuntimeError("шард недоступен")
+            return results
+
+        monkeypatch.setattr(lib, "_exchange", failing_exchange)
+        for shards in (5, 2):
+            failures.clear()
+            with pytest.raises(RuntimeError):
+                lib.resize(shards)
+            assert failures and len(lib.shard_sizes()) == 3 and len(lib) == 30
+            assert all(shard_of(book.isbn, 3) == shard.index for shard in lib._shards for book in shard.call("books"))
+
+
+def test_sharded_library_stats_and_explain():
+    books = [Book(f"Книга {i}", "АБВГ"[i % 4], 1900 + i % 30, "Роман" if i % 3 else "Повесть", str(i))
+             for i in range(200)]
+    reference = Library()
+    reference.bulk_load(books)
+    with ShardedLibrary(shards=3, cache_size=16) as lib:
+        lib.bulk_load(books)
+        stats, expected = lib.stats(), reference.stats()
+        assert stats.total == 200 and stats.decades() == expected.decades()
+        for field in ("author", "genre", "year"):
+            assert stats.counts(field) == expected.counts(field)
+            assert [count for _, count in stats.top(field, 5)] == [count for _, count in expected.top(field, 5)]
+        stats.add(Book("Новая", "Д", 2000, "Роман", "new")) # объединённая статистика - обычная CatalogStats
+        stats.remove(Book("Книга 0", "А", 1900, "Роман", "0"))
+        assert stats.count("author", "Д") == 1 and stats.count("author", "А") == 49
+        assert stats.top("author", 5)[3:] == [("А", 49), ("Д", 1)]
+        summary = execute(lib, {"op": "stats", "k": 3})["result"] # порядок равных значений может отличаться
+        assert summary["total"] == 200 and summary["distinct"] == expected.summary()["distinct"]
+
+        plan = lib.explain(author="А", year=1900)
+        assert {step["shard"] for step in plan} == {0, 1, 2}
+        assert sum(step["size"] for step in plan if step["field"] == "author") == 50
+        lib.find_by_author("А")
+        lib.find_by_author("А")
+        cache = lib.cache_stats()
+        assert cache["hits"] == 3 and cache["misses"] == 3 and cache["hit_ratio"] == 0.5
+        assert sorted(book.isbn for book in lib.iter_books()) == sorted(book.isbn for book in books)
+        for method in (lib.fork, lib.snapshot):
+            with pytest.raises(NotImplementedError):
+                method()
+        with pytest.raises(NotImplementedError):
+            lib.view("author", "А")
+    with ShardedLibrary(shards=2) as lib:
+        assert lib.cache_stats() is None
+
+
+def test_event_log_replay_matches_simulation(tmp_path):
+    path = str(tmp_path / "events.log")
+    result = run_simulation(2000, seed=11, quiet=True, record=path)
+    events = list(read_events(path))
+    assert sum(result.event_counts.values()) - result.empty_events == len(events)
+    assert {op for op, _ in events} >= {"add", "remove", "update", "find_by_year", "find_by_isbn"}
+
+    def state(lib):
+        return sorted((b.isbn, b.title, b.author, b.year, b.genre) for b in lib)
+
+    plain, locked = Library(), ThreadSafeLibrary()
+    report = replay(events, plain)
+    replay(events, locked) # тот же разобранный журнал - на другой библиотеке
+    assert report["final_size"] == result.final_size and report["events"] == len(events)
+    assert state(plain) == state(locked)
+
+    with open(path, "r+b") as file: # оборванный журнал
+        file.truncate((tmp_path / "events.log").stat().st_size - 1)
+    with pytest.raises(ValueError):
+        list(read_events(path))
+
+
+def test_event_log_truncated_string(tmp_path):
+    path = str(tmp_path / "events.log")
+    with EventLogWriter(path) as writer:
+        writer.add(Book("Книга", "Автор", 1900, "Роман", "isbn-1"))
+        writer.remove("isbn-2")
+    size = (tmp_path / "events.log").stat().st_size
+    with open(path, "r+b") as file: # журнал оборван посреди новой строки ISBN
+        file.truncate(size - 3)
+    with pytest.raises(ValueError):
+        list(read_events(path))
+    with pytest.raises(ValueError):
+        replay(read_events(path), Library())
+
+
+def test_profiler_operations_and_stacks(tmp_path):
+    with Profiler(interval=0.0005) as profiler:
+        run_simulation(3000, seed=2, quiet=True)
+    assert {"add", "find_by_author", "simulation.add", "simulation.search_year"} <= set(profiler.operations)
+    add, step = profiler.operations["add"], profiler.operations["simulation.add"]
+    assert add.calls == step.calls > 0 and step.total_time >= add.total_time # шаг включает операцию
+    assert step.peak >= add.peak > 0
+
+    out = io.StringIO()
+    profiler.save(str(tmp_path / "profile"), out)
+    assert "simulation.add" in out.getvalue() and "cumulative" in out.getvalue()
+    lines = (tmp_path / "profile.folded").read_text(encoding="utf-8").splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("_simulate" in line for line in lines)
+    Library().add_book_to_lib(Book("Книга", "А", 1900, "Роман", "1")) # после остановки не учитывается
+    assert profiler.operations["add"].calls == add.calls
+
+
+def test_library_list_ordered_pages(monkeypatch):
+    monkeypatch.setattr(OrderedIndex, "BLOCK_SIZE", 4) # маленькие блоки - чаще деление и удаление блоков
+    rng = random.Random(9)
+    lib = Library()
+    lib.bulk_load(Book(f"Книга {rng.randrange(50)}", "АБВ"[i % 3], 1900 + i % 13, "Роман", str(i)) for i in range(60))
+    assert [book.isbn for book in lib.list(offset=58)] == ["58", "59"] # без order_by - порядок добавления
+    lib.list("year", limit=5) # индекс по году становится 'ordered', по названию - создаётся
+    lib.list("title", limit=5)
+    assert lib.indexes()["title"] == lib.indexes()["year"] == "ordered"
+    branch = lib.fork()
+
+    def expected(target, field, descending):
+        return sorted(target, key=lambda book: (getattr(book, field), book.isbn), reverse=descending)
+
+    for step in range(300):
+        target = (lib, branch)[step % 2]
+        isbn = str(rng.randrange(90))
+        if target.find_by_isbn(isbn) is None:
+            target.add_book_to_lib(Book(f"Книга {rng.randrange(50)}", "АБВ"[step % 3], 1900 + step % 11, "Роман", isbn))
+        elif step % 5 == 0:
+            target.remove_book_from_lib(isbn)
+        elif step % 7 == 0 and target.find_by_isbn(f"n{isbn}") is None:
+            target.update_book_info(isbn, isbn=f"n{isbn}")
+        else:
+            target.update_book_info(isbn, title=f"Книга {rng.randrange(50)}", year=1900 + rng.randrange(20))
+
+    for target in (lib, branch):
+        check_index_invariants(target._index)
+        for field in ("title", "year", "author"):
+            for descending in (False, True):
+                ordered = expected(target, field, descending)
+                assert target.list(field, descending) == ordered
+                for offset, limit in ((0, 3), (17, 10), (len(ordered) - 2, 5), (len(ordered) + 1, 5)):
+                    assert target.list(field, descending, offset, limit) == ordered[offset:offset + limit]
+        assert target.find_in_range("year", 1905, 1907) == target.find_by_year_range(1905, 1907)
+    with pytest.raises(ValueError):
+        lib.list("title", offset=-1)